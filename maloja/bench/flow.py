@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+#   -*- encoding: UTF-8 -*-
+
+# Copyright Skyscape Cloud Services
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+from collections import OrderedDict
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import queue
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not on Windows
+    resource = None
+
+import maloja.broker
+from maloja.bench.simulator import Estate
+from maloja.bench.simulator import Simulator
+from maloja.broker import create_broker
+from maloja.builder import Builder
+from maloja.inspector import Inspector
+from maloja.model import Gateway
+from maloja.model import Network
+from maloja.model import Template
+from maloja.model import Vdc
+from maloja.model import Vm
+from maloja.surveyor import Surveyor
+from maloja.types import Credentials
+from maloja.types import Design
+from maloja.types import Inspection
+from maloja.types import Stop
+from maloja.types import Survey
+from maloja.types import Token
+from maloja.workflow.path import make_project
+
+__doc__ = """
+Benchmarks of whole survey, inspection and build flows.
+
+Each case runs one flow through a Broker against a local
+:py:mod:`maloja.bench.simulator`, for an estate size and a number of
+worker threads. The client side of each case runs in a fresh process,
+so that the peak memory and CPU time it reports are its own::
+
+    $ python -m maloja.bench.flow --sizes 100 1000 10000 --workers 8 32 --output=flow.json
+
+Give a file of earlier results as `--baseline` to fail when the wall
+time of any case has grown by more than `--tolerance`.
+
+"""
+
+
+def design(estate, url):
+    """
+    Return the objects of a design to build in the first Vdc of
+    `estate`, and the name of a VApp there to inspect.
+
+    """
+    vdc = estate.kinds["vdc"][0]
+    net = vdc.members("network")[0]
+    gw = vdc.members("gateway")[0]
+    tmplt = estate.kinds["template"][0]
+    vapp = next(iter(vdc.members("vapp")), None)
+    objs = [
+        Vdc(name=vdc.name, href=url + vdc.path),
+        Network(
+            name=net.name, href=url + net.path, defaultGateway=net.config["gateway"],
+            netmask=net.config["netmask"], dns=list(net.config["dns"])
+        ),
+        Network(
+            name="Bench", defaultGateway="10.0.0.1", netmask="255.255.255.0",
+            dns=["8.8.8.8", "8.8.4.4"]
+        ),
+        Template(name=tmplt.name, href=url + tmplt.path),
+    ] + [
+        Vm(
+            name=vm.name, href=url + vm.path, networkconnections=[{
+                "name": net.name, "ip": None, "isConnected": True,
+                "macAddress": None, "ipAddressAllocationMode": "POOL"
+            }]
+        )
+        for vm in tmplt.members("templatevm")
+    ] + [
+        Gateway(name=gw.name, href=url + gw.path)
+    ]
+    return objs, getattr(vapp, "name", None)
+
+
+def peak_rss():
+    """
+    Return the peak resident memory of this process in kilobytes, or
+    None where it cannot be found.
+
+    """
+    if resource is None:
+        return None
+    rv = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rv // 1024 if sys.platform == "darwin" else rv
+
+
+def run_case(
+    flow, url, workers, mode=None, objects=None, name=None, timeout=3600, log_level=None
+):
+    """
+    Run one flow through a new Broker against the API at `url`.
+
+    :return: An ordered dictionary of measurements.
+    """
+    if log_level is not None:
+        logging.getLogger("maloja").setLevel(log_level)
+    maloja.broker.handler.register(Survey, Surveyor.survey_handler)
+    maloja.broker.handler.register(Design, Builder.design_handler)
+    maloja.broker.handler.register(Inspection, Inspector.inspection_handler)
+    operations = queue.Queue()
+    results = queue.Queue()
+    with tempfile.TemporaryDirectory() as drcty:
+        path, proj = make_project(drcty)
+        msg = {
+            "build": Design(objects),
+            "inspect": Inspection(name, objects),
+            "survey": Survey(path, mode),
+        }[flow]
+
+        start = time.perf_counter()
+        cpu = sum(os.times()[:2])
+        broker = create_broker(operations, results, max_workers=workers)
+        operations.put((0, Credentials(url, "admin@System", "")))
+        reply = None
+        while not isinstance(reply, Token):
+            status, reply = results.get(timeout=timeout)
+            if isinstance(reply, str):
+                raise ValueError(reply)
+        operations.put((1, msg))
+        operations.put((2, Stop()))
+        done, not_done = concurrent.futures.wait(set(broker.tasks.values()), timeout=timeout)
+        wall = time.perf_counter() - start
+        cpu = sum(os.times()[:2]) - cpu
+
+        top = os.path.join(path.root, path.project)
+        written = [
+            os.path.getsize(os.path.join(root, i))
+            for root, dirs, files in os.walk(top)
+            for i in files if os.path.join(root, i) != os.path.join(top, "project.yaml")
+        ]
+
+    broker.session.executor.shutdown(wait=False)
+    made, opened = broker.session.connections
+    n = len(written) if flow == "survey" else len(objects or [])
+    return OrderedDict([
+        ("flow", flow),
+        ("mode", mode),
+        ("workers", workers),
+        ("complete", not not_done),
+        ("wall", wall),
+        ("requests", made),
+        ("rps", made / wall),
+        ("peak_rss_kb", peak_rss()),
+        ("bytes_written", sum(written)),
+        ("objects", n),
+        ("cpu_per_object", cpu / max(n, 1)),
+    ])
+
+
+def run(flows=("survey",), sizes=(100,), workers=(8,), mode=None, latency=0, task_time=0.1):
+    """
+    Run each flow for every estate size and number of workers.
+
+    :return: A list of dictionaries of measurements, one per case.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    rv = []
+    for size in sizes:
+        estate = Estate(vms=size, task_time=task_time)
+        with Simulator(estate, latency=latency) as sim:
+            objs, name = design(estate, sim.url)
+            for flow in flows:
+                for n in workers:
+                    with ctx.Pool(1) as pool:
+                        case = pool.apply(
+                            run_case, (flow, sim.url, n),
+                            {
+                                "mode": mode, "objects": objs, "name": name,
+                                "log_level": logging.ERROR
+                            }
+                        )
+                    case["vms"] = size
+                    case["latency"] = latency
+                    rv.append(case)
+    return rv
+
+
+def key(case):
+    return (case["flow"], case["mode"], case["vms"], case["workers"], case["latency"])
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Find the cases whose wall time exceeds that in `baseline` by more
+    than the fraction `tolerance`.
+
+    :return: A list of (case, baseline case) pairs.
+    """
+    before = {key(i): i for i in baseline}
+    return [
+        (i, before[key(i)]) for i in results
+        if key(i) in before and i["wall"] > before[key(i)]["wall"] * (1 + tolerance)
+    ]
+
+
+def report(results, stream=sys.stdout):
+    print("{0:<8} {1:>6} {2:>7} {3:>9} {4:>9} {5:>8} {6:>10} {7:>12} {8:>11}".format(
+        "flow", "vms", "workers", "wall/s", "requests", "req/s", "rss/MB", "written/kB",
+        "cpu/obj ms"
+    ), file=stream)
+    for i in results:
+        print((
+            "{0[flow]:<8} {0[vms]:>6} {0[workers]:>7} {0[wall]:>9.2f} {0[requests]:>9}"
+            " {0[rps]:>8.1f} {1:>10} {2:>12.1f} {3:>11.2f}"
+        ).format(
+            i, "-" if i["peak_rss_kb"] is None else "{0:.1f}".format(i["peak_rss_kb"] / 1024),
+            i["bytes_written"] / 1024, i["cpu_per_object"] * 1000
+        ), file=stream)
+
+
+def parser(description=__doc__):
+    rv = argparse.ArgumentParser(description)
+    rv.add_argument(
+        "--flows", nargs="+", default=["survey"], choices=["build", "inspect", "survey"],
+        help="Flows to run [survey]")
+    rv.add_argument(
+        "--sizes", nargs="+", type=int, default=[100, 1000, 10000],
+        help="Numbers of Vms in the estate [100 1000 10000]")
+    rv.add_argument(
+        "--workers", nargs="+", type=int, default=[8, 32],
+        help="Numbers of worker threads for the Broker [8 32]")
+    rv.add_argument(
+        "--mode", default=None, choices=["incremental", "query"],
+        help="Mode of survey [tree]")
+    rv.add_argument(
+        "--latency", type=float, default=0,
+        help="Seconds the simulator delays each response [0]")
+    rv.add_argument(
+        "--output", default=None,
+        help="Write the results as JSON to this file")
+    rv.add_argument(
+        "--baseline", default=None,
+        help="Compare with the results in this JSON file")
+    rv.add_argument(
+        "--tolerance", type=float, default=0.2,
+        help="Fraction by which wall time may grow on the baseline [0.2]")
+    return rv
+
+
+def main(args):
+    results = run(args.flows, args.sizes, args.workers, args.mode, args.latency)
+    report(results)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "results": results,
+            }, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as data:
+            slower = compare(results, json.load(data)["results"], args.tolerance)
+        for case, before in slower:
+            print("Slower: {0} took {1:.2f}s, was {2:.2f}s.".format(
+                key(case), case["wall"], before["wall"]
+            ), file=sys.stderr)
+        return 1 if slower else 0
+    return 0
+
+
+if __name__ == "__main__":
+    p = parser()
+    args = p.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+#   -*- encoding: UTF-8 -*-
+
+# Copyright Skyscape Cloud Services
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+import itertools
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+from maloja.model import Catalog
+from maloja.model import codecs
+from maloja.model import Gateway
+from maloja.model import Network
+from maloja.model import Org
+from maloja.model import Template
+from maloja.model import VApp
+from maloja.model import Vdc
+from maloja.model import Vm
+
+from maloja.test.test_model import NetworkTests
+from maloja.test.test_model import VmTests
+from maloja.test.test_surveyor import CatalogSurveyTests
+from maloja.test.test_surveyor import EdgeGatewaySurveyTests
+from maloja.test.test_surveyor import OrgSurveyTests
+from maloja.test.test_surveyor import VAppSurveyTests
+from maloja.test.test_surveyor import VAppTemplateSurveyTests
+from maloja.test.test_surveyor import VdcSurveyTests
+
+__doc__ = """
+Microbenchmarks for the Maloja object model.
+
+Each case uses XML fixtures from the test suite. For every model type
+it reports the rates at which objects are fed from XML, have their
+elements listed, and are dumped to and loaded from YAML with each
+codec. The rate of :py:meth:`maloja.model.Gateway.servicecast` is
+reported for the addresses and ports of the gateway fixture::
+
+    $ python -m maloja.bench.model --repeat=2000
+
+"""
+
+ns = "{http://www.vmware.com/vcloud/v1.5}"
+
+services = (
+    "DestinationIp", "Port", "SourceIp", "SourcePort",
+    "OriginalIp", "OriginalPort", "TranslatedIp", "TranslatedPort",
+)
+
+
+def cases():
+    """
+    Generate (name, type, elements) tuples, one for each model type. The
+    elements are the parsed XML fed to one object of that type.
+
+    """
+    yield ("Catalog", Catalog, [ET.fromstring(CatalogSurveyTests.xml)])
+    yield ("Gateway", Gateway, [ET.fromstring(EdgeGatewaySurveyTests.xml)])
+    yield ("Network", Network, [ET.fromstring(NetworkTests.xml)])
+    yield ("Org", Org, [ET.fromstring(OrgSurveyTests.xml)])
+    yield ("Template", Template, [ET.fromstring(VAppTemplateSurveyTests.xml)])
+    yield ("VApp", VApp, [ET.fromstring(VAppSurveyTests.xml)])
+    yield ("Vdc", Vdc, [ET.fromstring(VdcSurveyTests.xml)])
+    yield ("Vm", Vm, list(itertools.chain(
+        ET.fromstring(VAppSurveyTests.xml).iter(ns + "Vm"), [ET.fromstring(VmTests.xml)]
+    )))
+
+
+def service_values():
+    """
+    Return the texts of the addresses and ports in the rules of the
+    gateway fixture.
+
+    """
+    tree = ET.fromstring(EdgeGatewaySurveyTests.xml)
+    return [
+        elem.text for elem in tree.iter()
+        if elem.text and elem.tag in {ns + i for i in services}
+    ]
+
+
+def rate(func, items, repeat):
+    """
+    Time `repeat` calls of `func` on each of `items`.
+
+    :return: The rate in calls per second.
+    """
+    start = time.perf_counter()
+    for n in range(repeat):
+        for item in items:
+            func(item)
+    return repeat * len(items) / (time.perf_counter() - start)
+
+
+def feed(typ, elements, repeat):
+    """
+    Time the creation of `repeat` objects of type `typ` from each of
+    `elements`.
+
+    :return: The rate in objects per second.
+    """
+    return rate(lambda elem: typ().feed_xml(elem, ns=ns), elements, repeat)
+
+
+def run(repeat=1000, runs=3):
+    """
+    Run each benchmark case `runs` times, keeping the best rate.
+
+    :return: A dictionary of rates keyed by case name.
+    """
+    rv = {}
+    for name, typ, elements in cases():
+        objs = [typ().feed_xml(elem, ns=ns) for elem in elements]
+        rv["feed_xml {0}".format(name)] = max(
+            feed(typ, elements, repeat) for i in range(runs)
+        )
+        rv["elements {0}".format(name)] = max(
+            rate(lambda obj: list(obj.elements), objs, repeat) for i in range(runs)
+        )
+        for codec, (loads, dumps) in codecs.items():
+            label = codec or "yaml"
+            texts = [dumps(obj) for obj in objs]
+            rv["{0}_dumps {1}".format(label, name)] = max(
+                rate(dumps, objs, repeat) for i in range(runs)
+            )
+            rv["{0}_loads {1}".format(label, name)] = max(
+                rate(lambda text: typ(**loads(text)), texts, repeat) for i in range(runs)
+            )
+
+    values = service_values()
+    rv["servicecast Gateway"] = max(
+        rate(Gateway.servicecast, values, repeat) for i in range(runs)
+    )
+    return rv
+
+
+def report(results, stream=sys.stdout):
+    for name, value in sorted(results.items()):
+        print("{0:<24} {1:>12,.0f} /s".format(name, value), file=stream)
+
+
+def parser(description=__doc__):
+    rv = argparse.ArgumentParser(description)
+    rv.add_argument(
+        "--repeat", type=int, default=1000,
+        help="Number of calls on each fixture in each case [1000]")
+    rv.add_argument(
+        "--runs", type=int, default=3,
+        help="Number of runs of each case, of which the best is reported [3]")
+    return rv
+
+
+def main(args):
+    report(run(args.repeat, args.runs))
+    return 0
+
+
+if __name__ == "__main__":
+    p = parser()
+    args = p.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,834 @@
+#!/usr/bin/env python
+#   -*- encoding: UTF-8 -*-
+
+# Copyright Skyscape Cloud Services
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import argparse
+from collections import Counter
+from collections import OrderedDict
+from collections import defaultdict
+import http.server
+import itertools
+import logging
+import re
+import socketserver
+import sys
+import threading
+import time
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+import uuid
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+import zlib
+
+__doc__ = """
+A local stand-in for the VMware vCloud Director API.
+
+The simulator serves a synthetic estate of Orgs, Vdcs, VApps, Vms,
+catalogs, networks and Edge Gateways over plain HTTP. Maloja can survey,
+inspect and build against it without a real vCloud::
+
+    $ python -m maloja.bench.simulator --vms=10000 --latency=0.02 --port=8080
+    $ maloja --url=http://127.0.0.1:8080 --user=admin@System survey
+
+Any credentials are accepted. Changes to the estate return a Task,
+which runs for a fixed time and then succeeds.
+
+"""
+
+ns = "{http://www.vmware.com/vcloud/v1.5}"
+xmlns = 'xmlns="http://www.vmware.com/vcloud/v1.5"'
+
+
+def attr(val):
+    return escape(str(val), {'"': "&quot;"})
+
+
+class Entity:
+    """
+    An object in the simulated estate.
+
+    """
+
+    paths = {
+        "catalog": "catalog/{0}",
+        "gateway": "admin/edgeGateway/{0}",
+        "item": "catalogItem/{0}",
+        "network": "admin/network/{0}",
+        "org": "org/{0}",
+        "task": "task/{0}",
+        "template": "vAppTemplate/vappTemplate-{0}",
+        "templatevm": "vAppTemplate/vm-{0}",
+        "vapp": "vApp/vapp-{0}",
+        "vdc": "vdc/{0}",
+        "vm": "vApp/vm-{0}",
+    }
+
+    types = {
+        "catalog": "application/vnd.vmware.vcloud.catalog+xml",
+        "gateway": "application/vnd.vmware.admin.edgeGateway+xml",
+        "item": "application/vnd.vmware.vcloud.catalogItem+xml",
+        "network": "application/vnd.vmware.vcloud.orgVdcNetwork+xml",
+        "org": "application/vnd.vmware.vcloud.org+xml",
+        "task": "application/vnd.vmware.vcloud.task+xml",
+        "template": "application/vnd.vmware.vcloud.vAppTemplate+xml",
+        "templatevm": "application/vnd.vmware.vcloud.vm+xml",
+        "vapp": "application/vnd.vmware.vcloud.vApp+xml",
+        "vdc": "application/vnd.vmware.vcloud.vdc+xml",
+        "vm": "application/vnd.vmware.vcloud.vm+xml",
+    }
+
+    def __init__(self, kind, id_, name, parent=None, **config):
+        self.kind = kind
+        self.id = id_
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.tasks = []
+        self.config = config
+        if parent is not None:
+            parent.children.append(self)
+
+    @property
+    def path(self):
+        return "/api/" + self.paths[self.kind].format(self.id)
+
+    @property
+    def type(self):
+        return self.types[self.kind]
+
+    def ancestor(self, kind):
+        rv = self
+        while rv is not None and rv.kind != kind:
+            rv = rv.parent
+        return rv
+
+    def members(self, kind):
+        return [i for i in self.children if i.kind == kind]
+
+    def link(self, base, tag="Link", rel=None):
+        return '<{0} {1}type="{2}" name="{3}" href="{4}{5}"/>'.format(
+            tag, 'rel="{0}" '.format(rel) if rel else "", self.type,
+            attr(self.name), base, self.path
+        )
+
+
+class Estate:
+    """
+    A synthetic vCloud estate. Its `vms` are shared among the Vdcs of
+    each Org, in VApps of `vapp_size`. Each Vdc has a network and an
+    Edge Gateway. Each Org has `catalogs`, each of `templates` VApp
+    templates. Tasks succeed `task_time` seconds after they start.
+
+    """
+
+    queries = {
+        "adminOrgVdc": ("AdminVdcRecord", ("vdc",)),
+        "adminVApp": ("AdminVAppRecord", ("vapp",)),
+        "adminVM": ("AdminVMRecord", ("vm", "templatevm")),
+        "catalog": ("CatalogRecord", ("catalog",)),
+        "catalogItem": ("CatalogItemRecord", ("item",)),
+        "edgeGateway": ("EdgeGatewayRecord", ("gateway",)),
+        "organization": ("OrgRecord", ("org",)),
+        "orgVdcNetwork": ("OrgVdcNetworkRecord", ("network",)),
+        "vAppTemplate": ("VAppTemplateRecord", ("template",)),
+    }
+    """
+    Maps each type of the query API to its record tag and the kinds of
+    entity it returns.
+
+    """
+
+    def __init__(
+        self, vms=100, orgs=1, vdcs=1, vapp_size=4, catalogs=1, templates=2,
+        task_time=1.0, clock=time.monotonic
+    ):
+        self.task_time = task_time
+        self.clock = clock
+        self.lock = threading.RLock()
+        self.entities = OrderedDict()
+        self.kinds = defaultdict(list)
+        self.seq = itertools.count()
+        self.populate(vms, orgs, vdcs, vapp_size, catalogs, templates)
+
+    def add(self, kind, name, parent=None, **config):
+        id_ = uuid.uuid5(uuid.NAMESPACE_URL, "{0}/{1}".format(kind, next(self.seq)))
+        obj = Entity(kind, id_, name, parent, **config)
+        with self.lock:
+            self.entities[obj.path] = obj
+            self.kinds[kind].append(obj)
+        return obj
+
+    def find(self, url, kind=None):
+        """
+        Return the entity at `url`, or None if there is none of that kind.
+
+        """
+        obj = self.entities.get(urlparse(url).path.rstrip("/"))
+        if obj is not None and kind in (None, obj.kind):
+            return obj
+
+    def populate(self, vms, orgs, vdcs, vapp_size, catalogs, templates):
+        subnets = itertools.count()
+        hosts = itertools.count()
+        nVdcs = orgs * vdcs
+        for o in range(orgs):
+            org = self.add("org", "Org{0:02}".format(o))
+            for d in range(vdcs):
+                vdc = self.add("vdc", "Vdc{0:02}".format(d), org)
+                s = next(subnets)
+                net = self.add(
+                    "network", "Net{0:03}".format(s), vdc,
+                    gateway="192.168.{0}.1".format(s % 250), netmask="255.255.255.0",
+                    dns=("8.8.8.8", "8.8.4.4")
+                )
+                gw = self.add(
+                    "gateway", "Edge{0:03}".format(s), vdc,
+                    external="51.179.{0}.2".format(s % 250),
+                    internal="192.168.{0}.10".format(s % 250)
+                )
+                size = vms // nVdcs + (1 if o * vdcs + d < vms % nVdcs else 0)
+                vapp = None
+                for v in range(size):
+                    if v % vapp_size == 0:
+                        vapp = self.add("vapp", "VApp{0:05}".format(v // vapp_size), vdc)
+                    n = next(hosts)
+                    self.add("vm", "vm{0:05}".format(n), vapp, **self.hardware(n, net))
+
+            for c in range(catalogs):
+                ctlg = self.add("catalog", "Catalog{0:02}".format(c), org)
+                for t in range(templates):
+                    item = self.add("item", "Template{0:02}".format(t), ctlg)
+                    tmplt = self.add("template", item.name, item)
+                    self.add("templatevm", "base", tmplt, **self.hardware(t, None))
+
+    @staticmethod
+    def hardware(n, net):
+        return {
+            "cpu": 1 + n % 4,
+            "memoryMB": 1024 * (1 + n % 4),
+            "disk": 40960,
+            "mac": "00:50:56:{0:02x}:{1:02x}:{2:02x}".format(
+                (n >> 16) & 0xff, (n >> 8) & 0xff, n & 0xff
+            ),
+            "network": None if net is None else net.name,
+            "ip": None if net is None else "{0}.{1}".format(
+                net.config["gateway"].rpartition(".")[0], 10 + n % 240
+            ),
+        }
+
+    def task(self, owner, operation):
+        """
+        Start a task against `owner`.
+
+        """
+        rv = self.add(
+            "task", "task", owner.ancestor("org"), operation=operation, owner=owner,
+            started=self.clock(), startTime=time.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        )
+        with self.lock:
+            owner.tasks.append(rv)
+        return rv
+
+    def status(self, task):
+        elapsed = self.clock() - task.config["started"]
+        return "running" if elapsed < self.task_time else "success"
+
+    def running(self, owner):
+        with self.lock:
+            owner.tasks = [i for i in owner.tasks if self.status(i) == "running"]
+            return list(owner.tasks)
+
+    def document(self, obj, base):
+        """
+        Render an entity as the XML document the API serves for it.
+
+        """
+        with self.lock:
+            return getattr(self, "render_" + obj.kind)(obj, base)
+
+    def render_tasks(self, obj, base):
+        tasks = self.running(obj)
+        if not tasks:
+            return ""
+        return "<Tasks>{0}</Tasks>".format("".join(self.render_task(i, base) for i in tasks))
+
+    def render_task(self, obj, base):
+        owner = obj.config["owner"]
+        return (
+            '<Task {xmlns} status="{status}" operationName="{op}" operation="{op}"'
+            ' startTime="{0[startTime]}" name="task" href="{base}{1.path}" type="{1.type}">'
+            '{owner}{org}</Task>'
+        ).format(
+            obj.config, obj, xmlns=xmlns, base=base, status=self.status(obj),
+            op=obj.config["operation"], owner=owner.link(base, tag="Owner"),
+            org=obj.parent.link(base, tag="Organization")
+        )
+
+    def render_org(self, obj, base):
+        return (
+            '<Org {xmlns} name="{name}" href="{base}{0.path}" type="{0.type}">'
+            '{links}<Description/><FullName>{name}</FullName></Org>'
+        ).format(
+            obj, xmlns=xmlns, base=base, name=attr(obj.name), links="".join(
+                i.link(base, rel="down")
+                for i in obj.members("vdc") + obj.members("catalog")
+            )
+        )
+
+    def render_vdc(self, obj, base):
+        admin = "{0}/api/admin/vdc/{1.id}".format(base, obj)
+        return (
+            '<Vdc {xmlns} status="1" name="{name}" href="{base}{0.path}" type="{0.type}">'
+            '{up}'
+            '<Link rel="edgeGateways" href="{admin}/edgeGateways"'
+            ' type="application/vnd.vmware.vcloud.query.records+xml"/>'
+            '<Link rel="orgVdcNetworks" href="{admin}/networks"'
+            ' type="application/vnd.vmware.vcloud.query.records+xml"/>'
+            '<Link rel="add" href="{base}{0.path}/action/instantiateVAppTemplate"'
+            ' type="application/vnd.vmware.vcloud.instantiateVAppTemplateParams+xml"/>'
+            '<Description>Simulated Vdc</Description>'
+            '<ResourceEntities>{vapps}</ResourceEntities>'
+            '<AvailableNetworks>{nets}</AvailableNetworks></Vdc>'
+        ).format(
+            obj, xmlns=xmlns, base=base, name=attr(obj.name), admin=admin,
+            up=obj.parent.link(base, rel="up"),
+            vapps="".join(i.link(base, tag="ResourceEntity") for i in obj.members("vapp")),
+            nets="".join(
+                '<Network type="application/vnd.vmware.vcloud.network+xml"'
+                ' name="{0}" href="{1}{2.path}"/>'.format(attr(i.name), base, i)
+                for i in obj.members("network")
+            )
+        )
+
+    def render_vapp(self, obj, base):
+        return (
+            '<VApp {xmlns} status="8" deployed="false" name="{name}" href="{base}{0.path}"'
+            ' type="{0.type}">{up}'
+            '<Link rel="recompose" href="{base}{0.path}/action/recomposeVApp"'
+            ' type="application/vnd.vmware.vcloud.recomposeVAppParams+xml"/>'
+            '<Description/>{tasks}<Children>{vms}</Children></VApp>'
+        ).format(
+            obj, xmlns=xmlns, base=base, name=attr(obj.name),
+            up=obj.parent.link(base, rel="up"), tasks=self.render_tasks(obj, base),
+            vms="".join(i.link(base, tag="Vm") for i in obj.members("vm"))
+        )
+
+    def render_vm(self, obj, base):
+        hw = obj.config
+        rasd = '<rasd:{0}>{1}</rasd:{0}>'
+        items = [
+            ("Address", hw["mac"]), ("AddressOnParent", 0), ("Connection", hw["network"]),
+            ("ElementName", "Network adapter 0"), ("InstanceID", 1),
+            ("ResourceSubType", "VMXNET3"), ("ResourceType", 10),
+        ], [
+            ("Address", 0), ("Description", "SCSI Controller"),
+            ("ElementName", "SCSI Controller 0"), ("InstanceID", 2),
+            ("ResourceSubType", "lsilogic"), ("ResourceType", 6),
+        ], [
+            ("AddressOnParent", 0), ("Description", "Hard disk"),
+            ("ElementName", "Hard disk 1"),
+            ("HostResource", None), ("InstanceID", 2000), ("Parent", 2), ("ResourceType", 17),
+        ], [
+            ("AllocationUnits", "hertz * 10^6"), ("Description", "Number of Virtual CPUs"),
+            ("ElementName", "{0} virtual CPU(s)".format(hw["cpu"])), ("InstanceID", 3),
+            ("ResourceType", 3), ("VirtualQuantity", hw["cpu"]),
+        ], [
+            ("AllocationUnits", "byte * 2^20"), ("Description", "Memory Size"),
+            ("ElementName", "{0} MB of memory".format(hw["memoryMB"])), ("InstanceID", 4),
+            ("ResourceType", 4), ("VirtualQuantity", hw["memoryMB"]),
+        ]
+        hardware = "".join(
+            "<ovf:Item>{0}</ovf:Item>".format("".join(
+                '<rasd:HostResource vcloud:capacity="{0}"/>'.format(hw["disk"])
+                if k == "HostResource" else rasd.format(k, attr(v))
+                for k, v in item
+            ))
+            for item in (items if hw["network"] else items[1:])
+        )
+        connections = "" if not hw["network"] else (
+            '<NetworkConnection network="{0}" needsCustomization="false">'
+            '<NetworkConnectionIndex>0</NetworkConnectionIndex>'
+            '<IpAddress>{1}</IpAddress><IsConnected>true</IsConnected>'
+            '<MACAddress>{2}</MACAddress>'
+            '<IpAddressAllocationMode>POOL</IpAddressAllocationMode>'
+            '</NetworkConnection>'
+        ).format(attr(hw["network"]), hw["ip"], hw["mac"])
+        return (
+            '<Vm {xmlns} xmlns:vcloud="http://www.vmware.com/vcloud/v1.5"'
+            ' xmlns:ovf="http://schemas.dmtf.org/ovf/envelope/1"'
+            ' xmlns:rasd="http://schemas.dmtf.org/wbem/wscim/1/cim-schema/2'
+            '/CIM_ResourceAllocationSettingData"'
+            ' xmlns:vssd="http://schemas.dmtf.org/wbem/wscim/1/cim-schema/2'
+            '/CIM_VirtualSystemSettingData"'
+            ' status="8" deployed="false" name="{name}" href="{base}{0.path}" type="{0.type}">'
+            '{up}<Link rel="reconfigureVm" href="{base}{0.path}/action/reconfigureVm"'
+            ' type="{0.type}"/><Description/>{tasks}'
+            '<ovf:VirtualHardwareSection><ovf:Info>Virtual hardware requirements</ovf:Info>'
+            '<ovf:System><vssd:ElementName>Virtual Hardware Family</vssd:ElementName>'
+            '<vssd:InstanceID>0</vssd:InstanceID>'
+            '<vssd:VirtualSystemIdentifier>{name}</vssd:VirtualSystemIdentifier>'
+            '<vssd:VirtualSystemType>vmx-08</vssd:VirtualSystemType></ovf:System>'
+            '{hardware}</ovf:VirtualHardwareSection>'
+            '<NetworkConnectionSection ovf:required="false"'
+            ' type="application/vnd.vmware.vcloud.networkConnectionSection+xml">'
+            '<ovf:Info>Network connections</ovf:Info>'
+            '<PrimaryNetworkConnectionIndex>0</PrimaryNetworkConnectionIndex>'
+            '{connections}</NetworkConnectionSection></Vm>'
+        ).format(
+            obj, xmlns=xmlns, base=base, name=attr(obj.name),
+            up=obj.parent.link(base, rel="up"), tasks=self.render_tasks(obj, base),
+            hardware=hardware, connections=connections
+        )
+
+    render_templatevm = render_vm
+
+    def render_network(self, obj, base):
+        return (
+            '<OrgVdcNetwork {xmlns} status="1" name="{name}" href="{base}{0.path}"'
+            ' type="{0.type}">{up}<Description/>{tasks}<Configuration><IpScopes><IpScope>'
+            '<IsInherited>false</IsInherited><Gateway>{1[gateway]}</Gateway>'
+            '<Netmask>{1[netmask]}</Netmask><Dns1>{1[dns][0]}</Dns1><Dns2>{1[dns][1]}</Dns2>'
+            '<IsEnabled>true</IsEnabled></IpScope></IpScopes>'
+            '<FenceMode>isolated</FenceMode></Configuration><IsShared>false</IsShared>'
+            '</OrgVdcNetwork>'
+        ).format(
+            obj, obj.config, xmlns=xmlns, base=base, name=attr(obj.name),
+            up=obj.parent.link(base, rel="up"), tasks=self.render_tasks(obj, base)
+        )
+
+    def render_gateway(self, obj, base):
+        services = obj.config.get("services") or (
+            '<EdgeGatewayServiceConfiguration><FirewallService>'
+            '<IsEnabled>true</IsEnabled><DefaultAction>drop</DefaultAction>'
+            '<LogDefaultAction>false</LogDefaultAction><FirewallRule><Id>1</Id>'
+            '<IsEnabled>true</IsEnabled><MatchOnTranslate>false</MatchOnTranslate>'
+            '<Description>Web service</Description><Policy>allow</Policy>'
+            '<Protocols><Tcp>true</Tcp></Protocols><Port>80</Port>'
+            '<DestinationPortRange>80</DestinationPortRange>'
+            '<DestinationIp>{0[external]}</DestinationIp><SourcePort>-1</SourcePort>'
+            '<SourcePortRange>Any</SourcePortRange><SourceIp>Any</SourceIp>'
+            '<EnableLogging>false</EnableLogging></FirewallRule></FirewallService>'
+            '<NatService><IsEnabled>true</IsEnabled><NatRule><RuleType>DNAT</RuleType>'
+            '<IsEnabled>true</IsEnabled><Id>65537</Id><GatewayNatRule>'
+            '<OriginalIp>{0[external]}</OriginalIp><OriginalPort>80</OriginalPort>'
+            '<TranslatedIp>{0[internal]}</TranslatedIp><TranslatedPort>80</TranslatedPort>'
+            '<Protocol>tcp</Protocol></GatewayNatRule></NatRule></NatService>'
+            '</EdgeGatewayServiceConfiguration>'
+        ).format(obj.config)
+        return (
+            '<EdgeGateway {xmlns} status="1" name="{name}" href="{base}{0.path}"'
+            ' type="{0.type}">{up}'
+            '<Link rel="edgeGateway:configureServices"'
+            ' href="{base}{0.path}/action/configureServices"'
+            ' type="application/vnd.vmware.admin.edgeGatewayServiceConfiguration+xml"/>'
+            '<Description/>{tasks}<Configuration>'
+            '<GatewayBackingConfig>compact</GatewayBackingConfig>{services}'
+            '</Configuration></EdgeGateway>'
+        ).format(
+            obj, xmlns=xmlns, base=base, name=attr(obj.name),
+            up=obj.parent.link(base, rel="up"), tasks=self.render_tasks(obj, base),
+            services=services
+        )
+
+    def render_catalog(self, obj, base):
+        return (
+            '<Catalog {xmlns} name="{name}" href="{base}{0.path}" type="{0.type}">{up}'
+            '<Description/><CatalogItems>{items}</CatalogItems>'
+            '<IsPublished>false</IsPublished></Catalog>'
+        ).format(
+            obj, xmlns=xmlns, base=base, name=attr(obj.name),
+            up=obj.parent.link(base, rel="up"),
+            items="".join(i.link(base, tag="CatalogItem") for i in obj.members("item"))
+        )
+
+    def render_item(self, obj, base):
+        return (
+            '<CatalogItem {xmlns} name="{name}" href="{base}{0.path}" type="{0.type}">'
+            '{up}<Description/>{entity}</CatalogItem>'
+        ).format(
+            obj, xmlns=xmlns, base=base, name=attr(obj.name),
+            up=obj.parent.link(base, rel="up"),
+            entity="".join(i.link(base, tag="Entity") for i in obj.members("template"))
+        )
+
+    def render_template(self, obj, base):
+        return (
+            '<VAppTemplate {xmlns} status="8" name="{name}" href="{base}{0.path}"'
+            ' type="{0.type}"><Description/><Children>{vms}</Children>'
+            '<DateCreated>2016-01-01T00:00:00.000Z</DateCreated></VAppTemplate>'
+        ).format(
+            obj, xmlns=xmlns, base=base, name=attr(obj.name),
+            vms="".join(i.link(base, tag="Vm") for i in obj.members("templatevm"))
+        )
+
+    def render_orglist(self, base):
+        return '<OrgList {0} href="{1}/api/org/" type="{2}">{3}</OrgList>'.format(
+            xmlns, base, "application/vnd.vmware.vcloud.orgList+xml",
+            "".join(i.link(base, tag="Org") for i in self.kinds["org"])
+        )
+
+    def record(self, obj, base):
+        """
+        Return the attributes of a query record for an entity.
+
+        """
+        rv = OrderedDict([("name", obj.name), ("href", base + obj.path)])
+        vdc = obj.ancestor("vdc")
+        if vdc is None and obj.ancestor("org") is not None:
+            vdc = next(iter(obj.ancestor("org").members("vdc")), None)
+        if obj.kind == "org":
+            rv["displayName"] = obj.name
+        elif obj.kind == "vdc":
+            rv["org"] = base + obj.parent.path
+        elif obj.kind == "catalog":
+            rv["orgName"] = obj.parent.name
+        elif obj.kind == "item":
+            rv["catalog"] = base + obj.parent.path
+            rv["catalogName"] = obj.parent.name
+            rv["entity"] = base + obj.members("template")[0].path
+        elif obj.kind == "template":
+            rv["org"] = base + obj.ancestor("org").path
+            rv["catalogName"] = obj.ancestor("catalog").name
+            rv["creationDate"] = "2016-01-01T00:00:00.000Z"
+        elif obj.kind == "network":
+            rv["defaultGateway"] = obj.config["gateway"]
+            rv["netmask"] = obj.config["netmask"]
+            rv["dns1"], rv["dns2"] = obj.config["dns"]
+        elif obj.kind in ("vm", "templatevm"):
+            rv["container"] = base + obj.parent.path
+            rv["containerName"] = obj.parent.name
+            rv["isVAppTemplate"] = "true" if obj.kind == "templatevm" else "false"
+            if obj.kind == "templatevm":
+                rv["catalogName"] = obj.ancestor("catalog").name
+            rv["hardwareVersion"] = 8
+            rv["memoryMB"] = obj.config["memoryMB"]
+            rv["numberOfCpus"] = obj.config["cpu"]
+            rv["status"] = "POWERED_OFF"
+        if vdc is not None and obj.kind not in ("org", "vdc", "template", "catalog"):
+            rv["vdc"] = base + vdc.path
+        return rv
+
+    def render_records(self, base, tag, objs, page=1, size=None, total=None, name=""):
+        return (
+            '<QueryResultRecords {0} total="{1}" pageSize="{2}" page="{3}" name="{4}"'
+            ' type="application/vnd.vmware.vcloud.query.records+xml">{5}</QueryResultRecords>'
+        ).format(
+            xmlns, len(objs) if total is None else total, size or len(objs) or 1, page, name,
+            "".join(
+                "<{0} {1}/>".format(tag, " ".join(
+                    '{0}="{1}"'.format(k, attr(v)) for k, v in self.record(i, base).items()
+                ))
+                for i in objs
+            )
+        )
+
+    def render_query(self, base, typ, page=1, size=128):
+        """
+        Render one page of results from the typed query API.
+
+        """
+        tag, kinds = self.queries[typ]
+        with self.lock:
+            objs = [i for k in kinds for i in self.kinds[k]]
+            chunk = objs[(page - 1) * size:page * size]
+            return self.render_records(base, tag, chunk, page, size, len(objs), typ)
+
+    def instantiate(self, vdc, tree):
+        name = tree.attrib.get("name")
+        tmplt = self.find(tree.find(ns + "Source").attrib.get("href"), "template")
+        if tmplt is None:
+            raise KeyError("No template to instantiate.")
+        vapp = self.add("vapp", name, vdc)
+        nets = vdc.members("network")
+        for n, vm in enumerate(tmplt.members("templatevm")):
+            config = dict(vm.config)
+            if nets:
+                config.update(self.hardware(len(self.kinds["vm"]), nets[0]))
+            self.add("vm", vm.name, vapp, **config)
+        return vapp
+
+    def recompose(self, vapp, tree):
+        for item in tree.iter(ns + "SourcedItem"):
+            source = self.find(item.find(ns + "Source").attrib.get("href"))
+            name = item.find("./{0}VmGeneralParams/{0}Name".format(ns)).text
+            config = dict(source.config) if source is not None else self.hardware(0, None)
+            self.add("vm", name, vapp, **config)
+
+    def create_network(self, vdc, tree):
+        scope = tree.find(".//{0}IpScope".format(ns))
+        return self.add(
+            "network", tree.attrib.get("name"), vdc,
+            gateway=scope.find(ns + "Gateway").text,
+            netmask=scope.find(ns + "Netmask").text,
+            dns=(getattr(scope.find(ns + "Dns1"), "text", None), None)
+        )
+
+
+class Server(socketserver.ThreadingMixIn, http.server.HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; with Nagle's algorithm
+    # the body then waits on the client's delayed acknowledgement.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.server.simulator.respond(self, "GET")
+
+    def do_POST(self):
+        self.server.simulator.respond(self, "POST")
+
+    def do_PUT(self):
+        self.server.simulator.respond(self, "PUT")
+
+    def log_message(self, fmt, *args):
+        log = logging.getLogger("maloja.bench.simulator")
+        log.debug(fmt % args)
+
+
+class Simulator:
+    """
+    Serves an :py:class:`Estate` over HTTP, in threads of its own::
+
+        with Simulator(Estate(vms=1000), latency=0.01) as sim:
+            creds = Credentials(sim.url, "admin@System", "")
+
+    Each request is delayed by `latency` seconds. Documents carry an
+    ETag, so that conditional requests are answered with 304.
+
+    """
+
+    key = "x-vcloud-authorization"
+
+    def __init__(self, estate=None, host="127.0.0.1", port=0, latency=0):
+        self.estate = estate or Estate()
+        self.latency = latency
+        self.token = uuid.uuid4().hex
+        self.server = Server((host, port), Handler)
+        self.server.simulator = self
+        self.thread = None
+        self.lock = threading.Lock()
+        self.requests = Counter()
+        self.sent = 0
+
+    @property
+    def url(self):
+        return "http://{0}:{1}".format(*self.server.server_address[:2])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+    @staticmethod
+    def error(status, code, message):
+        return status, "application/vnd.vmware.vcloud.error+xml", (
+            '<Error {0} majorErrorCode="{1}" minorErrorCode="{2}" message="{3}"/>'
+        ).format(xmlns, status, code, attr(message))
+
+    def respond(self, request, method):
+        log = logging.getLogger("maloja.bench.simulator.respond")
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlparse(request.path)
+        body = request.rfile.read(int(request.headers.get("Content-Length") or 0))
+        base = "http://" + (request.headers.get("Host") or "{0}:{1}".format(
+            *self.server.server_address[:2]
+        ))
+        headers = {}
+        if method == "POST" and url.path.rstrip("/") == "/api/sessions":
+            headers[self.key] = self.token
+            status, contentType, text = (
+                200, "application/vnd.vmware.vcloud.session+xml",
+                '<Session {0} user="admin" org="System" href="{1}/api/session/"/>'.format(
+                    xmlns, base
+                )
+            )
+        elif request.headers.get(self.key) != self.token:
+            status, contentType, text = self.error(401, "UNAUTHORIZED", "Not logged in.")
+        else:
+            try:
+                status, contentType, text = self.route(method, url, body, base)
+            except Exception as e:
+                log.error(e)
+                status, contentType, text = self.error(400, "BAD_REQUEST", str(e))
+
+        data = text.encode("utf-8")
+        etag = '"{0:x}"'.format(zlib.crc32(data))
+        if method == "GET" and status == 200:
+            headers["ETag"] = etag
+            if request.headers.get("If-None-Match") == etag:
+                status, data = 304, b""
+
+        with self.lock:
+            self.requests[method] += 1
+            self.sent += len(data)
+
+        request.send_response(status)
+        request.send_header("Content-Type", contentType + ";version=5.5")
+        request.send_header("Content-Length", str(len(data)))
+        for k, v in headers.items():
+            request.send_header(k, v)
+        request.end_headers()
+        request.wfile.write(data)
+
+    def route(self, method, url, body, base):
+        estate = self.estate
+        path = url.path.rstrip("/")
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        records = "application/vnd.vmware.vcloud.query.records+xml"
+        admin = re.match("^/api/admin/vdc/([^/]+)/(edgeGateways|networks)$", path)
+        action = re.match(r"^(/api/.+)/action/(\w+)$", path)
+
+        if method == "GET" and path == "/api/org":
+            return 200, "application/vnd.vmware.vcloud.orgList+xml", estate.render_orglist(base)
+        elif method == "GET" and path == "/api/query":
+            typ = query.get("type")
+            if typ not in estate.queries:
+                return self.error(400, "BAD_REQUEST", "No query type {0}.".format(typ))
+            return 200, records, estate.render_query(
+                base, typ, int(query.get("page", 1)), int(query.get("pageSize", 25))
+            )
+        elif method == "GET" and path == "/api/vms/query":
+            container = estate.find(re.sub(r"^\(container==(.*)\)$", r"\1", query["filter"]))
+            vms = [] if container is None else container.members("vm")
+            with estate.lock:
+                return 200, records, estate.render_records(base, "VMRecord", vms, name="vm")
+        elif method == "GET" and path == "/api/catalogs/query":
+            return 200, records, estate.render_query(base, "catalog", 1, 128)
+        elif admin is not None:
+            vdc = estate.find("/api/vdc/" + admin.group(1), "vdc")
+            if vdc is None:
+                return self.error(404, "RESOURCE_NOT_FOUND", path)
+            elif method == "GET":
+                kind = "gateway" if admin.group(2) == "edgeGateways" else "network"
+                tag = "EdgeGatewayRecord" if kind == "gateway" else "OrgVdcNetworkRecord"
+                with estate.lock:
+                    return 200, records, estate.render_records(base, tag, vdc.members(kind))
+            tree = ET.fromstring(body)
+            if any(i.name == tree.attrib.get("name") for i in vdc.members("network")):
+                return self.error(400, "DUPLICATE_NAME", tree.attrib.get("name"))
+            net = estate.create_network(vdc, tree)
+            estate.task(net, "networkCreateOrgVdcNetwork")
+            return 201, net.type, estate.document(net, base)
+        elif method == "GET":
+            obj = estate.find(path)
+            if obj is None:
+                return self.error(404, "RESOURCE_NOT_FOUND", path)
+            return 200, obj.type, estate.document(obj, base)
+
+        obj = estate.find(action.group(1) if action else path)
+        if obj is None:
+            return self.error(404, "RESOURCE_NOT_FOUND", path)
+        elif method == "PUT":
+            obj.name = ET.fromstring(body).attrib.get("name", obj.name)
+            task = estate.task(obj, "update")
+            return 202, task.type, estate.document(task, base)
+        elif action is None:
+            return self.error(405, "METHOD_NOT_ALLOWED", path)
+
+        name = action.group(2)
+        tree = ET.fromstring(body) if body else None
+        if obj.kind == "vdc" and name == "instantiateVAppTemplate":
+            if any(i.name == tree.attrib.get("name") for i in obj.members("vapp")):
+                return self.error(400, "DUPLICATE_NAME", tree.attrib.get("name"))
+            vapp = estate.instantiate(obj, tree)
+            estate.task(vapp, "vdcInstantiateVapp")
+            return 201, vapp.type, estate.document(vapp, base)
+        elif obj.kind == "vapp" and name == "recomposeVApp":
+            estate.recompose(obj, tree)
+        elif obj.kind == "vm" and name == "reconfigureVm":
+            obj.name = tree.attrib.get("name", obj.name)
+        elif obj.kind == "gateway" and name == "configureServices":
+            obj.config["services"] = re.sub(r"^<\?xml[^>]*\?>", "", body.decode("utf-8"))
+        task = estate.task(obj, name)
+        return 202, task.type, estate.document(task, base)
+
+
+def parser(description=__doc__):
+    rv = argparse.ArgumentParser(description)
+    rv.add_argument(
+        "--host", default="127.0.0.1",
+        help="Address to serve on [127.0.0.1]")
+    rv.add_argument(
+        "--port", type=int, default=8080,
+        help="Port to serve on [8080]")
+    rv.add_argument(
+        "--vms", type=int, default=100,
+        help="Number of Vms in the estate [100]")
+    rv.add_argument(
+        "--orgs", type=int, default=1,
+        help="Number of Orgs in the estate [1]")
+    rv.add_argument(
+        "--vdcs", type=int, default=1,
+        help="Number of Vdcs in each Org [1]")
+    rv.add_argument(
+        "--vapp-size", type=int, default=4,
+        help="Number of Vms in each VApp [4]")
+    rv.add_argument(
+        "--templates", type=int, default=2,
+        help="Number of templates in the catalog of each Org [2]")
+    rv.add_argument(
+        "--latency", type=float, default=0,
+        help="Seconds to delay each response [0]")
+    rv.add_argument(
+        "--task-time", type=float, default=1.0,
+        help="Seconds for each task to run [1.0]")
+    return rv
+
+
+def main(args):
+    logging.basicConfig(level=logging.INFO)
+    log = logging.getLogger("maloja.bench.simulator")
+    estate = Estate(
+        vms=args.vms, orgs=args.orgs, vdcs=args.vdcs, vapp_size=args.vapp_size,
+        templates=args.templates, task_time=args.task_time
+    )
+    sim = Simulator(estate, host=args.host, port=args.port, latency=args.latency)
+    log.info("Serving {0} entities at {1}.".format(len(estate.entities), sim.url))
+    try:
+        sim.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    p = parser()
+    args = p.parse_args()
+    sys.exit(main(args))
@@ -15,27 +15,68 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+from collections import Counter
 from collections import namedtuple
+from collections import OrderedDict
 import concurrent.futures
+import heapq
+import itertools
 import logging
 import functools
 try:
     from functools import singledispatch
 except ImportError:
     from singledispatch import singledispatch
+import threading
 import time
+from urllib.parse import urlparse
 import warnings
 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
 import requests
+from requests.adapters import HTTPAdapter
+from requests.sessions import Session
+from requests.structures import CaseInsensitiveDict
 from requests_futures.sessions import FuturesSession
+from urllib3.connection import HTTPConnection
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.connectionpool import HTTPSConnectionPool
 
 from maloja.builder import Builder
+import maloja.metrics
+import maloja.tracer
+from maloja.types import Cancel
 from maloja.types import Credentials
+from maloja.types import Design
+from maloja.types import Inspection
+from maloja.types import Job
 from maloja.types import Plugin
 from maloja.types import Status
 from maloja.types import Stop
+from maloja.types import Survey
 from maloja.types import Token
 from maloja.types import Workflow
+from maloja.workflow.utils import SessionView
+from maloja.workflow.utils import api_url
+
+requests_in_flight = maloja.metrics.registry.gauge(
+    "maloja_requests_in_flight", "Requests sent to the API and awaiting a response."
+)
+requests_total = maloja.metrics.registry.counter(
+    "maloja_requests_total", "Requests made to the API, by method and status code.",
+    labels=("method", "code")
+)
+throttles_total = maloja.metrics.registry.counter(
+    "maloja_throttles_total", "Responses by which the API asked for fewer requests."
+)
 
 
 @singledispatch
@@ -50,12 +91,18 @@ def handler(msg, session, token, results=None, status=None, **kwargs):
     Every handler function receives these positional arguments:
 
     :param msg: the message object.
-    :param session: a *requests.futures* session object.
+    :param session: a *requests.futures* session object, or
+        an :py:class:`maloja.broker.AsyncSession`. A handler should
+        make a :py:class:`maloja.workflow.utils.SessionView` of it
+        for its own headers rather than change the session's.
     :param token: an authorization Token for the VMware API.
     :param results: a queue object so your handler can send back
         status messages.
     :param status: the current status at the point your handler
         is invoked.
+
+    A handler returns a sequence of futures for the Broker to wait on.
+    Under the asyncio engine a handler may also be a coroutine function.
     """
     warnings.warn("No handler registered for {0}.".format(type(msg)))
 
@@ -64,17 +111,12 @@ def handler(msg, session, token, results=None, status=None, **kwargs):
 def credentials_handler(msg, session, results=None, status=None, **kwargs):
     log = logging.getLogger("maloja.broker.credentials_handler")
     log.debug("Handling credentials.")
-    url = "{url}:{port}/{endpoint}".format(
-        url=msg.url,
-        port=443,
-        endpoint="api/sessions")
+    url = api_url(msg.url, "api/sessions")
 
     headers = {
         "Accept": "application/*+xml;version=5.5",
     }
-    session.headers.update(headers)
-    session.auth = (msg.user, msg.password)
-    future = session.post(url)
+    future = session.post(url, headers=headers, auth=(msg.user, msg.password))
     return (future,)
 
 
@@ -102,9 +144,242 @@ def workflow_handler(
             "Accept": "application/*+xml;version=5.5",
             token.key: token.value,
         }
-        session.headers.update(headers)
+        session = SessionView(session, headers)
         return (session.executor.submit(worker, session, token, callback, status),)
 
+class Governor:
+    """
+    The Governor paces requests to the API so as not to trip its limits.
+
+    A token bucket admits `rate` requests per second on average, with
+    bursts of up to `burst`. No more than `host_limit` requests to any
+    one host are in flight at once. Leave any of these as `None` for
+    no limit.
+
+    When the API answers 429 or 503, the Governor halves its rate and
+    pauses all requests for the time given by the `Retry-After` header,
+    or `backoff` seconds. Each successful response then restores the
+    rate by a small step, until it is back to `rate`.
+
+    """
+
+    throttled = (429, 503)
+
+    def __init__(
+        self, rate=None, burst=None, host_limit=None, backoff=1.0,
+        clock=time.monotonic, sleep=time.sleep
+    ):
+        self.rate = rate
+        self.burst = burst or 1
+        self.host_limit = host_limit
+        self.backoff = backoff
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.current = rate
+        self.due = clock()
+        self.paused = self.due
+        self.hosts = {}
+        self.throttles = 0
+
+    def reserve(self):
+        """
+        Take a token from the bucket, and return the number of seconds
+        to wait before using it.
+
+        """
+        with self.lock:
+            now = self.clock()
+            start = max(now, self.paused)
+            if self.current is not None:
+                interval = 1 / self.current
+                start = max(start, self.due - (self.burst - 1) * interval)
+                self.due = max(self.due, start) + interval
+            return start - now
+
+    def observe(self, status, headers=None):
+        """
+        Adapt the rate to the status code of a response.
+
+        """
+        log = logging.getLogger("maloja.broker.governor")
+        with self.lock:
+            if status in self.throttled:
+                self.throttles += 1
+                throttles_total.inc()
+                try:
+                    delay = float((headers or {}).get("Retry-After"))
+                except (TypeError, ValueError):
+                    delay = self.backoff
+                self.paused = max(self.paused, self.clock() + delay)
+                if self.rate is not None:
+                    self.current = max(self.rate / 64, self.current / 2)
+                log.warning("API returned {0}. Pausing {1:.1f}s; rate now {2}.".format(
+                    status, delay, self.current
+                ))
+            elif self.rate is not None and self.current < self.rate:
+                self.current = min(self.rate, self.current + self.rate / 32)
+
+    def slot(self, host):
+        """
+        Return the semaphore which caps the requests in flight to `host`.
+
+        """
+        if self.host_limit is None:
+            return None
+        with self.lock:
+            rv = self.hosts.get(host)
+            if rv is None:
+                rv = self.hosts[host] = threading.BoundedSemaphore(self.host_limit)
+            return rv
+
+    def acquire(self, host):
+        """
+        Wait for a token, then for a free slot to `host`. The slot is
+        returned for release once the request is done.
+
+        """
+        delay = self.reserve()
+        if delay > 0:
+            self.sleep(delay)
+        slot = self.slot(host)
+        if slot is not None:
+            slot.acquire()
+        return slot
+
+
+class TracedHTTPConnection(HTTPConnection):
+
+    def connect(self):
+        rv = super().connect()
+        maloja.tracer.mark("connect")
+        return rv
+
+
+class TracedHTTPSConnection(HTTPSConnection):
+
+    def connect(self):
+        rv = super().connect()
+        maloja.tracer.mark("connect")
+        return rv
+
+
+class TracedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TracedHTTPConnection
+
+
+class TracedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TracedHTTPSConnection
+
+
+class TracedAdapter(HTTPAdapter):
+    """
+    An HTTP adapter whose connections mark the `connect` phase of the
+    active span when they open.
+
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": TracedHTTPConnectionPool,
+            "https": TracedHTTPSConnectionPool,
+        }
+
+
+class BrokerSession(FuturesSession):
+    """
+    A *requests.futures* session with a connection pool of
+    `pool_size`, so that every worker in the executor may keep its
+    connection alive. Failed connections are retried `retries` times.
+    Requests which give no `timeout` of their own get the session's.
+
+    Every request passes through the session's :py:class:`Governor`.
+
+    Give a :py:class:`maloja.tracer.Tracer` as `tracer` to time each
+    request. A request may carry the `status` of its job as a tag.
+
+    """
+
+    def __init__(
+        self, executor=None, pool_size=10, retries=0, timeout=None, governor=None,
+        tracer=None
+    ):
+        super().__init__(executor=executor)
+        self.timeout = timeout
+        self.governor = governor or Governor()
+        self.tracer = tracer
+        self.adapter = TracedAdapter(pool_maxsize=pool_size, max_retries=retries)
+        self.mount("https://", self.adapter)
+        self.mount("http://", self.adapter)
+
+    def request(self, method, url, background_callback=None, status=None, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        if self.tracer is None:
+            return super().request(
+                method, url, background_callback=background_callback, **kwargs
+            )
+
+        span = self.tracer.span(method, url, status)
+        return self.executor.submit(
+            self.traced, span, method, url, background_callback, **kwargs
+        )
+
+    def traced(self, span, method, url, callback=None, **kwargs):
+        with self.tracer.trace(span):
+            rv = Session.request(self, method, url, **kwargs)
+            if callback is None:
+                return rv
+
+            with maloja.tracer.timed("callback"):
+                result = callback(self, rv)
+        return rv if result is None else result
+
+    def send(self, request, **kwargs):
+        span = maloja.tracer.current()
+        stream = kwargs.pop("stream", False)
+        slot = self.governor.acquire(urlparse(request.url).netloc)
+        requests_in_flight.inc()
+        try:
+            if span is not None:
+                span.mark("wait")
+            rv = super().send(request, stream=True, **kwargs)
+            if span is not None:
+                span.mark("ttfb")
+            if not stream:
+                rv.content
+            if span is not None:
+                span.mark("transfer")
+                span.code = rv.status_code
+                span.size = None if stream else len(rv.content)
+        except Exception:
+            requests_total.inc(method=request.method, code="error")
+            raise
+        finally:
+            requests_in_flight.dec()
+            if slot is not None:
+                slot.release()
+        requests_total.inc(method=request.method, code=rv.status_code)
+        self.governor.observe(rv.status_code, rv.headers)
+        return rv
+
+    @property
+    def connections(self):
+        """
+        Return the number of requests made and of connections opened
+        by the pools of this session.
+
+        """
+        pools = self.adapter.poolmanager.pools
+        rv = [0, 0]
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                rv[0] += pool.num_requests
+                rv[1] += pool.num_connections
+        return tuple(rv)
+
+
 class Broker:
     """
     The Broker manages all Maloja's interactions with the VMware API.
@@ -131,18 +406,209 @@ class Broker:
         tasks = concurrent.futures.wait(set(broker.tasks.values()))
     """
 
-    def __init__(self, operations, results, *args, executor=None, loop=None, **kwargs):
+    priorities = {Inspection: 3, Workflow: 4, Design: 4, Survey: 6}
+    """
+    Jobs waiting to start are taken in order of priority, lowest first.
+    Quick checks go ahead of long surveys. Messages of types not listed
+    here have priority 5. A packet may override this with a third item,
+    eg: `(id, msg, priority)`.
+    """
+
+    def __init__(
+        self, operations, results, *args,
+        executor=None, loop=None, pool_size=10, retries=0, timeout=None, governor=None,
+        tracer=None, max_jobs=4, **kwargs
+    ):
         super().__init__(*args, **kwargs)
         self.operations = operations
         self.results = results
         self.token = None
-        self.session = FuturesSession(executor=executor)
+        self.tracer = tracer
+        self.session = BrokerSession(
+            executor=executor, pool_size=pool_size, retries=retries, timeout=timeout,
+            governor=governor, tracer=tracer
+        )
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.pending = []
+        self.ops = {}
+        self.stops = {}
+        self.seq = itertools.count()
+
+    def job_table(self):
+        """
+        Return a copy of the job table.
+
+        """
+        with self.lock:
+            return list(self.jobs.values())
+
+    def submit(self, id_, msg, priority=None):
+        """
+        Enter a message in the job table, to start when there is room.
+
+        """
+        if priority is None:
+            priority = self.priorities.get(type(msg), 5)
+        with self.lock:
+            self.jobs[id_] = Job(id_, type(msg).__name__, "pending", 0, None, None)
+            self.stops[id_] = concurrent.futures.Future()
+            heapq.heappush(self.pending, (priority, next(self.seq), id_, msg))
+        self.start()
+
+    def start(self):
+        """
+        Launch pending jobs while fewer than `max_jobs` are running.
+
+        """
+        jobs = []
+        with self.lock:
+            running = sum(1 for i in self.jobs.values() if i.state in Job.active)
+            while self.pending and running < self.max_jobs:
+                priority, seq, id_, msg = heapq.heappop(self.pending)
+                if self.jobs[id_].state != "pending":
+                    continue
+                self.jobs[id_] = self.jobs[id_]._replace(state="running", started=time.time())
+                running += 1
+                jobs.append((id_, msg))
+        for id_, msg in jobs:
+            self.launch(id_, msg)
+
+    def launch(self, id_, msg):
+        return self.session.executor.submit(self.run_job, id_, msg)
+
+    def run_job(self, id_, msg):
+        log = logging.getLogger("maloja.broker.run_job")
+        status = Status(id_, 1, None)
+        state = "failed"
+        try:
+            ops = handler(
+                msg, SessionView(self.session, status=status), self.token,
+                results=JobResults(self, id_), status=status
+            )
+            ops = self.attach(id_, ops)
+            stop = self.stops[id_]
+            # A cancelled Future does not wake wait(); the stop Future does.
+            while not stop.done() and not all(op.done() for op in ops):
+                concurrent.futures.wait(
+                    ops + [stop], return_when=concurrent.futures.FIRST_COMPLETED
+                )
+            state = self.outcome([op for op in ops if op.done()])
+        except Exception as e:
+            log.error(str(getattr(e, "args", e) or e))
+        finally:
+            self.finish(id_, state)
+            self.results.put((status, None))
+            self.start()
+
+    def attach(self, id_, ops):
+        ops = list(ops or [])
+        with self.lock:
+            self.ops[id_] = ops
+            cancel = self.jobs[id_].state == "cancelling"
+        if cancel:
+            for op in ops:
+                op.cancel()
+        return ops
+
+    def outcome(self, done):
+        log = logging.getLogger("maloja.broker.outcome")
+        rv = "done"
+        for op in done:
+            if op.cancelled():
+                rv = "cancelled"
+            elif op.exception() is not None:
+                log.error(str(getattr(op.exception(), "args", None) or op.exception()))
+                rv = "failed"
+        return rv
+
+    def progress(self, id_):
+        with self.lock:
+            job = self.jobs.get(id_)
+            if job is not None:
+                self.jobs[id_] = job._replace(progress=job.progress + 1)
+
+    def finish(self, id_, state):
+        with self.changed:
+            job = self.jobs[id_]
+            if job.state == "cancelling":
+                state = "cancelled"
+            self.jobs[id_] = job._replace(state=state, finished=time.time())
+            self.ops.pop(id_, None)
+            self.stops.pop(id_, None)
+            self.changed.notify_all()
+
+    def cancel(self, id_):
+        """
+        Cancel a job. A job which has not started never will. A running
+        job has its futures cancelled, and is finished at once.
+
+        """
+        with self.changed:
+            job = self.jobs.get(id_)
+            if job is None:
+                return "No job {0}.".format(id_)
+            elif job.state == "pending":
+                self.jobs[id_] = job._replace(state="cancelled", finished=time.time())
+                self.stops.pop(id_, None)
+                self.changed.notify_all()
+                return "Job {0} cancelled.".format(id_)
+            elif job.state != "running":
+                return "Job {0} is {1}.".format(id_, job.state)
+            self.jobs[id_] = job._replace(state="cancelling")
+            ops = self.ops.get(id_, [])
+            stop = self.stops.get(id_)
+        for op in ops:
+            op.cancel()
+        if stop is not None and not stop.done():
+            stop.set_result(id_)
+        return "Cancelling job {0}.".format(id_)
+
+    def drain(self, timeout=None):
+        """
+        Wait until no job is pending or running.
+
+        """
+        with self.changed:
+            return self.changed.wait_for(
+                lambda: not any(i.state in Job.waiting for i in self.jobs.values()),
+                timeout=timeout
+            )
+
+    def authenticate(self, msg, response):
+        if response.status_code == requests.codes.ok:
+            token = Token(time.time(), msg.url, "x-vcloud-authorization", None)
+            self.token = token._replace(value=response.headers.get(token.key))
+            return self.token
+        else:
+            return "Authentication failed."
+
+    def report_connections(self):
+        log = logging.getLogger("maloja.broker.report_connections")
+        made, opened = self.session.connections
+        log.info("Made {0} requests over {1} connections ({2} reused).".format(
+            made, opened, max(0, made - opened)
+        ))
+        if self.session.governor.throttles:
+            log.info("API throttled {0} requests.".format(self.session.governor.throttles))
+        if self.tracer is not None:
+            self.tracer.report()
+            self.tracer.close()
 
     @property
     def routines(self):
         return []
 
     def operation_task(self):
+        """
+        Takes messages from the operations queue. Credentials and Cancel
+        messages are handled at once. Others become jobs which run
+        alongside each other. On a Stop, the task waits for every job to
+        finish before it ends.
+
+        """
         log = logging.getLogger("maloja.broker.operation_task")
         n = 0
         msg = object()
@@ -150,7 +616,7 @@ class Broker:
             try:
                 packet = self.operations.get()
                 n += 1
-                id_, msg = packet
+                id_, msg = packet[:2]
                 status = Status(id_, 1, None)
                 reply = None
                 if isinstance(msg, Credentials):
@@ -159,44 +625,390 @@ class Broker:
                         ops, timeout=6,
                         return_when=concurrent.futures.FIRST_EXCEPTION
                     )
-                    response = next(iter(tasks.done)).result(timeout=0)
-                    if response.status_code == requests.codes.ok:
-                        token = Token(time.time(), msg.url, "x-vcloud-authorization", None)
-                        self.token = token._replace(value=response.headers.get(token.key))
-                        reply = self.token
-                    else:
-                        reply = "Authentication failed."
+                    reply = self.authenticate(msg, next(iter(tasks.done)).result(timeout=0))
+                elif isinstance(msg, Cancel):
+                    reply = self.cancel(msg.job)
+                elif isinstance(msg, Stop):
+                    self.drain()
                 else:
                     log.debug(packet)
-                    ops = handler(
-                        msg, self.session, self.token,
-                        results=self.results, status=status)
-                    if ops:
-                        tasks = concurrent.futures.wait(
-                            ops, timeout=None,
-                            return_when=concurrent.futures.FIRST_EXCEPTION
-                        )
-                        response = next(iter(tasks.done)).result(timeout=0)
+                    self.submit(id_, msg, *packet[2:])
+                    continue
             except Exception as e:
                 log.error(str(getattr(e, "args", e) or e))
-            finally:
-                self.results.put((status, reply))
+            self.results.put((status, reply))
         else:
+            self.report_connections()
             return n
 
-def create_broker(operations, results, max_workers=None, loop=None):
+class JobResults:
+    """
+    Passes the results of a job to the Broker's results queue, counting
+    them as the progress of the job.
+
+    """
+
+    def __init__(self, broker, id_):
+        self.broker = broker
+        self.id = id_
+
+    def put(self, item, *args, **kwargs):
+        self.broker.progress(self.id)
+        return self.broker.results.put(item, *args, **kwargs)
+
+class AsyncResponse:
+    """
+    Presents a completed *aiohttp* response with those attributes
+    of a *requests* Response which Maloja relies upon.
+
+    """
+
+    def __init__(self, response, content):
+        self.status_code = response.status
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.content = content
+        self.encoding = response.charset or "utf-8"
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors="replace")
+
+class AsyncSession:
+    """
+    An asyncio counterpart to the *requests.futures* session.
+
+    It offers the same `get`, `post` and `put` methods, and calls
+    `background_callback` with the same arguments. Requests are timed
+    by the `tracer` as for the BrokerSession, except that the time to
+    connect is part of `ttfb`. Called from the
+    event loop, those methods return asyncio tasks. Called from any
+    other thread they return `concurrent.futures.Future` objects, so
+    code written for the thread pool runs unchanged.
+
+    Callbacks which are coroutine functions run on the event loop.
+    Plain functions run in the `executor`.
+
+    The session counts the connections its client opens and reuses,
+    through the trace hooks of *aiohttp*.
+
+    """
+
+    def __init__(
+        self, loop, executor=None, limit=100, timeout=None, governor=None, tracer=None
+    ):
+        self.loop = loop
+        self.executor = executor
+        self.limit = limit
+        self.timeout = timeout
+        self.governor = governor or Governor()
+        self.tracer = tracer
+        self.headers = CaseInsensitiveDict()
+        self.auth = None
+        self.client = None
+        self.opened = 0
+        self.reused = 0
+
+    @property
+    def in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def request(self, method, url, background_callback=None, **kwargs):
+        coro = self.fetch(method, url, background_callback=background_callback, **kwargs)
+        if self.in_loop:
+            return self.loop.create_task(coro)
+        else:
+            return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request("POST", url, data=data, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request("PUT", url, data=data, **kwargs)
+
+    @property
+    def connections(self):
+        """
+        Return the number of requests made and of connections opened
+        by the client of this session.
+
+        """
+        return (self.opened + self.reused, self.opened)
+
+    async def connection_created(self, client, ctx, params):
+        self.opened += 1
+
+    async def connection_reused(self, client, ctx, params):
+        self.reused += 1
+
+    @staticmethod
+    def call(span, func, *args):
+        with maloja.tracer.active(span):
+            return func(*args)
+
+    async def fetch(self, method, url, background_callback=None, status=None, **kwargs):
+        if self.tracer is None:
+            return await self.exchange(method, url, background_callback, None, **kwargs)
+
+        span = self.tracer.span(method, url, status)
+        with self.tracer.trace(span, activate=False):
+            return await self.exchange(method, url, background_callback, span, **kwargs)
+
+    async def exchange(self, method, url, background_callback=None, span=None, **kwargs):
+        if self.client is None:
+            hooks = aiohttp.TraceConfig()
+            hooks.on_connection_create_end.append(self.connection_created)
+            hooks.on_connection_reuseconn.append(self.connection_reused)
+            self.client = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.limit, limit_per_host=self.governor.host_limit or 0
+                ),
+                trace_configs=[hooks]
+            )
+
+        headers = dict(self.headers)
+        headers.update(kwargs.pop("headers", None) or {})
+        auth = kwargs.pop("auth", None) or self.auth
+        if auth is not None:
+            kwargs["auth"] = aiohttp.BasicAuth(*auth)
+        timeout = kwargs.pop("timeout", None) or self.timeout
+        if timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+
+        delay = self.governor.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if span is not None:
+            span.mark("wait")
+        requests_in_flight.inc()
+        try:
+            async with self.client.request(method, url, headers=headers, **kwargs) as rv:
+                if span is not None:
+                    span.mark("ttfb")
+                content = await rv.read()
+        except Exception:
+            requests_total.inc(method=method.upper(), code="error")
+            raise
+        finally:
+            requests_in_flight.dec()
+        response = AsyncResponse(rv, content)
+        requests_total.inc(method=method.upper(), code=response.status_code)
+        if span is not None:
+            span.mark("transfer")
+            span.code = response.status_code
+            span.size = len(content)
+        self.governor.observe(response.status_code, response.headers)
+
+        if background_callback is None:
+            return response
+        elif asyncio.iscoroutinefunction(background_callback):
+            await background_callback(self, response)
+        else:
+            await self.loop.run_in_executor(
+                self.executor, self.call, span, background_callback, self, response
+            )
+        if span is not None:
+            span.mark("callback")
+        return response
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.close()
+            self.client = None
+
+class AsyncBroker(Broker):
+    """
+    The AsyncBroker runs its operation task as a coroutine on an
+    asyncio event loop. HTTP requests are made with *aiohttp*, so the
+    number of requests in flight is not limited by the size of the
+    thread pool.
+
+    Handlers are dispatched exactly as for the Broker. They may return
+    asyncio tasks, `concurrent.futures.Future` objects, or be coroutine
+    functions themselves.
+
+    """
+
+    def __init__(
+        self, operations, results, *args,
+        executor=None, loop=None, pool_size=100, retries=0, timeout=None, governor=None,
+        tracer=None, **kwargs
+    ):
+        super().__init__(
+            operations, results, *args, executor=executor, loop=loop,
+            pool_size=pool_size, retries=retries, timeout=timeout, governor=governor,
+            tracer=tracer, **kwargs
+        )
+        self.loop = loop
+        self.session = AsyncSession(
+            loop, executor=executor, limit=pool_size, timeout=timeout, governor=governor,
+            tracer=tracer
+        )
+
+    @property
+    def routines(self):
+        return [self.operation_task]
+
+    def awaitable(self, op):
+        if isinstance(op, concurrent.futures.Future):
+            return asyncio.wrap_future(op, loop=self.loop)
+        else:
+            return asyncio.ensure_future(op, loop=self.loop)
+
+    async def dispatch(self, *args, **kwargs):
+        ops = handler(*args, **kwargs)
+        if asyncio.iscoroutine(ops):
+            ops = await ops
+        return [self.awaitable(i) for i in ops or []]
+
+    def launch(self, id_, msg):
+        return asyncio.run_coroutine_threadsafe(self.run_job(id_, msg), self.loop)
+
+    async def run_job(self, id_, msg):
+        log = logging.getLogger("maloja.broker.run_job")
+        status = Status(id_, 1, None)
+        state = "failed"
+        try:
+            ops = await self.dispatch(
+                msg, SessionView(self.session, status=status), self.token,
+                results=JobResults(self, id_), status=status
+            )
+            ops = self.attach(id_, ops)
+            stop = asyncio.wrap_future(self.stops[id_], loop=self.loop)
+            while not stop.done() and not all(op.done() for op in ops):
+                await asyncio.wait(ops + [stop], return_when=asyncio.FIRST_COMPLETED)
+            state = self.outcome([op for op in ops if op.done()])
+        except Exception as e:
+            log.error(str(getattr(e, "args", e) or e))
+        finally:
+            self.finish(id_, state)
+            self.results.put((status, None))
+            self.start()
+
+    async def operation_task(self):
+        log = logging.getLogger("maloja.broker.operation_task")
+        n = 0
+        msg = object()
+        while not isinstance(msg, Stop):
+            try:
+                packet = await self.loop.run_in_executor(
+                    self.session.executor, self.operations.get
+                )
+                n += 1
+                id_, msg = packet[:2]
+                status = Status(id_, 1, None)
+                reply = None
+                if isinstance(msg, Credentials):
+                    ops = await self.dispatch(msg, self.session)
+                    done, not_done = await asyncio.wait(ops, timeout=6)
+                    reply = self.authenticate(msg, next(iter(done)).result())
+                elif isinstance(msg, Cancel):
+                    reply = self.cancel(msg.job)
+                elif isinstance(msg, Stop):
+                    await self.loop.run_in_executor(self.session.executor, self.drain)
+                else:
+                    log.debug(packet)
+                    self.submit(id_, msg, *packet[2:])
+                    continue
+            except Exception as e:
+                log.error(str(getattr(e, "args", e) or e))
+            self.results.put((status, reply))
+        else:
+            await self.session.close()
+            self.report_connections()
+            return n
+
+def watch(broker, registry=maloja.metrics.registry):
+    """
+    Register gauges in `registry` which read the queues, the job table
+    and the executor of `broker`. A count of tasks queued in the
+    executor above zero shows that every worker thread is busy.
+
+    """
+    executor = broker.session.executor
+    registry.gauge(
+        "maloja_queue_depth", "Messages waiting in the queues of the Broker.",
+        labels=("queue",), func=lambda: [
+            ({"queue": "operations"}, broker.operations.qsize()),
+            ({"queue": "results"}, broker.results.qsize()),
+        ]
+    )
+    registry.gauge(
+        "maloja_jobs", "Jobs in the job table of the Broker, by state.",
+        labels=("state",), func=lambda: [
+            ({"state": k}, v)
+            for k, v in sorted(Counter(i.state for i in broker.job_table()).items())
+        ]
+    )
+    registry.gauge(
+        "maloja_executor_max_workers", "Worker threads the executor may start.",
+        func=lambda: getattr(executor, "_max_workers", 0)
+    )
+    registry.gauge(
+        "maloja_executor_threads", "Worker threads the executor has started.",
+        func=lambda: len(getattr(executor, "_threads", ()))
+    )
+    registry.gauge(
+        "maloja_executor_queued", "Tasks waiting for a worker thread.",
+        func=lambda: executor._work_queue.qsize()
+    )
+    return registry
+
+
+def create_broker(
+    operations, results, max_workers=None, loop=None,
+    pool_size=None, retries=0, timeout=None,
+    rate=None, burst=None, host_limit=None, max_jobs=4, tracer=None
+):
     """
     :param operations: a queue object. Push operations to this queue.
     :param results: a queue object. Get results from this queue.
     :param max_workers: the number of threads to use in the executor
         pool. Leave this as `None` to get a sensible default value.
-    :param loop: an asyncio loop object. *Not implemented*.
+    :param loop: an asyncio loop object. If supplied, the Broker will
+        run on this loop in a thread of its own, and use *aiohttp*
+        for its requests.
+    :param pool_size: the number of connections to keep open to the
+        API. Leave this as `None` to keep one for each worker thread,
+        or 100 for the asyncio engine.
+    :param retries: the number of times to retry a failed connection.
+    :param timeout: the number of seconds to wait for a response.
+    :param rate: the number of requests per second to allow on average.
+    :param burst: the number of requests to allow at once within the rate.
+    :param host_limit: the number of requests to have in flight to any
+        one host.
+    :param max_jobs: the number of jobs to run at once.
+    :param tracer: a :py:class:`maloja.tracer.Tracer` to time each request.
     :return: A new Broker object
     """
     executor = concurrent.futures.ThreadPoolExecutor(max_workers)
-    broker = Broker(operations, results, executor=executor, loop=loop)
-    for task in broker.tasks:
-        func = getattr(broker, task)
-        broker.tasks[task] = executor.submit(func)
+    governor = Governor(rate=rate, burst=burst, host_limit=host_limit)
+    if loop is None:
+        broker = Broker(
+            operations, results, executor=executor, loop=loop,
+            pool_size=pool_size or executor._max_workers, retries=retries, timeout=timeout,
+            governor=governor, tracer=tracer, max_jobs=max_jobs
+        )
+        for task in broker.tasks:
+            func = getattr(broker, task)
+            broker.tasks[task] = executor.submit(func)
+    else:
+        broker = AsyncBroker(
+            operations, results, executor=executor, loop=loop,
+            pool_size=pool_size or 100, retries=retries, timeout=timeout,
+            governor=governor, tracer=tracer, max_jobs=max_jobs
+        )
+        executor.submit(loop.run_forever)
+        for coro in broker.routines:
+            broker.tasks[coro.__name__] = asyncio.run_coroutine_threadsafe(coro(), loop)
+            broker.tasks[coro.__name__].add_done_callback(
+                lambda x: loop.call_soon_threadsafe(loop.stop)
+            )
 
     return broker
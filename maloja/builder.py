@@ -27,6 +27,7 @@ import uuid
 import warnings
 import xml.etree.ElementTree as ET
 
+import maloja.metrics
 from maloja.model import Gateway
 from maloja.model import Network
 from maloja.model import Org
@@ -38,11 +39,25 @@ from maloja.model import Vm
 from maloja.types import Credentials
 from maloja.types import Stop
 from maloja.workflow.utils import find_xpath
+from maloja.workflow.utils import parse_response
+from maloja.workflow.utils import RetryPolicy
+from maloja.workflow.utils import SessionView
 from maloja.workflow.utils import group_by_type
 
 from chameleon import PageTemplateFile
 import pkg_resources
 
+tasks_running = maloja.metrics.registry.gauge(
+    "maloja_builder_tasks_running", "VMware tasks the Builder is following."
+)
+tasks_total = maloja.metrics.registry.counter(
+    "maloja_builder_tasks_total", "VMware tasks the Builder followed to an end, by status.",
+    labels=("status",)
+)
+build_retries = maloja.metrics.registry.counter(
+    "maloja_builder_retries_total", "Builder requests which were tried again."
+)
+
 class Builder:
     """
     The Builder accepts a sequence of objects from the
@@ -68,7 +83,7 @@ class Builder:
                 "Accept": "application/*+xml;version=5.5",
                 token.key: token.value,
             }
-            session.headers.update(headers)
+            session = SessionView(session, headers)
             return (session.executor.submit(builder, session, token, callback, status),)
 
     @staticmethod
@@ -104,7 +119,7 @@ class Builder:
     def get_tasks(response):
         if response is None:
             return iter(tuple())
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         return (
             Task().feed_xml(elem)
             for elem in find_xpath(
@@ -113,35 +128,35 @@ class Builder:
             )
         )
 
-    def monitor(self, task, session, status=None, backoff=1):
+    def monitor(self, task, session, status=None):
         """
         The builder launches this method whenever a VMware task is
-        initiated. The method tracks the progress of the task.
+        initiated. The method tracks the progress of the task, polling
+        less often as time goes on.
 
         """
         log = logging.getLogger("maloja.builder.monitor")
 
-        while True:
-            self.send_status(status)
-            try:
-                time.sleep(backoff)
-                backoff = min(backoff + 2, 20)
+        tasks_running.inc()
+        try:
+            for n in itertools.count():
+                self.send_status(status)
+                try:
+                    time.sleep(min(self.retry.backoff(n), 20))
 
-                log.info("{0.operationName} is {0.status}.".format(task))
-                if task.status != "running":
-                    return task
-            except Exception as e:
-                log.error(e)
+                    log.info("{0.operationName} is {0.status}.".format(task))
+                    if task.status != "running":
+                        return task
+                except Exception as e:
+                    log.error(e)
 
-            response = None
-            while response is None:
                 response = Builder.check_response(
-                    *Builder.wait_for(
-                        session.get(task.owner.href),
-                        timeout=6
-                    )
+                    *self.request(session, "get", task.owner.href, timeout=6)
                 )
-            else:
+                if response is None:
+                    log.error("Unable to follow {0.operationName}.".format(task))
+                    return task
+
                 try:
                     task = next(Builder.get_tasks(response))
                 except (AttributeError, StopIteration, TypeError):
@@ -149,7 +164,43 @@ class Builder:
                     return task
                 except Exception as e:
                     log.error(e)
-                    response = None
+        finally:
+            tasks_running.dec()
+            tasks_total.inc(status=getattr(task, "status", None))
+
+    def request(self, session, method, url, timeout=30, **kwargs):
+        """
+        Makes a request and waits for it as :py:meth:`wait_for` does.
+        If the request fails, it is made again as the Builder's retry
+        policy allows.
+
+        """
+        log = logging.getLogger("maloja.builder.request")
+        attempt = None
+        while True:
+            done, not_done = Builder.wait_for(
+                getattr(session, method)(url, **kwargs), timeout=timeout
+            )
+            op = next(iter(done), None)
+            if op is None:
+                reason = "no response in {0}s".format(timeout)
+                failed = method.upper() in self.retry.idempotent
+            elif op.exception() is not None:
+                reason = op.exception()
+                failed = self.retry.retryable(exc=reason, method=method)
+            else:
+                reason = op.result().status_code
+                failed = self.retry.retryable(op.result(), method=method)
+
+            attempt = self.retry.next(attempt) if failed else None
+            if attempt is None:
+                if failed:
+                    log.error("Gave up on {0} {1} ({2}).".format(method.upper(), url, reason))
+                return (done, not_done)
+
+            log.warning("Retrying {0} in {1.delay:.1f}s ({2}).".format(url, attempt, reason))
+            build_retries.inc()
+            time.sleep(attempt.delay)
 
     @staticmethod
     def wait_for(*args, timeout=30):
@@ -176,6 +227,7 @@ class Builder:
         self.tasks = {}
         self.seq = itertools.count(1)
         self.working = False
+        self.retry = RetryPolicy()
 
     def __call__(self, session, token, callback=None, status=None, **kwargs):
         """
@@ -229,13 +281,12 @@ class Builder:
             endpoint="networks"
         )
         xml = macro(**data)
-        session.headers.update(
-            {"Content-Type": "application/vnd.vmware.vcloud.orgVdcNetwork+xml"})
+        headers = {"Content-Type": "application/vnd.vmware.vcloud.orgVdcNetwork+xml"}
 
         try:
             response = self.check_response(
-                *self.wait_for(
-                    session.post(url, data=xml)
+                *self.request(
+                    session, "post", url, data=xml, headers=headers
                 )
             )
             task = next(self.get_tasks(response))
@@ -256,14 +307,14 @@ class Builder:
         ns = "{http://www.vmware.com/vcloud/v1.5}"
         try:
             response = self.check_response(
-                *self.wait_for(
-                    session.get(self.plans[Vdc][0].href)
+                *self.request(
+                    session, "get", self.plans[Vdc][0].href
                 )
             )
         except (StopIteration, TypeError):
             self.send_status(status, stop=True)
         else:
-            tree = ET.fromstring(response.text)
+            tree = parse_response(response)
             for elem in tree.iter(ns + "Network"):
                 for net in self.built[Network]:
                     if net.name == elem.attrib.get("name"):
@@ -297,21 +348,20 @@ class Builder:
                 endpoint="action/instantiateVAppTemplate"
             )
             xml = macro(**data)
-            session.headers.update(
-                {"Content-Type": (
-                    "application/vnd.vmware.vcloud"
-                    ".instantiateVAppTemplateParams+xml"
-                )})
+            headers = {"Content-Type": (
+                "application/vnd.vmware.vcloud"
+                ".instantiateVAppTemplateParams+xml"
+            )}
 
             log.info("Instantiating...")
             try:
                 response = self.check_response(
-                    *self.wait_for(
-                        session.post(url, data=xml),
+                    *self.request(
+                        session, "post", url, data=xml, headers=headers,
                         timeout=None
                     )
                 )
-                tree = ET.fromstring(response.text)
+                tree = parse_response(response)
                 self.built[VApp].append(
                     VApp().feed_xml(
                         tree, ns="{http://www.vmware.com/vcloud/v1.5}"
@@ -361,18 +411,16 @@ class Builder:
             vapp=vapp,
             endpoint="action/recomposeVApp"
         )
-        session.headers.update(
-            {"Content-Type": "application/vnd.vmware.vcloud.recomposeVAppParams+xml"}
-        )
+        headers = {"Content-Type": "application/vnd.vmware.vcloud.recomposeVAppParams+xml"}
         log.info("Recomposing...")
         try:
             response = self.check_response(
-                *self.wait_for(
-                    session.post(url, data=xml),
+                *self.request(
+                    session, "post", url, data=xml, headers=headers,
                     timeout=None
                 )
             )
-            tree = ET.fromstring(response.text)
+            tree = parse_response(response)
             task = next(
                 self.get_tasks(response),
                 Task().feed_xml(
@@ -387,14 +435,14 @@ class Builder:
             self.send_status(status, stop=True)
 
         try:
-            response = self.check_response(*self.wait_for(session.get(vapp.href)))
+            response = self.check_response(*self.request(session, "get", vapp.href))
         except (StopIteration, TypeError):
             self.send_status(status, stop=True)
             return
 
         elems = list(find_xpath(
             "./*/*/[@type='application/vnd.vmware.vcloud.vm+xml']",
-            ET.fromstring(response.text)
+            parse_response(response)
         ))
         refs = {elem.attrib.get("name"): elem.attrib.get("href") for elem in elems}
         for vm in self.built[Vm]:
@@ -418,11 +466,11 @@ class Builder:
         gw = self.plans[Gateway][0]
         try:
             response = self.check_response(
-                *self.wait_for(
-                    session.get(gw.href)
+                *self.request(
+                    session, "get", gw.href
                 )
             )
-            tree = ET.fromstring(response.text)
+            tree = parse_response(response)
             endpoint = next(find_xpath((
                 ".//*[@type='application/vnd.vmware.admin"
                 ".edgeGatewayServiceConfiguration+xml']"),
@@ -489,22 +537,20 @@ class Builder:
         url = endpoint.attrib.get("href")
         xml = ET.tostring(elem, encoding="unicode")
         log.debug(xml)
-        session.headers.update(
-            {
-                "Content-Type": (
-                    "application/vnd.vmware.admin"
-                    ".edgeGatewayServiceConfiguration+xml"
-                )
-            }
-        )
+        headers = {
+            "Content-Type": (
+                "application/vnd.vmware.admin"
+                ".edgeGatewayServiceConfiguration+xml"
+            )
+        }
         try:
             response = self.check_response(
-                *self.wait_for(
-                    session.post(url, data=xml),
+                *self.request(
+                    session, "post", url, data=xml, headers=headers,
                     timeout=None
                 )
             )
-            tree = ET.fromstring(response.text)
+            tree = parse_response(response)
             task = next(
                 self.get_tasks(response),
                 Task().feed_xml(
@@ -538,21 +584,19 @@ class Builder:
                 ></VApp>""")
         }
 
-        session.headers.update(
-            {"Content-Type": "application/vnd.vmware.vcloud.vm+xml"}
-        )
+        headers = {"Content-Type": "application/vnd.vmware.vcloud.vm+xml"}
         for plan, built in zip(self.plans[Vm], self.built[Vm]):
             url = "{vm.href}/{endpoint}".format(
                 vm=built,
                 endpoint="action/reconfigureVm"
             )
             response = self.check_response(
-                *self.wait_for(
-                    session.post(url, data=templates[Vm].format(plan)),
+                *self.request(
+                    session, "post", url, data=templates[Vm].format(plan), headers=headers,
                     timeout=None
                 )
             )
-            tree = ET.fromstring(response.text)
+            tree = parse_response(response)
             task = next(
                 self.get_tasks(response),
                 Task().feed_xml(
@@ -563,16 +607,14 @@ class Builder:
 
         vapp = self.built[VApp][0]
         plan = self.plans[Template][0]
-        session.headers.update(
-            {"Content-Type": "application/vnd.vmware.vcloud.vApp+xml"}
-        )
+        headers = {"Content-Type": "application/vnd.vmware.vcloud.vApp+xml"}
         response = self.check_response(
-            *self.wait_for(
-                session.put(vapp.href, data=templates[VApp].format(plan)),
+            *self.request(
+                session, "put", vapp.href, data=templates[VApp].format(plan), headers=headers,
                 timeout=None
             )
         )
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         task = next(
             self.get_tasks(response),
             Task().feed_xml(
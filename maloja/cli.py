@@ -41,6 +41,46 @@ def add_api_options(parser):
         help="Registered user for API access")
     return parser
 
+def add_broker_options(parser):
+    parser.add_argument(
+        "--engine", default="threads", choices=["threads", "asyncio"],
+        help="Choose how the broker makes requests [threads]. "
+        "With asyncio, requests in flight need no thread, but survey "
+        "callbacks still run in the thread pool")
+    parser.add_argument(
+        "--pool-size", default=None, type=int,
+        help="Keep this many connections open to the API "
+        "[one per worker, or 100 for asyncio]")
+    parser.add_argument(
+        "--retries", default=0, type=int,
+        help="Retry a failed connection this many times [0]")
+    parser.add_argument(
+        "--timeout", default=None, type=float,
+        help="Wait this many seconds for each response [no limit]")
+    parser.add_argument(
+        "--rate", default=None, type=float,
+        help="Make no more than this many requests per second on average [no limit]")
+    parser.add_argument(
+        "--burst", default=None, type=int,
+        help="Allow this many requests at once within the rate [1]")
+    parser.add_argument(
+        "--host-limit", default=None, type=int,
+        help="Have no more than this many requests in flight to the API [no limit]")
+    parser.add_argument(
+        "--trace", action="store_true", default=False,
+        help="Time each request, and log histograms of the times at the end")
+    parser.add_argument(
+        "--trace-file", default=None,
+        help="Write the times of each request to this file as lines of JSON. "
+        "Implies --trace.")
+    parser.add_argument(
+        "--metrics-port", default=None, type=int,
+        help="Serve metrics in the Prometheus text format at /metrics on this port")
+    parser.add_argument(
+        "--metrics-host", default="127.0.0.1",
+        help="Address on which to serve metrics [127.0.0.1]")
+    return parser
+
 def add_builder_options(parser):
     parser.add_argument(
         "--input", required=True,
@@ -51,6 +91,20 @@ def add_cache_options(parser):
     parser.add_argument(
         "--output", default=DFLT_LOCN,
         help="path to output directory [{}]".format(DFLT_LOCN))
+    parser.add_argument(
+        "--store", default=None, choices=["yaml", "sqlite"],
+        help="Use a project which keeps its objects as YAML files or in SQLite. "
+        "By default, use the most recent project, or a new YAML one.")
+    parser.add_argument(
+        "--codec", default=None, choices=["roundtrip", "fast"],
+        help="Set how the project reads and writes YAML. "
+        "The fast codec uses libyaml and drops comments.")
+    return parser
+
+def add_export_options(parser):
+    parser.add_argument(
+        "--target", required=True,
+        help="path to a directory for the exported project")
     return parser
 
 def add_common_options(parser):
@@ -81,6 +135,13 @@ def add_planner_options(parser):
     )
     return parser
 
+def add_surveyor_options(parser):
+    parser.add_argument(
+        "--mode", default="tree", choices=["tree", "query", "incremental"],
+        help="Walk the object tree, query records in bulk, "
+        "or revisit only what has changed since the last survey [tree]")
+    return parser
+
 def parser(description=__doc__):
     return argparse.ArgumentParser(
         description,
@@ -91,6 +152,7 @@ def parsers(description=__doc__):
     rv = parser(description)
     rv = add_common_options(rv)
     rv = add_api_options(rv)
+    rv = add_broker_options(rv)
     rv = add_cache_options(rv)
     subparsers = rv.add_subparsers(
         dest="command",
@@ -101,6 +163,7 @@ def parsers(description=__doc__):
         help="Maloja 'survey' command.",
         description="Invokes the surveyor module to map your virtual infrastructure."
     )
+    p = add_surveyor_options(p)
 
     p = subparsers.add_parser(
         "plan",
@@ -123,6 +186,13 @@ def parsers(description=__doc__):
     )
     p = add_builder_options(p)
     p = add_inspector_options(p)
+
+    p = subparsers.add_parser(
+        "export",
+        help="Maloja 'export' command.",
+        description="Copies the current project to a YAML directory tree."
+    )
+    p = add_export_options(p)
     return (rv, subparsers)
 
 def cli():
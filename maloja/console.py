@@ -33,6 +33,8 @@ import ruamel.yaml
 
 from maloja.broker import Broker
 from maloja.broker import create_broker
+from maloja.broker import watch
+from maloja.metrics import MetricsServer
 from maloja.model import Catalog
 from maloja.model import Org
 from maloja.model import Template
@@ -40,7 +42,9 @@ from maloja.model import VApp
 from maloja.model import Vdc
 from maloja.model import Vm
 from maloja.surveyor import Surveyor
+from maloja.tracer import Tracer
 from maloja.types import Token
+from maloja.types import Cancel
 from maloja.types import Credentials
 from maloja.types import Stop
 from maloja.types import Survey
@@ -58,17 +62,17 @@ class Console(cmd.Cmd):
         "results_task": None,
     }
 
-    def __init__(self, operations, results, creds, ref, entry="", loop=None, **kwargs):
+    def __init__(
+        self, operations, results, creds, ref, entry="", loop=None, jobs=None, **kwargs
+    ):
         super().__init__(**kwargs)
         self.operations = operations
         self.results = results
         self.creds = creds
         self.ref = ref
         self.entry = entry
-        if loop is None:
-            self.commands = queue.Queue()
-        else:
-            self.commands = asyncio.Queue(loop=loop)
+        self.jobs = list if jobs is None else jobs
+        self.commands = queue.Queue()
         self.prompt = ""
         self.token = None
         self.stop = False
@@ -186,15 +190,55 @@ class Console(cmd.Cmd):
     def do_survey(self, arg):
         """
         'Survey' launches a survey over your cloud assets.
+        Add 'query' to pull records from the API in bulk, or
+        'incremental' to revisit only what has changed since the last
+        survey:
+
+            > survey
+            > survey query
+            > survey incremental
 
         """
         log = logging.getLogger("maloja.console.do_survey")
-        line = arg.strip()
+        line = arg.strip() or "tree"
+        if line not in ("tree", "query", "incremental"):
+            print("Survey mode {} not recognised.".format(line))
+            return
 
-        msg = Survey(self.ref)
+        msg = Survey(self.ref, line)
         packet = (next(self.seq), msg)
         self.operations.put(packet)
 
+    def do_jobs(self, arg):
+        """
+        'Jobs' lists the jobs you have started, with their progress:
+
+            > jobs
+
+        """
+        print("{0:>4} {1:<12} {2:<10} {3:>8} {4:>8}".format(
+            "id", "type", "state", "updates", "seconds"
+        ))
+        for job in self.jobs():
+            end = job.finished or time.time()
+            print("{0.id:>4} {0.type:<12} {0.state:<10} {0.progress:>8} {1:>8}".format(
+                job, "{0:.1f}".format(end - job.started) if job.started else "-"
+            ))
+
+    def do_cancel(self, arg):
+        """
+        'Cancel' stops a job. Give the job number shown by 'jobs':
+
+            > cancel 3
+
+        """
+        job = arg.strip()
+        if not job.isdigit():
+            print("Please give the number of the job to cancel.")
+            return
+
+        return Cancel(int(job))
+
     def do_clear(self, arg):
         """
         Clears the search results.
@@ -321,17 +365,26 @@ class Console(cmd.Cmd):
 
 def create_console(operations, results, options, path, loop=None):
     n = max(16, len(Broker.tasks) + len(Console.tasks) + len(path))
-    broker = create_broker(operations, results, max_workers=n, loop=loop)
+    tracer = Tracer(options.trace_file) if options.trace or options.trace_file else None
+    broker = create_broker(
+        operations, results, max_workers=n, loop=loop,
+        pool_size=options.pool_size, retries=options.retries, timeout=options.timeout,
+        rate=options.rate, burst=options.burst, host_limit=options.host_limit,
+        tracer=tracer
+    )
+    if options.metrics_port is not None:
+        watch(broker)
+        metrics = MetricsServer(host=options.metrics_host, port=options.metrics_port).start()
+        print("Serving metrics at {0}.".format(metrics.url))
 
     creds = Credentials(options.url, options.user, None)
-    console = Console(operations, results, creds, path, options.output, loop=loop)
-    if loop is not None:
-        # launch asyncio coroutines
-        for coro in console.routines:
-            loop.create_task(coro(executor, loop=loop))
-    else:
-        for task in console.tasks:
-            func = getattr(console, task)
-            console.tasks[task] = broker.session.executor.submit(func)
+    console = Console(
+        operations, results, creds, path, options.output, loop=loop, jobs=broker.job_table
+    )
+
+    # Console tasks block on user input, so they always run in threads.
+    for task in console.tasks:
+        func = getattr(console, task)
+        console.tasks[task] = broker.session.executor.submit(func)
 
     return console
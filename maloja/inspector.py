@@ -24,7 +24,6 @@ from urllib.parse import quote as urlquote
 from urllib.parse import urlparse
 import uuid
 import warnings
-import xml.etree.ElementTree as ET
 
 from maloja.builder import Builder
 from maloja.model import Gateway
@@ -39,6 +38,8 @@ from maloja.planner import read_objects
 from maloja.types import Credentials
 from maloja.types import Stop
 from maloja.workflow.utils import find_xpath
+from maloja.workflow.utils import parse_response
+from maloja.workflow.utils import SessionView
 from maloja.workflow.utils import group_by_type
 
 
@@ -65,7 +66,7 @@ class Inspector(Builder):
                 "Accept": "application/*+xml;version=5.5",
                 token.key: token.value,
             }
-            session.headers.update(headers)
+            session = SessionView(session, headers)
             return (
                 session.executor.submit(
                     inspector, session, token, callback, status, name=msg.name
@@ -116,12 +117,12 @@ class Inspector(Builder):
         vdc = self.plans[Vdc][0]
         networksUrl = None
         try:
-            response = self.check_response(*self.wait_for(session.get(vdc.href)))
+            response = self.check_response(*self.request(session, "get", vdc.href))
         except (StopIteration, TypeError):
             self.send_status(status, stop=True)
             return
 
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         networksUrl = next(find_xpath(
             "./*/[@type='application/vnd.vmware.vcloud.query.records+xml']",
             tree,
@@ -129,24 +130,24 @@ class Inspector(Builder):
         ), None)
 
         try:
-            response = self.check_response(*self.wait_for(
-                session.get(networksUrl.attrib.get("href"))
+            response = self.check_response(*self.request(
+                session, "get", networksUrl.attrib.get("href")
             ))
         except (StopIteration, TypeError):
             self.send_status(status, stop=True)
             return
 
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         nets = {}
         for elem in tree.iter(ns + "OrgVdcNetworkRecord"):
             try:
-                response = self.check_response(*self.wait_for(
-                    session.get(elem.attrib.get("href"))
+                response = self.check_response(*self.request(
+                    session, "get", elem.attrib.get("href")
                 ))
             except (StopIteration, TypeError):
                 self.send_status(status, stop=True)
             else:
-                tree = ET.fromstring(response.text)
+                tree = parse_response(response)
                 obj = Network().feed_xml(tree)
                 nets[obj.name] = obj
 
@@ -173,12 +174,12 @@ class Inspector(Builder):
         ns = "{http://www.vmware.com/vcloud/v1.5}"
         tgt = self.plans[Template][0]
         try:
-            response = self.check_response(*self.wait_for(session.get(tgt.href)))
+            response = self.check_response(*self.request(session, "get", tgt.href))
         except (StopIteration, TypeError) as e:
             self.send_status(status, stop=True)
             return
 
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         obj = VApp().feed_xml(tree)
 
         truth = set([(n, str(v)) for n, v in obj.elements])
@@ -198,12 +199,12 @@ class Inspector(Builder):
         ns = "{http://www.vmware.com/vcloud/v1.5}"
         vdc = self.plans[Vdc][0]
         try:
-            response = self.check_response(*self.wait_for(session.get(vdc.href)))
+            response = self.check_response(*self.request(session, "get", vdc.href))
         except (AttributeError, StopIteration, TypeError) as e:
             self.send_status(status, stop=True)
             return
 
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         ref = next(find_xpath(
             "./*/*/[@type='application/vnd.vmware.vcloud.vApp+xml']",
             tree,
@@ -215,14 +216,14 @@ class Inspector(Builder):
             return
 
         try:
-            response = self.check_response(*self.wait_for(
-                session.get(ref.attrib.get("href"))
+            response = self.check_response(*self.request(
+                session, "get", ref.attrib.get("href")
             ))
         except (AttributeError, StopIteration, TypeError):
             self.send_status(status, stop=True)
             return
 
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         obj = VApp().feed_xml(tree)
 
         url = urlparse(response.url)
@@ -232,7 +233,7 @@ class Inspector(Builder):
         ))
         vms = list(find_xpath(
             "./*/*/[@type='application/vnd.vmware.vcloud.vm+xml']",
-            ET.fromstring(response.text)
+            parse_response(response)
         ))
 
         if len(vms) > len(self.plans[Vm]):
@@ -243,14 +244,14 @@ class Inspector(Builder):
         for ref in vms:
             fault = False
             try:
-                response = self.check_response(*self.wait_for(
-                    session.get(ref.attrib.get("href"))
+                response = self.check_response(*self.request(
+                    session, "get", ref.attrib.get("href")
                 ))
             except (AttributeError, StopIteration, TypeError):
                 self.send_status(status, stop=True)
                 return
 
-            tree = ET.fromstring(response.text)
+            tree = parse_response(response)
             obj = Vm().feed_xml(tree)
 
             picks = {}
@@ -277,12 +278,12 @@ class Inspector(Builder):
         ns = "{http://www.vmware.com/vcloud/v1.5}"
         gw = self.plans[Gateway][0]
         try:
-            response = self.check_response(*self.wait_for(session.get(gw.href)))
+            response = self.check_response(*self.request(session, "get", gw.href))
         except (StopIteration, TypeError):
             self.send_status(status, stop=True)
             return
 
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         obj = Gateway().feed_xml(tree)
 
         truth = set([(n, str(v)) for n, v in obj.elements])
@@ -38,6 +38,9 @@ import maloja.console
 import maloja.inspector
 import maloja.surveyor
 import maloja.planner
+from maloja.metrics import MetricsServer
+from maloja.tracer import Tracer
+from maloja.model import Project
 from maloja.types import Credentials
 from maloja.types import Design
 from maloja.types import Inspection
@@ -46,6 +49,8 @@ from maloja.types import Stop
 from maloja.types import Survey
 from maloja.types import Token
 from maloja.workflow.path import Path
+from maloja.workflow.path import cache
+from maloja.workflow.path import export
 from maloja.workflow.path import make_project
 from maloja.workflow.path import find_project
 
@@ -71,27 +76,37 @@ def main(args):
     ch.setFormatter(formatter)
     log.addHandler(ch)
 
-    asyncio = None  # TODO: Tox testing
-    try:
-        loop = asyncio.SelectorEventLoop()
-        asyncio.set_event_loop(loop)
-        operations = asyncio.Queue(loop=loop)
-        results = asyncio.Queue(loop=loop)
-    except AttributeError:
-        loop = None
-        operations = queue.Queue()
-        results = queue.Queue()
+    loop = None
+    if args.engine == "asyncio":
+        if asyncio is None or maloja.broker.aiohttp is None:
+            log.warning("The asyncio engine requires aiohttp. Using threads.")
+        else:
+            loop = asyncio.new_event_loop()
+
+    operations = queue.Queue()
+    results = queue.Queue()
 
     os.makedirs(args.output, exist_ok=True)
 
+    store = None if args.store == "yaml" else args.store
     try:
-        path, proj = find_project(args.output)
+        path, proj = find_project(
+            args.output, Project(version=maloja.__version__, store=store)
+        )
+        if args.store is not None and proj.store != store:
+            raise StopIteration
         log.info("Using project {0}.".format(path.project))
     except StopIteration:
         log.info("No projects detected.")
-        path, proj = make_project(args.output)
+        path, proj = make_project(args.output, store=store)
         log.info("Created {0}.".format(path.project))
 
+    codec = None if args.codec == "roundtrip" else args.codec
+    if args.codec is not None and proj.codec != codec:
+        proj.codec = codec
+        cache(path, proj)
+        log.info("Project {0} uses the {1} codec.".format(path.project, args.codec))
+
     maloja.broker.handler.register(
         Survey, maloja.surveyor.Surveyor.survey_handler
     )
@@ -118,8 +133,22 @@ def main(args):
         with open(args.input, "r") as data:
             return maloja.planner.report(data)
 
+    elif args.command == "export":
+        rv = export(path, args.target)
+        log.info("Exported {0} to {1}.".format(path.project, rv.root))
+        return 0
+
     # Other commands require a broker
-    broker = maloja.broker.create_broker(operations, results, max_workers=64, loop=loop)
+    tracer = Tracer(args.trace_file) if args.trace or args.trace_file else None
+    broker = maloja.broker.create_broker(
+        operations, results, max_workers=64, loop=loop,
+        pool_size=args.pool_size, retries=args.retries, timeout=args.timeout,
+        rate=args.rate, burst=args.burst, host_limit=args.host_limit, tracer=tracer
+    )
+    if args.metrics_port is not None:
+        maloja.broker.watch(broker)
+        metrics = MetricsServer(host=args.metrics_host, port=args.metrics_port).start()
+        log.info("Serving metrics at {0}.".format(metrics.url))
 
     reply = None
     while not isinstance(reply, Token):
@@ -129,7 +158,7 @@ def main(args):
         status, reply = results.get()
 
     if args.command == "survey":
-        operations.put((1, Survey(path)))
+        operations.put((1, Survey(path, args.mode)))
 
     elif args.command == "build":
         objs = []
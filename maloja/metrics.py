@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+#   -*- encoding: UTF-8 -*-
+
+# Copyright Skyscape Cloud Services
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+import http.server
+import logging
+from socketserver import ThreadingMixIn
+import threading
+
+__doc__ = """
+Counters and gauges for a long-running Maloja process.
+
+The modules of Maloja keep their metrics in the module
+:py:data:`registry`. A :py:class:`MetricsServer` publishes them over
+HTTP in the Prometheus text format::
+
+    $ maloja --url=... --user=... --metrics-port=9180
+    $ curl http://127.0.0.1:9180/metrics
+
+"""
+
+
+def escape(val):
+    return str(val).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Metric:
+    """
+    The values of a metric, one for each combination of the values of
+    its `labels`.
+
+    A gauge may instead be given a function `func` to call when it is
+    read. The function returns a number, or a sequence of (labels, value)
+    pairs where the labels are a dictionary.
+
+    """
+
+    def __init__(self, name, help="", kind="counter", labels=(), func=None):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.func = func
+        self.lock = threading.Lock()
+        self.values = OrderedDict()
+
+    def key(self, labels):
+        return tuple(str(labels.get(i, "")) for i in self.labels)
+
+    def inc(self, n=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + n
+
+    def dec(self, n=1, **labels):
+        self.inc(-n, **labels)
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def value(self, **labels):
+        key = self.key(labels)
+        with self.lock:
+            return self.values.get(key, 0)
+
+    def samples(self):
+        """
+        Generate a (labels, value) pair for each value of the metric.
+
+        """
+        if self.func is None:
+            with self.lock:
+                items = list(self.values.items())
+            if not items and not self.labels:
+                items = [((), 0)]
+            for key, value in items:
+                yield (OrderedDict(zip(self.labels, key)), value)
+            return
+
+        rv = self.func()
+        if isinstance(rv, (int, float)):
+            yield (OrderedDict(), rv)
+        else:
+            yield from rv
+
+    def exposition(self):
+        lines = [
+            "# HELP {0} {1}".format(self.name, escape(self.help)),
+            "# TYPE {0} {1}".format(self.name, self.kind),
+        ]
+        for labels, value in self.samples():
+            tags = ",".join('{0}="{1}"'.format(k, escape(v)) for k, v in labels.items())
+            lines.append("{0}{1} {2}".format(
+                self.name, "{" + tags + "}" if tags else "", float(value)
+            ))
+        return "\n".join(lines)
+
+
+class Registry:
+    """
+    Keeps metrics by name. Asking again for a metric of the same name
+    returns the one already registered, except that a gauge given a new
+    `func` reads from that from then on.
+
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = OrderedDict()
+
+    def metric(self, name, help="", kind="counter", labels=(), func=None):
+        with self.lock:
+            rv = self.metrics.get(name)
+            if rv is None:
+                rv = self.metrics[name] = Metric(name, help, kind, labels, func)
+            elif func is not None:
+                rv.func = func
+            return rv
+
+    def counter(self, name, help="", labels=()):
+        return self.metric(name, help, "counter", labels)
+
+    def gauge(self, name, help="", labels=(), func=None):
+        return self.metric(name, help, "gauge", labels, func)
+
+    def exposition(self):
+        """
+        Return the text of every metric in the Prometheus format.
+
+        """
+        log = logging.getLogger("maloja.metrics.exposition")
+        with self.lock:
+            metrics = list(self.metrics.values())
+        rv = []
+        for metric in metrics:
+            try:
+                rv.append(metric.exposition())
+            except Exception as e:
+                log.error("Unable to read {0}: {1}".format(metric.name, e))
+        return "\n".join(rv) + "\n"
+
+
+registry = Registry()
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        data = self.server.registry.exposition().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        log = logging.getLogger("maloja.metrics.server")
+        log.debug(fmt % args)
+
+
+class Server(ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+class MetricsServer:
+    """
+    Serves the metrics of `registry` at `/metrics`, from a thread of
+    its own. Give 0 as the `port` to have one chosen.
+
+    """
+
+    def __init__(self, registry=registry, host="127.0.0.1", port=0):
+        self.server = Server((host, port), Handler)
+        self.server.registry = registry
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return "http://{0}:{1}/metrics".format(host, port)
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="maloja.metrics.server", daemon=True
+        )
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
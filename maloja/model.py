@@ -17,6 +17,7 @@
 
 from collections import namedtuple
 from collections import OrderedDict
+from collections.abc import Sequence
 import copy
 import functools
 import logging
@@ -39,22 +40,158 @@ them can be saved to file in a YAML representation.
 yaml_loads = functools.partial(ruamel.yaml.load, Loader=ruamel.yaml.RoundTripLoader)
 yaml_dumps = functools.partial(ruamel.yaml.dump, Dumper=ruamel.yaml.RoundTripDumper)
 
+# The fast codec uses libyaml through ruamel.yaml.clib when it is available
+FastLoader = getattr(ruamel.yaml, "CSafeLoader", ruamel.yaml.SafeLoader)
+FastDumper = getattr(ruamel.yaml, "CSafeDumper", ruamel.yaml.SafeDumper)
+fast_loads = functools.partial(ruamel.yaml.load, Loader=FastLoader)
+fast_dumps = functools.partial(ruamel.yaml.dump, Dumper=FastDumper, default_flow_style=False)
+
+codecs = {
+    None: (yaml_loads, yaml_dumps),
+    "fast": (fast_loads, fast_dumps),
+}
+"""
+The (loads, dumps) functions for each codec a project may use. The
+default round-trip codec preserves comments and layout, which matters
+for design files edited by hand. The fast codec writes the same YAML
+but does not keep comments.
+
+"""
+
+
+def represent_ordered(dumper, data):
+    if isinstance(dumper, ruamel.yaml.RoundTripDumper):
+        return dumper.represent_ordereddict(data)
+    else:
+        return dumper.represent_omap("tag:yaml.org,2002:omap", data)
 
 def dataobject_as_ordereddict(dumper, data, default_flow_style=False):
-    assert isinstance(dumper, ruamel.yaml.RoundTripDumper)
-    return dumper.represent_ordereddict(
-        OrderedDict([(k, getattr(data, k)) for k, v in data._defaults])
+    return represent_ordered(
+        dumper, OrderedDict([(k, getattr(data, k)) for k, v in data._defaults])
     )
 
 def namedtuple_as_dict(dumper, data, default_flow_style=False):
-    assert isinstance(dumper, ruamel.yaml.RoundTripDumper)
-    return dumper.represent_ordereddict(data._asdict())
+    return represent_ordered(dumper, data._asdict())
 
 def object_as_str(dumper, data, default_flow_style=False):
-    assert isinstance(dumper, ruamel.yaml.RoundTripDumper)
     return dumper.represent_str(str(data))
 
-class DataObject:
+class AddressRange(Sequence):
+    """
+    An AddressRange is a sequence of consecutive IP addresses which is
+    defined by its first and last members. It supports indexing, length,
+    membership and iteration without creating the addresses in between.
+
+    It has the same text format as a VMware address range, eg:
+    '192.168.1.2-192.168.1.100', or a single address when it has one
+    member.
+
+    """
+
+    def __init__(self, first, last=None):
+        self.first = ipaddress.ip_address(first)
+        self.last = self.first if last is None else ipaddress.ip_address(last)
+        self.span = range(int(self.first), int(self.last) + 1)
+
+    @classmethod
+    def from_network(cls, val):
+        net = ipaddress.ip_network(val)
+        if net.num_addresses > 2:
+            return cls(net.network_address + 1, net.broadcast_address - 1)
+        else:
+            return cls(net[0], net[-1])
+
+    def __len__(self):
+        return len(self.span)
+
+    def __getitem__(self, key):
+        typ = type(self.first)
+        if isinstance(key, slice):
+            span = self.span[key]
+            if span.step == 1 and span:
+                return AddressRange(typ(span[0]), typ(span[-1]))
+            return [typ(i) for i in span]
+        return typ(self.span[key])
+
+    def __contains__(self, item):
+        try:
+            item = ipaddress.ip_address(item)
+        except ValueError:
+            return False
+        return type(item) is type(self.first) and int(item) in self.span
+
+    def __iter__(self):
+        typ = type(self.first)
+        return (typ(i) for i in self.span)
+
+    def __eq__(self, other):
+        if isinstance(other, AddressRange):
+            return (self.first, self.last) == (other.first, other.last)
+        elif isinstance(other, Sequence) and not isinstance(other, str):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.first, self.last))
+
+    def __repr__(self):
+        return "{0}({1!r}, {2!r})".format(type(self).__name__, str(self.first), str(self.last))
+
+    def __str__(self):
+        if self.first == self.last:
+            return str(self.first)
+        return "{0}-{1}".format(self.first, self.last)
+
+
+class DataObjectType(type):
+    """
+    The metaclass of DataObject. It compiles the mapping between
+    XML and object attributes once for each class, rather than on
+    every call to `feed_xml`.
+
+    It also gives each class `__slots__` for the attributes named in
+    its `_defaults`, so that objects do not need a `__dict__`. A class
+    may declare `__slots__` for any other attributes it uses.
+
+    """
+
+    def __new__(meta, name, bases, attrs):
+        defaults = attrs.get("_defaults", getattr(bases[0], "_defaults", []) if bases else [])
+        extras = tuple(attrs.get("__slots__", ()))
+        attrs["__slots__"] = extras + tuple(
+            k for k, v in defaults
+            if k not in extras and not any(hasattr(i, k) for i in bases)
+        )
+        attrs["_extras"] = tuple(i for i in bases for i in getattr(i, "_extras", ())) + extras
+        attrs["_containers"] = {
+            k: v for k, v in defaults if isinstance(v, (dict, list, set))
+        }
+        return super().__new__(meta, name, bases, attrs)
+
+    def __init__(cls, name, bases, attrs):
+        super().__init__(name, bases, attrs)
+        cls._feeders = {}
+        cls.feeder("{http://www.vmware.com/vcloud/v1.5}")
+
+    def feeder(cls, ns):
+        """
+        Return a pair of dictionaries for XML in namespace `ns`. They
+        map XML attribute names and element tags to the attributes of
+        the object which they set.
+
+        """
+        try:
+            return cls._feeders[ns]
+        except KeyError:
+            fields = [k for k, v in cls._defaults if v is None]
+            rv = (
+                {k: k[0].lower() + k[1:] for k in fields},
+                {ns + k[0].upper() + k[1:]: k[0].lower() + k[1:] for k in fields}
+            )
+            return cls._feeders.setdefault(ns, rv)
+
+
+class DataObject(metaclass=DataObjectType):
 
     _defaults = []
 
@@ -75,9 +212,49 @@ class DataObject:
         Creates a fresh object, or one with attributes set by
         the `kwargs` dictionary.
 
+        Defaults are shared between objects, except for containers.
+        Each object gets a shallow copy of a default container when
+        it first uses that attribute.
+
+        """
+        for k, v in self._defaults:
+            if k in kwargs:
+                setattr(self, k, kwargs.pop(k))
+            elif k not in self._containers:
+                setattr(self, k, v)
+
+        if kwargs:
+            raise TypeError("{0} got unexpected attributes: {1}".format(
+                type(self).__name__, ", ".join(kwargs)
+            ))
+
+    def __getattr__(self, name):
+        # Only called when a slot is empty
+        try:
+            rv = copy.copy(self._containers[name])
+        except KeyError:
+            raise AttributeError("'{0}' object has no attribute '{1}'".format(
+                type(self).__name__, name
+            ))
+        setattr(self, name, rv)
+        return rv
+
+    @property
+    def __dict__(self):
+        """
+        A dictionary of the object's attributes, so that `vars()`
+        works as it would for an object without `__slots__`.
+
         """
-        data = copy.deepcopy(self._defaults) + list(kwargs.items())
-        for k, v in data:
+        rv = OrderedDict([(k, getattr(self, k)) for k, v in self._defaults])
+        rv.update((k, getattr(self, k)) for k in self._extras if hasattr(self, k))
+        return rv
+
+    def __getstate__(self):
+        return self.__dict__
+
+    def __setstate__(self, state):
+        for k, v in state.items():
             setattr(self, k, v)
 
     def __eq__(self, other):
@@ -94,7 +271,7 @@ class DataObject:
             try:
                 yield from obj.elements
             except AttributeError as e:
-                if isinstance(obj, (str, ipaddress.IPv4Address)):
+                if isinstance(obj, (str, ipaddress.IPv4Address, AddressRange)):
                     yield (name, obj)
                     return
 
@@ -117,26 +294,51 @@ class DataObject:
 
         """
         ns = kwargs.pop("ns", "")
-        fields = [k for k, v in self._defaults if v is None]
-        attribs = ((attr, tree.attrib.get(attr)) for attr in tree.attrib if attr in fields)
-        tags = [ns + k[0].upper() + k[1:] for k, v in self._defaults if v is None]
-        body = (
-            (elem.tag.replace(ns, ""), elem.text)
-            for elem in tree
-            if elem.tag in tags
-        )
-        for k, v in itertools.chain(attribs, body):
-            setattr(self, k[0].lower() + k[1:], self.typecast(v))
+        attribs, tags = type(self).feeder(ns)
+        typecast = self.typecast
+        for k, v in tree.attrib.items():
+            if k in attribs:
+                setattr(self, attribs[k], typecast(v))
+        for elem in tree:
+            if elem.tag in tags:
+                setattr(self, tags[elem.tag], typecast(elem.text))
         return self
 
+
+def load_object(typ, data):
+    """
+    Create an object of type `typ` from `data` loaded from the cache.
+
+    Unlike calling `typ` directly, keys which the type does not define
+    are logged and dropped, so that a file written by another version
+    of Maloja can still be read.
+
+    """
+    log = logging.getLogger("maloja.model.load_object")
+    data = data or {}
+    known = {k for k, v in typ._defaults}
+    unknown = [k for k in data if k not in known]
+    if unknown:
+        log.warning("Dropped unknown attributes of {0}: {1}".format(
+            typ.__name__, ", ".join(unknown)
+        ))
+        data = {k: v for k, v in data.items() if k in known}
+    return typ(**data)
+
 class Project(DataObject):
     """
     Available for storing Maloja project information.
 
+    The `store` attribute selects how the objects in a project are
+    kept. It may be None for YAML files, or 'sqlite' for a database.
+    The `codec` attribute may be None for round-trip YAML, or 'fast'.
+
     """
 
     _defaults = [
         ("version", None),
+        ("store", None),
+        ("codec", None),
     ]
 
 class Catalog(DataObject):
@@ -205,13 +407,11 @@ class Gateway(DataObject):
             pass
 
         try:
-            slice_ = [ipaddress.ip_address(i.strip()) for i in val.split("-")]
-            span = int(slice_[-1]) - int(slice_[0]) + 1
-            return [slice_[0] + i for i in range(span)]
-        except ValueError:
+            return AddressRange(*(i.strip() for i in val.split("-")))
+        except (TypeError, ValueError):
             pass
 
-        return list(ipaddress.ip_network(val).hosts())
+        return AddressRange.from_network(val)
 
     @staticmethod
     def typecast(val):
@@ -221,6 +421,14 @@ class Gateway(DataObject):
                 rv = Gateway.servicecast(rv)
             except ValueError:
                 pass
+        elif isinstance(rv, list) and rv and all(isinstance(i, str) for i in rv):
+            # A list of consecutive addresses from an earlier version
+            try:
+                addrs = [ipaddress.ip_address(i) for i in rv]
+            except ValueError:
+                return rv
+            if all(int(b) - int(a) == 1 for a, b in zip(addrs, addrs[1:])):
+                rv = AddressRange(addrs[0], addrs[-1])
         return rv
 
     def __init__(self, **kwargs):
@@ -344,9 +552,14 @@ class Network(DataObject):
         self.defaultGateway = next(iter(Gateway.typecast(self.defaultGateway) or (None,)))
         self.netmask = next(iter(Gateway.typecast(self.netmask) or (None,)))
         if self.dhcp is not None:
-            self.dhcp = Network.DHCP(pool=[
-                addr for i in self.dhcp["pool"] for addr in Gateway.typecast(i)
-            ])
+            pool = self.dhcp["pool"]
+            if isinstance(pool, str):
+                self.dhcp = Network.DHCP(pool=Gateway.typecast(pool))
+            else:
+                addrs = [addr for i in pool or () for addr in Gateway.typecast(i)]
+                self.dhcp = Network.DHCP(
+                    pool=AddressRange(addrs[0], addrs[-1]) if addrs else None
+                )
 
     def feed_xml(self, tree, ns="{http://www.vmware.com/vcloud/v1.5}"):
         """
@@ -358,6 +571,15 @@ class Network(DataObject):
         self.dns = [tree.attrib.get("dns1"), tree.attrib.get("dns2")]
         super().feed_xml(tree, ns=ns)
 
+        if tree.tag == ns + "OrgVdcNetworkRecord":
+            self.defaultGateway = next(iter(Gateway.servicecast(
+                tree.attrib.get("defaultGateway")
+            )), None)
+            self.netmask = next(iter(Gateway.servicecast(
+                tree.attrib.get("netmask")
+            )), None)
+            return self
+
         scope = tree.find(
             "./*/*/{}IpScope".format(ns)
         )
@@ -376,10 +598,10 @@ class Network(DataObject):
         if config is not None:
             elem = config.find(ns + "Pool")
         if elem is not None:
-            self.dhcp = Network.DHCP(pool=[
-                next(iter(Gateway.servicecast(elem.find(ns + "LowIpAddress").text)), None),
-                next(iter(Gateway.servicecast(elem.find(ns + "HighIpAddress").text)), None),
-            ])
+            self.dhcp = Network.DHCP(pool=AddressRange(
+                elem.find(ns + "LowIpAddress").text,
+                elem.find(ns + "HighIpAddress").text
+            ))
         return self
 
 class Org(DataObject):
@@ -407,6 +629,8 @@ class Task(DataObject):
 
     """
 
+    __slots__ = ("owner",)
+
     _defaults = [
         ("name", None),
         ("href", None),
@@ -527,6 +751,24 @@ class Vm(DataObject):
         23: namedtuple("USBController", []),
     }
 
+    rasdNs = (
+        "{http://schemas.dmtf.org/wbem/wscim/1/cim-schema/"
+        "2/CIM_ResourceAllocationSettingData}"
+    )
+
+    rasdTags = {
+        k: frozenset((
+            "{http://schemas.dmtf.org/wbem/wscim/1/cim-schema/"
+            "2/CIM_ResourceAllocationSettingData}" + i
+        ).lower() for i in typ._fields)
+        for k, typ in rasd.items()
+    }
+    """
+    The lower case tags of the fields in each `rasd` type, keyed
+    by resource type.
+
+    """
+
     HardDisk = namedtuple(
         "HardDisk", ["name", "capacity"]
     )
@@ -604,10 +846,11 @@ class Vm(DataObject):
 
         """
 
-        if tree.tag in (ns + "Owner", ns + "VAppTemplate", ns + "Vm", ns + "VMRecord"):
+        records = (ns + "VMRecord", ns + "AdminVMRecord")
+        if tree.tag in (ns + "Owner", ns + "VAppTemplate", ns + "Vm") + records:
             super().feed_xml(tree, ns=ns)
 
-        if tree.tag == ns + "VMRecord":
+        if tree.tag in records:
             try:
                 val = int(tree.attrib.get("hardwareVersion"))
                 if val not in self.hardwareVersion:
@@ -630,18 +873,12 @@ class Vm(DataObject):
                 except (AttributeError, TypeError, ValueError):
                     pass
 
-            hardware = find_xpath(
-                "./*/{}Item".format("{http://schemas.dmtf.org/ovf/envelope/1}"), tree
-            )
-            rasdNs = (
-                "{http://schemas.dmtf.org/wbem/wscim/1/cim-schema/"
-                "2/CIM_ResourceAllocationSettingData}"
-            )
+            hardware = tree.iterfind("./*/{http://schemas.dmtf.org/ovf/envelope/1}Item")
+            resourceType = Vm.rasdNs + "ResourceType"
             for item in hardware:
-                key = int(getattr(item.find(rasdNs + "ResourceType"), "text", "0"))
-                typ = Vm.rasd[key]
-                fields = [(rasdNs + i).lower() for i in typ._fields]
-                obj = typ(*(i for i in list(item) if i.tag.lower() in fields))
+                key = int(getattr(item.find(resourceType), "text", "0"))
+                fields = Vm.rasdTags[key]
+                obj = Vm.rasd[key](*(i for i in item if i.tag.lower() in fields))
                 if key == 3:
                     self.cpu = int(obj.virtualQuantity.text)
                 elif key == 4:
@@ -683,21 +920,29 @@ class Vm(DataObject):
 
         return self
 
-ruamel.yaml.RoundTripDumper.add_representer(ipaddress.IPv4Address, object_as_str)
-ruamel.yaml.RoundTripDumper.add_representer(Catalog, dataobject_as_ordereddict)
-ruamel.yaml.RoundTripDumper.add_representer(Gateway, dataobject_as_ordereddict)
-ruamel.yaml.RoundTripDumper.add_representer(Gateway.FW, namedtuple_as_dict)
-ruamel.yaml.RoundTripDumper.add_representer(Gateway.DNAT, namedtuple_as_dict)
-ruamel.yaml.RoundTripDumper.add_representer(Gateway.SNAT, namedtuple_as_dict)
-ruamel.yaml.RoundTripDumper.add_representer(Network, dataobject_as_ordereddict)
-ruamel.yaml.RoundTripDumper.add_representer(Network.DHCP, namedtuple_as_dict)
-ruamel.yaml.RoundTripDumper.add_representer(Org, dataobject_as_ordereddict)
-ruamel.yaml.RoundTripDumper.add_representer(Project, dataobject_as_ordereddict)
-ruamel.yaml.RoundTripDumper.add_representer(Template, dataobject_as_ordereddict)
-ruamel.yaml.RoundTripDumper.add_representer(VApp, dataobject_as_ordereddict)
-ruamel.yaml.RoundTripDumper.add_representer(Vdc, dataobject_as_ordereddict)
-ruamel.yaml.RoundTripDumper.add_representer(Vm, dataobject_as_ordereddict)
-ruamel.yaml.RoundTripDumper.add_representer(Vm.HardDisk, namedtuple_as_dict)
-ruamel.yaml.RoundTripDumper.add_representer(Vm.NetworkCard, namedtuple_as_dict)
-ruamel.yaml.RoundTripDumper.add_representer(Vm.NetworkConnection, namedtuple_as_dict)
-ruamel.yaml.RoundTripDumper.add_representer(Vm.SCSIController, namedtuple_as_dict)
+# Qualify the names of nested types so that objects which contain them can be pickled
+for cls in (Gateway, Network, Vm):
+    for name, attr in list(vars(cls).items()):
+        if isinstance(attr, type) and issubclass(attr, tuple) and attr.__name__ == name:
+            attr.__qualname__ = "{0}.{1}".format(cls.__name__, name)
+
+for dumper in (ruamel.yaml.RoundTripDumper, FastDumper):
+    dumper.add_representer(ipaddress.IPv4Address, object_as_str)
+    dumper.add_representer(AddressRange, object_as_str)
+    dumper.add_representer(Catalog, dataobject_as_ordereddict)
+    dumper.add_representer(Gateway, dataobject_as_ordereddict)
+    dumper.add_representer(Gateway.FW, namedtuple_as_dict)
+    dumper.add_representer(Gateway.DNAT, namedtuple_as_dict)
+    dumper.add_representer(Gateway.SNAT, namedtuple_as_dict)
+    dumper.add_representer(Network, dataobject_as_ordereddict)
+    dumper.add_representer(Network.DHCP, namedtuple_as_dict)
+    dumper.add_representer(Org, dataobject_as_ordereddict)
+    dumper.add_representer(Project, dataobject_as_ordereddict)
+    dumper.add_representer(Template, dataobject_as_ordereddict)
+    dumper.add_representer(VApp, dataobject_as_ordereddict)
+    dumper.add_representer(Vdc, dataobject_as_ordereddict)
+    dumper.add_representer(Vm, dataobject_as_ordereddict)
+    dumper.add_representer(Vm.HardDisk, namedtuple_as_dict)
+    dumper.add_representer(Vm.NetworkCard, namedtuple_as_dict)
+    dumper.add_representer(Vm.NetworkConnection, namedtuple_as_dict)
+    dumper.add_representer(Vm.SCSIController, namedtuple_as_dict)
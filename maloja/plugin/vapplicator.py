@@ -130,14 +130,16 @@ class Workflow:
             endpoint="action/instantiateVAppTemplate"
         )
         xml = macro(**data)
+        headers = {
+            "Content-Type": "application/vnd.vmware.vcloud.instantiateVAppTemplateParams+xml"
+        }
         op = session.post(
             url,
-            data=xml
+            data=xml,
+            headers=headers
         )
-        session.headers.update(
-            {"Content-Type": "application/vnd.vmware.vcloud.instantiateVAppTemplateParams+xml"})
 
-        log.debug(session.headers)
+        log.debug(headers)
         log.debug(xml)
         done, not_done = concurrent.futures.wait(
             [op], timeout=3,
@@ -15,15 +15,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import concurrent.futures
 import functools
 import logging
+import math
 import os
 import os.path
-import time
+import threading
 from urllib.parse import quote as urlquote
 from urllib.parse import urlparse
-import xml.etree.ElementTree as ET
 import xml.sax.saxutils
 
 from requests.exceptions import HTTPError
@@ -39,30 +40,323 @@ from maloja.model import Vm
 from maloja.model import yaml_dumps
 from maloja.model import yaml_loads
 
+import maloja.metrics
 import maloja.types
 from maloja.types import Status
 from maloja.types import Survey
 
+from maloja.workflow.utils import api_url
 from maloja.workflow.utils import find_xpath
+from maloja.workflow.utils import iter_records
+from maloja.workflow.utils import parse_response
+from maloja.workflow.utils import parse_stats
+from maloja.workflow.utils import RetryPolicy
+from maloja.workflow.utils import SessionView
 from maloja.workflow.path import cache
 from maloja.workflow.path import find_ypath
 from maloja.workflow.path import split_to_path
+from maloja.workflow.path import Validators
+from maloja.workflow.path import WriteStats
+from maloja.workflow.path import counting
+from maloja.workflow.path import writer
 
 
+survey_pending = maloja.metrics.registry.gauge(
+    "maloja_survey_requests_pending", "Survey requests made and not yet handled."
+)
+survey_retries = maloja.metrics.registry.counter(
+    "maloja_survey_retries_total", "Survey requests which were tried again."
+)
+
+
+class Tracker:
+    """
+    A Tracker counts the requests of a survey which are still pending.
+
+    Survey callbacks schedule their child requests through the Tracker
+    and then return at once. The Tracker's `future` completes when
+    every request has been made and its callback has finished.
+
+    The Tracker holds itself pending until :py:meth:`release` is called,
+    so a survey cannot complete while its first requests are scheduled.
+    Cancelling its future stops the survey; no further requests are made.
+
+    Functions in `hooks` are called when the last request is done, before
+    the future completes. If that happens on an event loop, the hooks
+    run in `executor` instead, so that they do not hold up the loop.
+
+    Requests which fail are tried again according to the `retry` policy,
+    which is shared by every request of the survey.
+
+    The Tracker's `stats` count the cache files written by the survey.
+
+    """
+
+    def __init__(self, validators=None, retry=None, executor=None):
+        self.lock = threading.Lock()
+        self.pending = 1
+        self.total = 0
+        self.future = concurrent.futures.Future()
+        self.validators = validators
+        self.retry = retry or RetryPolicy()
+        self.executor = executor
+        self.stats = WriteStats()
+        self.hooks = []
+
+    def add(self, op):
+        with self.lock:
+            self.pending += 1
+            self.total += 1
+        survey_pending.inc()
+        op.add_done_callback(self.discard)
+        return op
+
+    def discard(self, op):
+        log = logging.getLogger("maloja.surveyor.tracker")
+        survey_pending.dec()
+        if not op.cancelled() and op.exception() is not None:
+            log.error(op.exception())
+        self.release()
+
+    def release(self):
+        with self.lock:
+            self.pending -= 1
+            finished = self.pending == 0
+        if not finished:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.finish()
+        else:
+            loop.run_in_executor(self.executor, self.finish)
+
+    def finish(self):
+        log = logging.getLogger("maloja.surveyor.tracker")
+        for hook in self.hooks:
+            try:
+                hook()
+            except Exception as e:
+                log.error(e)
+        try:
+            self.future.set_result(self.total)
+        except concurrent.futures.InvalidStateError:
+            # Cancelled meanwhile
+            pass
+
+    @property
+    def cancelled(self):
+        return self.future.cancelled()
+
 class Surveyor:
     """
     The Surveyor is responsible for exploring a virtual infrastructure.
     It starts at Org level and finds networks and Edge Gateways. It
     descends down through vDCs, via catalogs and vApps to Vms.
 
-    The Surveyor is a singleton; only one survey may run at a time.
-    It is stateless; all necessary data is passed on from
-    one task to the next, or else saved into YAML files.
+    Several surveys may run at once, each with a :py:class:`Tracker`
+    of its own. The Surveyor is stateless; all necessary data is passed
+    on from one task to the next, or else saved into YAML files.
+
+    No callback waits for the requests it makes. Each one schedules
+    its child requests and returns. A :py:class:`Tracker` follows
+    the requests which are still pending.
+    """
+
+    pageSize = 128
+    """The number of records requested in each page of a query survey."""
+
+    contained = ("on_template", "on_vapp")
+    """
+    The callbacks for documents which contain all their children. When an
+    incremental survey finds one unchanged, it skips the whole subtree.
     """
 
     @staticmethod
-    def survey_handler(msg, session, token, callback=None, results=None, status=None, **kwargs):
+    def report_parsing(stats=parse_stats):
+        log = logging.getLogger("maloja.surveyor.report_parsing")
+        for key, rec in sorted(stats.report().items()):
+            log.debug(
+                "Parsed {0.count} {1} documents ({0.size} bytes) in {0.seconds:.3f}s".format(
+                    rec, key or "untyped"
+                )
+            )
+
+    @staticmethod
+    def report_writing(stats, results=None, status=None):
+        """
+        Sends a summary of the files written and skipped, as counted
+        in the `stats` of a survey.
+
+        """
+        log = logging.getLogger("maloja.surveyor.report_writing")
+        counts = stats.report()
+        msg = "Survey wrote {0} files; skipped {1} unchanged.".format(
+            counts["written"], counts["skipped"]
+        )
+        log.debug("{0} ({1} coalesced, {2} failed)".format(
+            msg, counts["coalesced"], counts["failed"]
+        ))
+        if results and status:
+            results.put((status, msg))
+        return msg
+
+    @staticmethod
+    def schedule(session, url, callback, tracker=None, attempt=None):
+        if tracker is not None and tracker.cancelled:
+            return None
+
+        kwargs = {}
+        validators = getattr(tracker, "validators", None)
+        if callback is None:
+            # Nothing to parse; the request is made for its own sake.
+            op = session.get(url)
+            if tracker is not None:
+                tracker.add(op)
+            return op
+        elif validators is not None:
+            validators.add_child(url, callback.func.__name__, callback.args[0])
+            kwargs["headers"] = validators.conditions(url)
+
+        if tracker is None:
+            return session.get(url, background_callback=callback, **kwargs)
+
+        op = session.get(
+            url, background_callback=functools.partial(
+                Surveyor.on_response, url, callback, tracker=tracker, attempt=attempt
+            ),
+            **kwargs
+        )
+        op.add_done_callback(functools.partial(
+            Surveyor.on_failure, session, url, callback, tracker=tracker, attempt=attempt
+        ))
+        tracker.add(op)
+        return op
+
+    @staticmethod
+    def on_response(url, callback, session, response, tracker=None, attempt=None):
+        """
+        Passes a response to `callback`, unless the API was too busy to
+        give one. Then the request is retried.
+
+        """
+        if tracker.retry.retryable(response):
+            return Surveyor.retry(
+                session, url, callback, tracker, attempt, reason=response.status_code
+            )
+
+        with counting(tracker.stats):
+            if tracker.validators is not None:
+                return Surveyor.on_conditional(
+                    url, callback, session, response, tracker=tracker
+                )
+            else:
+                return callback(session, response)
+
+    @staticmethod
+    def on_failure(session, url, callback, op, tracker=None, attempt=None):
+        exc = None if op.cancelled() else op.exception()
+        if exc is not None and tracker.retry.retryable(exc=exc):
+            Surveyor.retry(session, url, callback, tracker, attempt, reason=exc)
+
+    @staticmethod
+    def retry(session, url, callback, tracker, attempt=None, reason=None):
+        """
+        Schedules a request again after the delay given by the retry
+        policy of the survey. The Tracker holds the survey pending until
+        then. No thread waits for the delay.
+
+        """
+        log = logging.getLogger("maloja.surveyor.retry")
+        attempt = tracker.retry.next(attempt)
+        if attempt is None:
+            log.error("Gave up on {0} ({1}).".format(url, reason))
+            return None
+
+        log.warning("Retrying {0} in {1.delay:.1f}s ({2}).".format(url, attempt, reason))
+        survey_retries.inc()
+        pending = tracker.add(concurrent.futures.Future())
+        timer = threading.Timer(
+            attempt.delay, Surveyor.resume,
+            args=(session, url, callback, tracker, attempt, pending)
+        )
+        timer.daemon = True
+        timer.start()
+        return attempt
+
+    @staticmethod
+    def resume(session, url, callback, tracker, attempt, pending):
+        try:
+            Surveyor.schedule(session, url, callback, tracker, attempt=attempt)
+        finally:
+            pending.set_result(attempt)
+
+    @staticmethod
+    def on_conditional(url, callback, session, response, tracker=None):
+        """
+        Handles the response to a conditional request in an incremental
+        survey. If the document has changed, `callback` processes it.
+        Otherwise the requests it led to last time are made again.
+
+        """
+        log = logging.getLogger("maloja.surveyor.on_conditional")
+        validators = tracker.validators
+        if not validators.unchanged(url, response):
+            validators.update(url, response)
+            validators.parent = url
+            try:
+                return callback(session, response)
+            finally:
+                validators.parent = None
+
+        log.debug("Unchanged: {0}".format(url))
+        if callback.func.__name__ in Surveyor.contained:
+            return
+
+        for name, href, path in validators.children(url):
+            Surveyor.schedule(
+                session, href,
+                functools.partial(
+                    getattr(Surveyor, name), path,
+                    results=callback.keywords.get("results"),
+                    status=callback.keywords.get("status"),
+                    tracker=tracker
+                ),
+                tracker
+            )
+
+    @staticmethod
+    def survey_handler(
+        msg, session, token, callback=None, results=None, status=None, retry=None, **kwargs
+    ):
         log = logging.getLogger("maloja.survey.handler")
+        if msg.mode == "incremental":
+            validators = Validators(msg.path)
+        else:
+            validators = None
+        tracker = Tracker(
+            validators=validators, retry=retry, executor=getattr(session, "executor", None)
+        )
+
+        # Cache files are written behind the survey; they must be saved before it completes
+        tracker.hooks.append(writer.flush)
+        if validators is not None:
+            tracker.hooks.append(validators.save)
+        tracker.hooks.append(Surveyor.report_parsing)
+        tracker.hooks.append(functools.partial(
+            Surveyor.report_writing, tracker.stats, results=results, status=status
+        ))
+        headers = {
+            "Accept": "application/*+xml;version=5.5",
+            token.key: token.value,
+        }
+        session = SessionView(session, headers)
+        if msg.mode == "query":
+            Surveyor.query_survey(msg.path, session, token, results, status, tracker)
+            tracker.release()
+            return (tracker.future,)
+
         if msg.path.project and not any(msg.path[2:-1]):
             endpoints = [
                 (
@@ -71,7 +365,8 @@ class Surveyor:
                         Surveyor.on_org_list,
                         msg.path,
                         results=results,
-                        status=status
+                        status=status,
+                        tracker=tracker
                     )
                 )
             ]
@@ -79,30 +374,259 @@ class Surveyor:
             endpoints = [
                 ("api/catalogs/query", None)
             ]
-        rv = []
+
         for endpoint, callback in endpoints:
             log.debug("Scheduling  GET to {0}".format(endpoint))
-            url = "{url}:{port}/{endpoint}".format(
-                url=token.url,
-                port=443,
-                endpoint=endpoint)
+            url = api_url(token.url, endpoint)
+
+            Surveyor.schedule(session, url, callback, tracker)
+
+        tracker.release()
+        return (tracker.future,)
+
+    @staticmethod
+    def query_survey(path, session, token, results=None, status=None, tracker=None):
+        """
+        A query survey pulls records from the typed query API in bulk
+        pages, then assembles the same tree of YAML files as a full survey.
+
+        It runs in two phases. First it finds all Orgs and Vdcs, since
+        every other record is placed in the tree by reference to them.
+        Then it queries the remaining types concurrently. Only Edge
+        Gateways are fetched individually, because their records do not
+        carry the gateway's rules.
+
+        Records carry fewer details than full documents. In particular,
+        Vms surveyed this way have no hardware sections.
+
+        """
+        refs = {"orgs": {}, "vdcs": {}, "catalogs": set(), "lock": threading.Lock()}
+        phase = Tracker(
+            retry=getattr(tracker, "retry", None), executor=getattr(tracker, "executor", None)
+        )
+        for typ, on_record in [
+            ("organization", Surveyor.on_org_record),
+            ("adminOrgVdc", Surveyor.on_vdc_record),
+        ]:
+            query = Surveyor.query_url(token.url, typ)
+            Surveyor.schedule(
+                session, query.format(page=1),
+                functools.partial(
+                    Surveyor.on_query, path,
+                    results=results, status=status, tracker=phase,
+                    query=query, on_record=on_record, refs=refs
+                ),
+                phase
+            )
+
+        phase.future.add_done_callback(
+            lambda x: Surveyor.on_query_phase(
+                path, session, token.url,
+                results=results, status=status, tracker=tracker, refs=refs
+            )
+        )
+        if tracker is not None:
+            tracker.add(phase.future)
+        phase.release()
+        return phase.future
+
+    @staticmethod
+    def query_url(url, typ):
+        """
+        Return the url of a query for records of the given type. It
+        has a `{page}` field for formatting with the page number.
+
+        """
+        return api_url(
+            url, "api/query?type={typ}&format=records&pageSize={size}&page={{page}}".format(
+                typ=typ, size=Surveyor.pageSize
+            )
+        )
+
+    @staticmethod
+    def on_query_phase(path, session, url, results=None, status=None, tracker=None, refs=None):
+        log = logging.getLogger("maloja.surveyor.on_query_phase")
+
+        with counting(getattr(tracker, "stats", None)):
+            for href, (orgHref, obj) in refs["vdcs"].items():
+                org = refs["orgs"].get(orgHref)
+                if org is None:
+                    log.warning("No Org found for Vdc {0.name}".format(obj))
+                    continue
+                cache(
+                    path._replace(org=org, service=obj.name, file="vdc.yaml"), obj, defer=True
+                )
+
+        for typ, on_record in [
+            ("adminVApp", Surveyor.on_vapp_record),
+            ("adminVM", Surveyor.on_vm_record),
+            ("orgVdcNetwork", Surveyor.on_network_record),
+            ("edgeGateway", Surveyor.on_edge_record),
+            ("catalogItem", Surveyor.on_catalogitem_record),
+            ("vAppTemplate", Surveyor.on_template_record),
+        ]:
+            query = Surveyor.query_url(url, typ)
+            Surveyor.schedule(
+                session, query.format(page=1),
+                functools.partial(
+                    Surveyor.on_query, path,
+                    results=results, status=status, tracker=tracker,
+                    query=query, on_record=on_record, refs=refs
+                ),
+                tracker
+            )
+
+    @staticmethod
+    def on_query(
+        path, session, response, results=None, status=None, tracker=None,
+        query=None, on_record=None, refs=None
+    ):
+        log = logging.getLogger("maloja.surveyor.on_query")
+
+        tree = parse_response(response)
+        if int(tree.attrib.get("page", 1)) == 1:
+            total = int(tree.attrib.get("total", 0))
+            size = int(tree.attrib.get("pageSize", Surveyor.pageSize))
+            ops = [Surveyor.schedule(
+                session, query.format(page=n),
+                functools.partial(
+                    Surveyor.on_query, path,
+                    results=results, status=status, tracker=tracker,
+                    query=query, on_record=on_record, refs=refs
+                ),
+                tracker
+            ) for n in range(2, math.ceil(total / size) + 1)]
+
+        ns = "{http://www.vmware.com/vcloud/v1.5}"
+        for elem in tree:
+            if elem.tag.startswith(ns) and elem.tag.endswith("Record"):
+                on_record(
+                    path, session, elem, refs,
+                    results=results, status=status, tracker=tracker
+                )
+
+        if results and status:
+            results.put((status._replace(path=path), None))
+
+    @staticmethod
+    def locate(path, refs, vdcHref):
+        """
+        Return the path to the Vdc with the given href, or None if
+        it is not known.
+
+        """
+        orgHref, vdc = refs["vdcs"].get(vdcHref, (None, None))
+        org = refs["orgs"].get(orgHref)
+        if org is None:
+            return None
+        else:
+            return path._replace(org=org, service=vdc.name)
+
+    @staticmethod
+    def on_org_record(path, session, elem, refs, results=None, status=None, tracker=None):
+        obj = Org().feed_xml(elem)
+        obj.fullName = elem.attrib.get("displayName")
+        obj.type = "application/vnd.vmware.vcloud.org+xml"
+        refs["orgs"][obj.href] = obj.name
+        cache(path._replace(org=obj.name, file="org.yaml"), obj, defer=True)
+
+    @staticmethod
+    def on_vdc_record(path, session, elem, refs, results=None, status=None, tracker=None):
+        obj = Vdc().feed_xml(elem)
+        obj.type = "application/vnd.vmware.vcloud.vdc+xml"
+        refs["vdcs"][obj.href] = (elem.attrib.get("org"), obj)
+
+    @staticmethod
+    def on_vapp_record(path, session, elem, refs, results=None, status=None, tracker=None):
+        path = Surveyor.locate(path, refs, elem.attrib.get("vdc"))
+        if path is not None:
+            obj = VApp().feed_xml(elem)
+            obj.type = "application/vnd.vmware.vcloud.vApp+xml"
+            cache(
+                path._replace(category="vapps", container=obj.name, file="vapp.yaml"),
+                obj, defer=True
+            )
+
+    @staticmethod
+    def on_vm_record(path, session, elem, refs, results=None, status=None, tracker=None):
+        ns = "{http://www.vmware.com/vcloud/v1.5}"
+        path = Surveyor.locate(path, refs, elem.attrib.get("vdc"))
+        if path is None:
+            return
+
+        obj = Vm().feed_xml(elem, ns=ns)
+        obj.type = "application/vnd.vmware.vcloud.vm+xml"
+        if elem.attrib.get("isVAppTemplate") == "true":
+            path = path._replace(service="catalogs", category=elem.attrib.get("catalogName"))
+        else:
+            path = path._replace(category="vapps")
+        path = path._replace(
+            container=elem.attrib.get("containerName"), node=obj.name, file="vm.yaml"
+        )
+        cache(path, obj, defer=True)
+
+    @staticmethod
+    def on_network_record(path, session, elem, refs, results=None, status=None, tracker=None):
+        ns = "{http://www.vmware.com/vcloud/v1.5}"
+        path = Surveyor.locate(path, refs, elem.attrib.get("vdc"))
+        if path is not None:
+            obj = Network().feed_xml(elem, ns=ns)
+            obj.type = "application/vnd.vmware.vcloud.orgVdcNetwork+xml"
+            path = path._replace(category="networks", container=obj.name, file="network.yaml")
+            cache(path, obj, defer=True)
+
+    @staticmethod
+    def on_edge_record(path, session, elem, refs, results=None, status=None, tracker=None):
+        path = Surveyor.locate(path, refs, elem.attrib.get("vdc"))
+        if path is not None:
+            Surveyor.schedule(
+                session, elem.attrib.get("href"),
+                functools.partial(
+                    Surveyor.on_gateway, path,
+                    results=results, status=status, tracker=tracker
+                ),
+                tracker
+            )
 
-            headers = {
-                "Accept": "application/*+xml;version=5.5",
-                token.key: token.value,
-            }
-            session.headers.update(headers)
-            rv.append(session.get(url, background_callback=callback))
-        return rv
+    @staticmethod
+    def on_catalogitem_record(
+        path, session, elem, refs, results=None, status=None, tracker=None
+    ):
+        path = Surveyor.locate(path, refs, elem.attrib.get("vdc"))
+        href = elem.attrib.get("catalog")
+        if path is None:
+            return
+
+        with refs["lock"]:
+            new = href not in refs["catalogs"]
+            refs["catalogs"].add(href)
+        if new:
+            obj = Catalog(
+                name=elem.attrib.get("catalogName"), href=href,
+                type="application/vnd.vmware.vcloud.catalog+xml"
+            )
+            path = path._replace(service="catalogs", category=obj.name, file="catalog.yaml")
+            cache(path, obj, defer=True)
 
+    @staticmethod
+    def on_template_record(path, session, elem, refs, results=None, status=None, tracker=None):
+        org = refs["orgs"].get(elem.attrib.get("org"))
+        if org is not None:
+            obj = Template().feed_xml(elem)
+            obj.type = "application/vnd.vmware.vcloud.vAppTemplate+xml"
+            obj.dateCreated = elem.attrib.get("creationDate")
+            path = path._replace(
+                org=org, service="catalogs", category=elem.attrib.get("catalogName"),
+                container=obj.name, file="template.yaml"
+            )
+            cache(path, obj, defer=True)
 
     @staticmethod
-    def on_vmrecords(path, session, response, results=None, status=None):
+    def on_vmrecords(path, session, response, results=None, status=None, tracker=None):
         log = logging.getLogger("maloja.surveyor.on_vmrecords")
 
         ns = "{http://www.vmware.com/vcloud/v1.5}"
-        tree = ET.fromstring(response.text)
-        for elem in tree.iter(ns + "VMRecord"):
+        for elem in iter_records(response, ns + "VMRecord"):
             obj = Vm().feed_xml(elem, ns=ns)
             path = path._replace(node=obj.name, file="vm.yaml")
             found, obj = next(find_ypath(path, obj), (None, obj))
@@ -112,17 +636,17 @@ class Surveyor:
 
             # Update the existing object with attributes from the VMRecord
             obj.feed_xml(elem, ns=ns)
-            cache(path, obj)
+            cache(path, obj, defer=True)
 
             if results and status:
                 results.put((status._replace(path=path), None))
 
     @staticmethod
-    def on_vm(path, session, response, results=None, status=None):
+    def on_vm(path, session, response, results=None, status=None, tracker=None):
         log = logging.getLogger("maloja.surveyor.on_vm")
 
         ns = "{http://www.vmware.com/vcloud/v1.5}"
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         path = path._replace(file="vm.yaml")
         obj = Vm()
         found, obj = next(find_ypath(path, obj), (None, obj))
@@ -131,153 +655,138 @@ class Surveyor:
 
         # Update the existing object with attributes from the VM
         obj.feed_xml(tree, ns=ns)
-        cache(path, obj)
+        cache(path, obj, defer=True)
 
         if results and status:
             results.put((status._replace(path=path), None))
 
     @staticmethod
-    def on_template(path, session, response, results=None, status=None):
+    def on_template(path, session, response, results=None, status=None, tracker=None):
         log = logging.getLogger("maloja.surveyor.on_template")
 
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         obj = Template().feed_xml(tree, ns="{http://www.vmware.com/vcloud/v1.5}")
         path = path._replace(file="template.yaml")
-        cache(path, obj)
+        cache(path, obj, defer=True)
 
         vms = find_xpath(
             "./*/*/[@type='application/vnd.vmware.vcloud.vm+xml']",
-            ET.fromstring(response.text)
+            tree
         )
-        ops = [session.get(
-            vm.attrib.get("href"),
-            background_callback=functools.partial(
+        ops = [Surveyor.schedule(
+            session, vm.attrib.get("href"),
+            functools.partial(
                 Surveyor.on_vm,
                 path._replace(node=vm.attrib.get("name")),
                 results=results,
-                status=status._replace(job=status.job + n) if status else None
-            )
+                status=status._replace(job=status.job + n) if status else None,
+                tracker=tracker
+            ),
+            tracker
         ) for n, vm in enumerate(vms)]
-        tasks = concurrent.futures.wait(
-            ops, timeout=3 * len(ops),
-            return_when=concurrent.futures.FIRST_EXCEPTION
-        )
         if results and status:
             results.put((status._replace(path=path), None))
 
     @staticmethod
-    def on_catalogitem(path, session, response, results=None, status=None):
+    def on_catalogitem(path, session, response, results=None, status=None, tracker=None):
         log = logging.getLogger("maloja.surveyor.on_catalogitem")
 
         templates = find_xpath(
             ".//*[@type='application/vnd.vmware.vcloud.vAppTemplate+xml']",
-            ET.fromstring(response.text)
+            parse_response(response)
         )
         templates = list(templates)
-        ops = [session.get(
-            tmplt.attrib.get("href"),
-            background_callback=functools.partial(
+        ops = [Surveyor.schedule(
+            session, tmplt.attrib.get("href"),
+            functools.partial(
                 Surveyor.on_template,
                 path._replace(container=tmplt.attrib.get("name")),
                 results=results,
-                status=status._replace(job=status.job + n) if status else None
-            )
+                status=status._replace(job=status.job + n) if status else None,
+                tracker=tracker
+            ),
+            tracker
         ) for n, tmplt in enumerate(templates)]
-        tasks = concurrent.futures.wait(
-            ops, timeout=3 * len(ops),
-            return_when=concurrent.futures.FIRST_EXCEPTION
-        )
         if results and status:
             results.put((status._replace(path=path), None))
 
     @staticmethod
-    def on_edgeGateway(path, session, response, results=None, status=None):
+    def on_edgeGateway(path, session, response, results=None, status=None, tracker=None):
         log = logging.getLogger("maloja.surveyor.on_edgeGateway")
         log.debug(path)
 
-        obj = None
         ns = "{http://www.vmware.com/vcloud/v1.5}"
-        tree = ET.fromstring(response.text)
-        backoff = 5
-        try:
-            elem = next(tree.iter(ns + "EdgeGatewayRecord"))
-            while True:
-                op = session.get(elem.attrib.get("href"))
-                done, not_done = concurrent.futures.wait(
-                    [op], timeout=10,
-                    return_when=concurrent.futures.FIRST_EXCEPTION
-                )
-                try:
-                    response = done.pop().result()
-                    if response.status_code != 200:
-                        raise HTTPError(response.status_code)
-                except (HTTPError, KeyError):
-                    time.sleep(backoff)
-                    backoff += 5
-                else:
-                    tree = ET.fromstring(response.text)
-                    log.debug(response.text)
-                    obj = Gateway().feed_xml(tree, ns=ns)
-                    break
-
-        except Exception as e:
-            log.error(e)
-
-        if obj is None:
+        tree = parse_response(response)
+        elem = next(tree.iter(ns + "EdgeGatewayRecord"), None)
+        if elem is None:
             log.warning("Found no Edge Gateway.")
         else:
-            path = path._replace(file="edge.yaml")
-            fP = cache(path, obj)
+            Surveyor.schedule(
+                session, elem.attrib.get("href"),
+                functools.partial(
+                    Surveyor.on_gateway, path,
+                    results=results, status=status, tracker=tracker
+                ),
+                tracker
+            )
+
+    @staticmethod
+    def on_gateway(path, session, response, results=None, status=None, tracker=None):
+        log = logging.getLogger("maloja.surveyor.on_gateway")
+
+        if response.status_code != 200:
+            log.warning("Edge Gateway request returned {0}.".format(response.status_code))
+            return
+
+        ns = "{http://www.vmware.com/vcloud/v1.5}"
+        tree = parse_response(response)
+        log.debug(response.text)
+        obj = Gateway().feed_xml(tree, ns=ns)
+        path = path._replace(file="edge.yaml")
+        fP = cache(path, obj, defer=True)
 
         if results and status:
             results.put((status._replace(path=path), None))
 
     @staticmethod
-    def on_orgVdcNetwork(path, session, response, results=None, status=None):
+    def on_orgVdcNetwork(path, session, response, results=None, status=None, tracker=None):
         log = logging.getLogger("maloja.surveyor.on_orgVdcNetwork")
 
         ns = "{http://www.vmware.com/vcloud/v1.5}"
-        tree = ET.fromstring(response.text)
-        backoff = 5
-        try:
-            for elem in tree.iter(ns + "OrgVdcNetworkRecord"):
-                obj = None
-                while True:
-                    op = session.get(elem.attrib.get("href"))
-                    done, not_done = concurrent.futures.wait(
-                        [op], timeout=10,
-                        return_when=concurrent.futures.FIRST_EXCEPTION
-                    )
-                    try:
-                        response = done.pop().result()
-                        if response.status_code != 200:
-                            raise HTTPError(response.status_code)
-                    except (HTTPError, KeyError):
-                        time.sleep(backoff)
-                        backoff += 5
-                    else:
-                        tree = ET.fromstring(response.text)
-                        obj = Network().feed_xml(tree, ns=ns)
-                        break
-
-                if obj is not None:
-                    path = path._replace(container=obj.name, file="network.yaml")
-                    fP = cache(path, obj)
-
-        except Exception as e:
-            log.error(e)
+        ops = [Surveyor.schedule(
+            session, elem.attrib.get("href"),
+            functools.partial(
+                Surveyor.on_network, path,
+                results=results, status=status, tracker=tracker
+            ),
+            tracker
+        ) for elem in iter_records(response, ns + "OrgVdcNetworkRecord")]
+
+    @staticmethod
+    def on_network(path, session, response, results=None, status=None, tracker=None):
+        log = logging.getLogger("maloja.surveyor.on_network")
+
+        if response.status_code != 200:
+            log.warning("Network request returned {0}.".format(response.status_code))
+            return
+
+        ns = "{http://www.vmware.com/vcloud/v1.5}"
+        tree = parse_response(response)
+        obj = Network().feed_xml(tree, ns=ns)
+        path = path._replace(container=obj.name, file="network.yaml")
+        fP = cache(path, obj, defer=True)
 
         if results and status:
             results.put((status._replace(path=path), None))
 
     @staticmethod
-    def on_vapp(path, session, response, results=None, status=None):
+    def on_vapp(path, session, response, results=None, status=None, tracker=None):
         log = logging.getLogger("maloja.surveyor.on_vapp")
 
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         obj = VApp().feed_xml(tree, ns="{http://www.vmware.com/vcloud/v1.5}")
         path = path._replace(file="vapp.yaml")
-        fP = cache(path, obj)
+        fP = cache(path, obj, defer=True)
 
         url = urlparse(response.url)
         query = "/".join((
@@ -286,43 +795,40 @@ class Surveyor:
         ))
         vms = list(find_xpath(
             "./*/*/[@type='application/vnd.vmware.vcloud.vm+xml']",
-            ET.fromstring(response.text)
+            tree
         ))
-        try:
-            ops = [session.get(
-                vm.attrib.get("href"),
-                background_callback=functools.partial(
-                    Surveyor.on_vm,
-                    path._replace(node=vm.attrib.get("name")),
-                    results=results,
-                    status=status._replace(job=status.job + n) if status else None
-                )
-            ) for n, vm in enumerate(vms)] + [session.get(
-                query,
-                background_callback=functools.partial(
-                    Surveyor.on_vmrecords,
-                    path,
-                    results=results,
-                    status=status._replace(job=status.job + len(vms) + 1) if status else None
-                )
-            )]
-        except Exception as e:
-            log.error(e)
-        tasks = concurrent.futures.wait(
-            ops, timeout=3 * len(ops),
-            return_when=concurrent.futures.FIRST_EXCEPTION
-        )
+        ops = [Surveyor.schedule(
+            session, vm.attrib.get("href"),
+            functools.partial(
+                Surveyor.on_vm,
+                path._replace(node=vm.attrib.get("name")),
+                results=results,
+                status=status._replace(job=status.job + n) if status else None,
+                tracker=tracker
+            ),
+            tracker
+        ) for n, vm in enumerate(vms)] + [Surveyor.schedule(
+            session, query,
+            functools.partial(
+                Surveyor.on_vmrecords,
+                path,
+                results=results,
+                status=status._replace(job=status.job + len(vms) + 1) if status else None,
+                tracker=tracker
+            ),
+            tracker
+        )]
         if results and status:
             results.put((status._replace(path=path), None))
 
     @staticmethod
-    def on_vdc(path, session, response, results=None, status=None):
+    def on_vdc(path, session, response, results=None, status=None, tracker=None):
         log = logging.getLogger("maloja.surveyor.on_vdc")
 
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         obj = Vdc().feed_xml(tree, ns="{http://www.vmware.com/vcloud/v1.5}")
         path = path._replace(file="vdc.yaml")
-        cache(path, obj)
+        cache(path, obj, defer=True)
 
         edgeGWs = find_xpath(
             "./*/[@type='application/vnd.vmware.vcloud.query.records+xml']",
@@ -340,138 +846,136 @@ class Surveyor:
             "./*/*/[@type='application/vnd.vmware.vcloud.vApp+xml']",
             tree
         )
-        ops = [session.get(
-            edgeGW.attrib.get("href"),
-            background_callback=functools.partial(
+        ops = [Surveyor.schedule(
+            session, edgeGW.attrib.get("href"),
+            functools.partial(
                 Surveyor.on_edgeGateway,
                 path,
                 results=results,
-                status=status._replace(job=status.job + n) if status else None
-            )
-        ) for n, edgeGW in enumerate(edgeGWs)] + [session.get(
-            orgVdcNet.attrib.get("href"),
-            background_callback=functools.partial(
+                status=status._replace(job=status.job + n) if status else None,
+                tracker=tracker
+            ),
+            tracker
+        ) for n, edgeGW in enumerate(edgeGWs)] + [Surveyor.schedule(
+            session, orgVdcNet.attrib.get("href"),
+            functools.partial(
                 Surveyor.on_orgVdcNetwork,
                 path._replace(
                     category="networks",
                     container=orgVdcNet.attrib.get("name")
                 ),
                 results=results,
-                status=status._replace(job=status.job + n) if status else None
-            )
-        ) for n, orgVdcNet in enumerate(orgVdcNets)] + [session.get(
-            vapp.attrib.get("href"),
-            background_callback=functools.partial(
+                status=status._replace(job=status.job + n) if status else None,
+                tracker=tracker
+            ),
+            tracker
+        ) for n, orgVdcNet in enumerate(orgVdcNets)] + [Surveyor.schedule(
+            session, vapp.attrib.get("href"),
+            functools.partial(
                 Surveyor.on_vapp,
                 path._replace(
                     category="vapps",
                     container=vapp.attrib.get("name")
                 ),
                 results=results,
-                status=status._replace(job=status.job + n) if status else None
-            )
+                status=status._replace(job=status.job + n) if status else None,
+                tracker=tracker
+            ),
+            tracker
         ) for n, vapp in enumerate(vapps)]
 
-        tasks = concurrent.futures.wait(
-            ops, timeout=3 * len(ops),
-            return_when=concurrent.futures.FIRST_EXCEPTION
-        )
         if results and status:
             results.put((status._replace(path=path), None))
 
     @staticmethod
-    def on_catalog(path, session, response, results=None, status=None):
+    def on_catalog(path, session, response, results=None, status=None, tracker=None):
         log = logging.getLogger("maloja.surveyor.on_catalog")
 
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         obj = Catalog().feed_xml(tree, ns="{http://www.vmware.com/vcloud/v1.5}")
         path = path._replace(file="catalog.yaml")
-        cache(path, obj)
+        cache(path, obj, defer=True)
 
         items = find_xpath(
             ".//*[@type='application/vnd.vmware.vcloud.catalogItem+xml']",
-            ET.fromstring(response.text)
+            tree
         )
-        ops = [session.get(
-            item.attrib.get("href"),
-            background_callback=functools.partial(
+        ops = [Surveyor.schedule(
+            session, item.attrib.get("href"),
+            functools.partial(
                 Surveyor.on_catalogitem, path,
                 results=results,
-                status=status._replace(job=status.job + n) if status else None
-            )
+                status=status._replace(job=status.job + n) if status else None,
+                tracker=tracker
+            ),
+            tracker
         ) for n, item in enumerate(items)]
-        tasks = concurrent.futures.wait(
-            ops, timeout=3 * len(ops),
-            return_when=concurrent.futures.FIRST_EXCEPTION
-        )
         if results and status:
             results.put((status._replace(path=path), None))
 
     @staticmethod
-    def on_org(path, session, response, results=None, status=None):
+    def on_org(path, session, response, results=None, status=None, tracker=None):
         log = logging.getLogger("maloja.surveyor.on_org")
 
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         obj = Org().feed_xml(tree, ns="{http://www.vmware.com/vcloud/v1.5}")
         path = path._replace(file="org.yaml")
-        fP = cache(path, obj)
+        fP = cache(path, obj, defer=True)
 
         ctlgs = find_xpath(
             "./*/[@type='application/vnd.vmware.vcloud.catalog+xml']",
-            ET.fromstring(response.text)
+            tree
         )
 
         vdcs = find_xpath(
             "./*/[@type='application/vnd.vmware.vcloud.vdc+xml']",
-            ET.fromstring(response.text)
+            tree
         )
-        ops = [session.get(
-            vdc.attrib.get("href"),
-            background_callback=functools.partial(
+        ops = [Surveyor.schedule(
+            session, vdc.attrib.get("href"),
+            functools.partial(
                 Surveyor.on_vdc,
                 path._replace(service=vdc.attrib.get("name")),
                 results=results,
-                status=status._replace(job=status.job + n) if status else None
-            )
-        ) for n, vdc in enumerate(vdcs)] + [session.get(
-            ctlg.attrib.get("href"),
-            background_callback=functools.partial(
+                status=status._replace(job=status.job + n) if status else None,
+                tracker=tracker
+            ),
+            tracker
+        ) for n, vdc in enumerate(vdcs)] + [Surveyor.schedule(
+            session, ctlg.attrib.get("href"),
+            functools.partial(
                 Surveyor.on_catalog,
                 path._replace(
                     service="catalogs",
                     category=ctlg.attrib.get("name")
                 ),
                 results=results,
-                status=status._replace(job=status.job + n) if status else None
-            )
+                status=status._replace(job=status.job + n) if status else None,
+                tracker=tracker
+            ),
+            tracker
         ) for n, ctlg in enumerate(ctlgs)]
 
-        tasks = concurrent.futures.wait(
-            ops, timeout=3 * len(ops),
-            return_when=concurrent.futures.FIRST_EXCEPTION
-        )
         if results and status:
             results.put((status._replace(path=path), None))
 
     @staticmethod
-    def on_org_list(path, session, response, results=None, status=None):
+    def on_org_list(path, session, response, results=None, status=None, tracker=None):
         log = logging.getLogger("maloja.surveyor.on_org_list")
 
-        tree = ET.fromstring(response.text)
+        tree = parse_response(response)
         orgs = find_xpath(
             "./*/[@type='application/vnd.vmware.vcloud.org+xml']", tree)
-        ops = [session.get(
-            org.attrib.get("href"),
-            background_callback=functools.partial(
+        ops = [Surveyor.schedule(
+            session, org.attrib.get("href"),
+            functools.partial(
                 Surveyor.on_org,
                 path._replace(org=org.attrib.get("name")),
                 results=results,
-                status=status._replace(job=status.job + n) if status else None
-            )
+                status=status._replace(job=status.job + n) if status else None,
+                tracker=tracker
+            ),
+            tracker
         ) for n, org in enumerate(orgs)]
-        tasks = concurrent.futures.wait(
-            ops, timeout=3 * len(ops),
-            return_when=concurrent.futures.FIRST_EXCEPTION
-        )
         if results and status:
             results.put((status._replace(path=path), None))
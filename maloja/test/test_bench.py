@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+#   -*- encoding: UTF-8 -*-
+
+# Copyright Skyscape Cloud Services
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest
+
+import maloja.bench.flow
+import maloja.bench.model
+import maloja.model
+from maloja.bench.simulator import Estate
+from maloja.bench.simulator import Simulator
+
+
+class ModelBenchTests(unittest.TestCase):
+
+    def test_run(self):
+        rv = maloja.bench.model.run(repeat=1, runs=1)
+        for name in (
+            "feed_xml Vm", "elements Vm", "yaml_dumps Network", "yaml_loads Gateway",
+            "fast_loads Gateway", "servicecast Gateway"
+        ):
+            with self.subTest(name=name):
+                self.assertIn(name, rv)
+        self.assertTrue(all(i > 0 for i in rv.values()))
+
+    def test_service_values(self):
+        rv = maloja.bench.model.service_values()
+        self.assertTrue(rv)
+        self.assertTrue(all(maloja.model.Gateway.servicecast(i) for i in rv))
+
+
+class FlowBenchTests(unittest.TestCase):
+
+    def test_survey_case(self):
+        with Simulator(Estate(vms=8)) as sim:
+            rv = maloja.bench.flow.run_case("survey", sim.url, 4)
+        self.assertTrue(rv["complete"])
+        self.assertGreaterEqual(rv["objects"], 8)
+        self.assertGreater(rv["requests"], 8)
+        self.assertGreater(rv["bytes_written"], 0)
+
+    def test_compare(self):
+        case = {"flow": "survey", "mode": None, "vms": 100, "workers": 8, "latency": 0}
+        baseline = [dict(case, wall=1.0)]
+        self.assertFalse(maloja.bench.flow.compare([dict(case, wall=1.1)], baseline))
+        self.assertEqual(1, len(maloja.bench.flow.compare([dict(case, wall=1.3)], baseline)))
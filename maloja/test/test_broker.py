@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+#   -*- encoding: UTF-8 -*-
+
+# Copyright Skyscape Cloud Services
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from collections import namedtuple
+import concurrent.futures
+import http.server
+import queue
+import threading
+import time
+import unittest
+
+import maloja.broker
+from maloja.broker import AsyncSession
+from maloja.broker import BrokerSession
+from maloja.broker import Governor
+from maloja.broker import create_broker
+from maloja.types import Cancel
+from maloja.types import Stop
+
+Ping = namedtuple("Ping", ["text"])
+Pong = namedtuple("Pong", ["text"])
+Echo = namedtuple("Echo", ["text"])
+Hold = namedtuple("Hold", ["future"])
+
+
+@maloja.broker.handler.register(Ping)
+def ping_handler(msg, session, token, results=None, status=None, **kwargs):
+    return (session.executor.submit(results.put, (status, msg.text)),)
+
+
+@maloja.broker.handler.register(Pong)
+def pong_handler(msg, session, token, results=None, status=None, **kwargs):
+    results.put((status, msg.text))
+    return tuple()
+
+
+@maloja.broker.handler.register(Hold)
+def hold_handler(msg, session, token, results=None, status=None, **kwargs):
+    return (msg.future,)
+
+
+@maloja.broker.handler.register(Echo)
+async def echo_handler(msg, session, token, results=None, status=None, **kwargs):
+    results.put((status, msg.text))
+    return tuple()
+
+
+class BrokerTests(unittest.TestCase):
+
+    loop = None
+
+    def setUp(self):
+        self.operations = queue.Queue()
+        self.results = queue.Queue()
+
+    def run_broker(self, *msgs):
+        broker = create_broker(self.operations, self.results, max_workers=4, loop=self.loop)
+        for n, msg in enumerate(msgs + (Stop(),)):
+            self.operations.put((n, msg))
+
+        done, not_done = concurrent.futures.wait(
+            set(broker.tasks.values()), timeout=6
+        )
+        self.assertFalse(not_done)
+        broker.session.executor.shutdown(wait=True)
+        rv = []
+        while not self.results.empty():
+            rv.append(self.results.get())
+        return rv
+
+    def test_handler_dispatch(self):
+        rv = self.run_broker(Ping("pong"))
+        self.assertIn("pong", [reply for status, reply in rv])
+        self.assertEqual(2, len([status for status, reply in rv if reply is None]))
+
+
+class JobTests(unittest.TestCase):
+
+    def setUp(self):
+        self.operations = queue.Queue()
+        self.results = queue.Queue()
+        self.broker = create_broker(self.operations, self.results, max_workers=8, max_jobs=2)
+
+    def tearDown(self):
+        self.operations.put((99, Stop()))
+        done, not_done = concurrent.futures.wait(set(self.broker.tasks.values()), timeout=6)
+        self.broker.session.executor.shutdown(wait=True)
+        self.assertFalse(not_done)
+
+    def reply(self, text):
+        while True:
+            status, reply = self.results.get(timeout=6)
+            if reply == text:
+                return status
+
+    def test_jobs_run_concurrently(self):
+        hold = concurrent.futures.Future()
+        self.operations.put((1, Hold(hold)))
+        self.operations.put((2, Pong("pong")))
+        self.assertEqual(2, self.reply("pong").id)
+        self.assertEqual("running", self.broker.jobs[1].state)
+        hold.set_result(None)
+        self.assertTrue(self.broker.drain(timeout=6))
+        self.assertEqual(["done", "done"], [i.state for i in self.broker.jobs.values()])
+        self.assertEqual(1, self.broker.jobs[2].progress)
+
+    def test_priority(self):
+        holds = [concurrent.futures.Future() for i in range(2)]
+        self.broker.priorities = dict(self.broker.priorities)
+        self.broker.priorities.update({Pong: 1, Ping: 9})
+        self.operations.put((1, Hold(holds[0])))
+        self.operations.put((2, Hold(holds[1])))
+        self.operations.put((3, Ping("ping")))
+        self.operations.put((4, Pong("pong")))
+        self.operations.put((5, Cancel(2)))
+        self.reply("Cancelling job 2.")
+        self.assertEqual(4, self.reply("pong").id)
+        holds[0].set_result(None)
+        self.assertTrue(self.broker.drain(timeout=6))
+        jobs = self.broker.jobs
+        self.assertEqual("cancelled", jobs[2].state)
+        self.assertLessEqual(jobs[4].started, jobs[3].started)
+
+    def test_packet_priority(self):
+        holds = [concurrent.futures.Future() for i in range(2)]
+        self.operations.put((1, Hold(holds[0])))
+        self.operations.put((2, Hold(holds[1])))
+        self.operations.put((3, Pong("pong"), 9))
+        self.operations.put((4, Pong("pong"), 1))
+        while len(self.broker.job_table()) < 4:
+            time.sleep(0.01)
+        for hold in holds:
+            hold.set_result(None)
+        self.assertTrue(self.broker.drain(timeout=6))
+        jobs = {i.id: i for i in self.broker.job_table()}
+        self.assertLessEqual(jobs[4].started, jobs[3].started)
+
+    def test_cancel_pending(self):
+        holds = [concurrent.futures.Future() for i in range(2)]
+        self.operations.put((1, Hold(holds[0])))
+        self.operations.put((2, Hold(holds[1])))
+        self.operations.put((3, Pong("pong")))
+        self.operations.put((4, Cancel(3)))
+        self.reply("Job 3 cancelled.")
+        for hold in holds:
+            hold.set_result(None)
+        self.assertTrue(self.broker.drain(timeout=6))
+        self.assertIsNone(self.broker.jobs[3].started)
+        self.assertEqual("cancelled", self.broker.jobs[3].state)
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"<Session/>"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class BrokerSessionTests(unittest.TestCase):
+
+    def test_pool_sized_to_workers(self):
+        broker = create_broker(queue.Queue(), queue.Queue(), max_workers=24)
+        self.assertIsInstance(broker.session, BrokerSession)
+        self.assertEqual(24, broker.session.adapter._pool_maxsize)
+        broker.operations.put((0, Stop()))
+        concurrent.futures.wait(set(broker.tasks.values()), timeout=6)
+        broker.session.executor.shutdown(wait=True)
+
+    def test_connections_reused(self):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        session = BrokerSession(
+            executor=executor, pool_size=2, timeout=5, governor=Governor(host_limit=1)
+        )
+        try:
+            url = "http://127.0.0.1:{0}/api/session".format(server.server_address[1])
+            for n in range(5):
+                self.assertEqual(200, session.get(url).result().status_code)
+            self.assertEqual((5, 1), session.connections)
+            ops = [session.get(url) for n in range(4)]
+            concurrent.futures.wait(ops, timeout=5)
+            self.assertTrue(all(i.result().status_code == 200 for i in ops))
+            self.assertEqual((9, 1), session.connections)
+        finally:
+            server.shutdown()
+            server.server_close()
+            executor.shutdown(wait=True)
+
+
+class GovernorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.governor = Governor(rate=10, burst=2, host_limit=2, clock=lambda: self.now)
+
+    def test_bucket_allows_burst(self):
+        delays = [self.governor.reserve() for i in range(4)]
+        self.assertEqual([0, 0], delays[:2])
+        self.assertAlmostEqual(0.1, delays[2])
+        self.assertAlmostEqual(0.2, delays[3])
+
+    def test_unlimited(self):
+        governor = Governor(clock=lambda: self.now)
+        self.assertEqual([0] * 100, [governor.reserve() for i in range(100)])
+        self.assertIsNone(governor.slot("vcloud.example.com"))
+
+    def test_backoff_on_throttle(self):
+        self.governor.observe(429, {"Retry-After": "2"})
+        self.assertEqual(5, self.governor.current)
+        self.assertEqual(2, self.governor.reserve())
+        self.governor.observe(503)
+        self.assertEqual(2.5, self.governor.current)
+        self.assertEqual(2, self.governor.throttles)
+
+        self.now = 3.0
+        for i in range(64):
+            self.governor.observe(200)
+        self.assertEqual(10, self.governor.current)
+
+    def test_slot_per_host(self):
+        slot = self.governor.slot("vcloud.example.com")
+        self.assertIs(slot, self.governor.slot("vcloud.example.com"))
+        self.assertIsNot(slot, self.governor.slot("vcloud.example.org"))
+        self.assertTrue(slot.acquire(blocking=False))
+        self.assertTrue(slot.acquire(blocking=False))
+        self.assertFalse(slot.acquire(blocking=False))
+
+    def test_no_slot_held_while_paced(self):
+        slot = self.governor.slot("vcloud.example.com")
+        held = []
+        self.governor.sleep = lambda delay: held.append(slot._value < 2)
+        for i in range(3):
+            self.governor.acquire("vcloud.example.com").release()
+        self.assertEqual([False], held)
+
+
+@unittest.skipIf(maloja.broker.aiohttp is None, "Needs aiohttp")
+class AsyncBrokerTests(BrokerTests):
+
+    def setUp(self):
+        super().setUp()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_coroutine_handler(self):
+        rv = self.run_broker(Echo("hello"), Ping("pong"))
+        replies = [reply for status, reply in rv]
+        self.assertIn("hello", replies)
+        self.assertIn("pong", replies)
+
+    def test_connections_reused(self):
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        session = AsyncSession(self.loop, limit=2, timeout=5, governor=Governor(host_limit=1))
+        url = "http://127.0.0.1:{0}/api/session".format(server.server_address[1])
+
+        async def requests():
+            rv = []
+            for n in range(5):
+                rv.append((await session.get(url)).status_code)
+            rv.extend(i.status_code for i in await asyncio.gather(
+                *[session.get(url) for n in range(4)]
+            ))
+            await session.close()
+            return rv
+
+        try:
+            self.assertEqual([200] * 9, self.loop.run_until_complete(requests()))
+            self.assertEqual((9, 1), session.connections)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_session_outside_loop(self):
+        broker = create_broker(self.operations, self.results, max_workers=4, loop=self.loop)
+        self.assertIsInstance(broker, maloja.broker.AsyncBroker)
+        self.assertFalse(broker.session.in_loop)
+        self.operations.put((0, Stop()))
+        concurrent.futures.wait(set(broker.tasks.values()), timeout=6)
+        broker.session.executor.shutdown(wait=True)
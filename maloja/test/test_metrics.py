@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+#   -*- encoding: UTF-8 -*-
+
+# Copyright Skyscape Cloud Services
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import concurrent.futures
+import queue
+import unittest
+import urllib.error
+import urllib.request
+
+from maloja.bench.simulator import Estate
+from maloja.bench.simulator import Simulator
+import maloja.broker
+from maloja.broker import Broker
+from maloja.broker import BrokerSession
+from maloja.broker import watch
+from maloja.metrics import MetricsServer
+from maloja.metrics import Registry
+from maloja.model import Org
+from maloja.types import Stop
+import maloja.workflow.path
+from maloja.workflow.path import cache
+from maloja.workflow.path import make_project
+from maloja.workflow.test.test_utils import NeedsTempDirectory
+
+
+class RegistryTests(unittest.TestCase):
+
+    def test_counter(self):
+        registry = Registry()
+        metric = registry.counter("test_total", "A test.", labels=("code",))
+        metric.inc(code=200)
+        metric.inc(2, code=200)
+        metric.inc(code=404)
+        self.assertIs(metric, registry.counter("test_total"))
+        self.assertEqual(3, metric.value(code=200))
+        self.assertEqual([
+            "# HELP test_total A test.",
+            "# TYPE test_total counter",
+            'test_total{code="200"} 3.0',
+            'test_total{code="404"} 1.0',
+        ], registry.exposition().splitlines())
+
+    def test_gauge_function(self):
+        registry = Registry()
+        registry.gauge("depth", labels=("queue",), func=lambda: [({"queue": 'a"b'}, 2)])
+        registry.gauge("size", func=lambda: 7)
+        lines = registry.exposition().splitlines()
+        self.assertIn('depth{queue="a\\"b"} 2.0', lines)
+        self.assertIn("size 7.0", lines)
+
+    def test_unlabelled_counter_starts_at_zero(self):
+        registry = Registry()
+        registry.counter("test_total")
+        self.assertEqual("test_total 0.0", registry.exposition().splitlines()[-1])
+
+    def test_failing_gauge(self):
+        registry = Registry()
+        registry.gauge("broken", func=lambda: 1 / 0)
+        registry.gauge("size", func=lambda: 7)
+        with self.assertLogs("maloja.metrics", level="ERROR"):
+            self.assertEqual("size 7.0", registry.exposition().splitlines()[-1])
+
+
+class MetricsServerTests(unittest.TestCase):
+
+    def test_serve(self):
+        registry = Registry()
+        registry.counter("test_total").inc()
+        with MetricsServer(registry) as server:
+            with urllib.request.urlopen(server.url) as response:
+                self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+                self.assertIn("test_total 1.0", response.read().decode("utf-8"))
+            with self.assertRaises(urllib.error.HTTPError) as cm:
+                urllib.request.urlopen(server.url.replace("/metrics", "/other"))
+            self.assertEqual(404, cm.exception.code)
+            cm.exception.close()
+
+
+class InstrumentationTests(NeedsTempDirectory, unittest.TestCase):
+
+    def test_watch(self):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        broker = Broker(queue.Queue(), queue.Queue(), executor=executor)
+        broker.operations.put(None)
+        broker.submit(1, Stop())
+        broker.drain(timeout=6)
+        lines = watch(broker, Registry()).exposition().splitlines()
+        executor.shutdown(wait=True)
+        self.assertIn('maloja_queue_depth{queue="operations"} 1.0', lines)
+        self.assertIn('maloja_queue_depth{queue="results"} 1.0', lines)
+        self.assertIn('maloja_jobs{state="done"} 1.0', lines)
+        self.assertIn("maloja_executor_max_workers 4.0", lines)
+        self.assertIn("maloja_executor_queued 0.0", lines)
+
+    def test_requests_counted(self):
+        counter = maloja.broker.requests_total
+        before = counter.value(method="GET", code=401)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        session = BrokerSession(executor=executor)
+        with Simulator(Estate(vms=1)) as sim:
+            session.get(sim.url + "/api/org").result()
+        executor.shutdown(wait=True)
+        self.assertEqual(before + 1, counter.value(method="GET", code=401))
+        self.assertEqual(0, maloja.broker.requests_in_flight.value())
+
+    def test_cache_writes_counted(self):
+        counter = maloja.workflow.path.cache_writes
+        before = counter.value(type="Org")
+        path, proj = make_project(self.drcty.name)
+        cache(path._replace(org="Test", file="org.yaml"), Org(name="Test"))
+        self.assertEqual(before + 1, counter.value(type="Org"))
+        self.assertLessEqual(1, maloja.workflow.path.cache_files.value(outcome="written"))
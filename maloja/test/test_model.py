@@ -20,19 +20,27 @@ from __future__ import unicode_literals
 
 from collections import OrderedDict
 from collections import namedtuple
+import copy
+import itertools
+import pickle
 import textwrap
 import unittest
 import xml.etree.ElementTree as ET
 import xml.sax.saxutils
 
+from maloja.model import AddressRange
+from maloja.model import Gateway
 from maloja.model import Network
 from maloja.model import Org
 from maloja.model import Template
 from maloja.model import Vm
+from maloja.model import codecs
+from maloja.model import load_object
 from maloja.model import yaml_dumps
 from maloja.model import yaml_loads
 
 import maloja.surveyor
+import maloja.test.test_surveyor
 import maloja.types
 
 from maloja.workflow.utils import find_xpath
@@ -157,6 +165,90 @@ vm_yaml = """
   - enabled:
 """.lstrip()
 
+class AddressRangeTests(unittest.TestCase):
+
+    def test_large_network(self):
+        rv = Gateway.servicecast("10.0.0.0/8")
+        self.assertIsInstance(rv, AddressRange)
+        self.assertEqual(2 ** 24 - 2, len(rv))
+        self.assertEqual("10.0.0.1", str(rv[0]))
+        self.assertEqual("10.255.255.254", str(rv[-1]))
+        self.assertIn("10.128.0.1", rv)
+        self.assertNotIn("11.0.0.1", rv)
+        self.assertNotIn("any", rv)
+        self.assertEqual(["10.0.0.1", "10.0.0.2"], [str(i) for i in rv[:2]])
+
+    def test_single_address(self):
+        rv = AddressRange("192.168.1.1")
+        self.assertEqual(1, len(rv))
+        self.assertEqual("192.168.1.1", str(rv))
+
+    def test_yaml_round_trip(self):
+        obj = Gateway(fw=[{
+            "description": "Big", "int_addr": "172.16.0.0/12",
+            "int_port": 80, "ext_addr": "any", "ext_port": "any"
+        }])
+        rv = yaml_dumps(obj)
+        self.assertIn("172.16.0.1-172.31.255.254", rv)
+        self.assertLess(len(rv), 512)
+        check = Gateway(**yaml_loads(rv))
+        self.assertEqual(obj.fw[0].int_addr, check.fw[0].int_addr)
+        self.assertIn(("int_addr", obj.fw[0].int_addr), list(check.elements))
+
+    def test_consecutive_list(self):
+        rv = Gateway.typecast(["51.179.194.122", "51.179.194.123"])
+        self.assertEqual(AddressRange("51.179.194.122", "51.179.194.123"), rv)
+        rv = Gateway.typecast(["51.179.194.122", "51.179.194.124"])
+        self.assertIsInstance(rv, list)
+
+class DataObjectTests(unittest.TestCase):
+
+    def test_slots(self):
+        for typ in (Gateway, Network, Org, Template, Vm):
+            with self.subTest(typ=typ):
+                obj = typ(name="test")
+                self.assertEqual(0, typ.__dictoffset__)
+                self.assertEqual("test", vars(obj)["name"])
+                self.assertEqual([k for k, v in typ._defaults], list(vars(obj)))
+                self.assertRaises(AttributeError, setattr, obj, "undefined", None)
+
+    def test_defaults_not_shared(self):
+        a, b = Vm(), Vm()
+        a.harddisks.append(Vm.HardDisk("disk", 1024))
+        self.assertEqual([], b.harddisks)
+        self.assertEqual([], Vm().harddisks)
+        self.assertEqual([], dict(Vm._defaults)["harddisks"])
+
+    def test_copy_and_pickle(self):
+        obj = Vm(name="test", harddisks=[{"name": "disk", "capacity": 1024}])
+        for rv in (copy.deepcopy(obj), pickle.loads(pickle.dumps(obj))):
+            with self.subTest(rv=rv):
+                self.assertEqual(obj, rv)
+                self.assertIsNot(obj.harddisks, rv.harddisks)
+
+    def test_unexpected_attribute(self):
+        self.assertRaises(TypeError, Vm, undefined=None)
+
+    def test_unexpected_attribute_loaded(self):
+        with self.assertLogs("maloja.model.load_object", level="WARNING"):
+            obj = load_object(Vm, {"name": "server", "undefined": None})
+        self.assertEqual("server", obj.name)
+
+class CodecTests(unittest.TestCase):
+
+    def test_codecs_interchangeable(self):
+        objs = [
+            Gateway().feed_xml(ET.fromstring(maloja.test.test_surveyor.EdgeGatewaySurveyTests.xml)),
+            Network().feed_xml(ET.fromstring(NetworkTests.xml)),
+            Vm().feed_xml(ET.fromstring(VmTests.xml)),
+        ]
+        for obj in objs:
+            expect = type(obj)(**yaml_loads(yaml_dumps(obj)))
+            for (loads, _), (_, dumps) in itertools.product(codecs.values(), repeat=2):
+                with self.subTest(obj=obj, loads=loads, dumps=dumps):
+                    rv = type(obj)(**loads(dumps(obj)))
+                    self.assertEqual(expect, rv)
+
 class TaskTests(unittest.TestCase):
     xml = textwrap.dedent("""<?xml version="1.0" encoding="UTF-8"?><VApp
     xmlns="http://www.vmware.com/vcloud/v1.5" ovfDescriptorUploaded="true" deployed="false" status="0" name="f52ec6bedae4491c8ab21fb58f89b003" id="urn:vcloud:vapp:b5f878a3-6e20-4f92-b39d-671ae8455ba4" href="https://api.vcd.portal.skyscapecloud.com/api/vApp/vapp-b5f878a3-6e20-4f92-b39d-671ae8455ba4" type="application/vnd.vmware.vcloud.vApp+xml" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="http://www.vmware.com/vcloud/v1.5 http://10.10.6.13/api/v1.5/schema/master.xsd">
@@ -297,13 +389,21 @@ class NetworkTests(unittest.TestCase):
         self.assertEqual("192.168.1.255", str(obj.defaultGateway))
         self.assertEqual("255.255.0.0", str(obj.netmask))
 
+    def test_orgvdcnetwork_empty_pool(self):
+        obj = Network(name="USER_NET", dhcp={"pool": []})
+        self.assertIsInstance(obj.dhcp, Network.DHCP)
+        self.assertIsNone(obj.dhcp.pool)
+        check = Network(**yaml_loads(yaml_dumps(obj)))
+        self.assertIsNone(check.dhcp.pool)
+
     def test_orgvdcnetwork_elements(self):
         tree = ET.fromstring(NetworkTests.xml)
         obj = Network().feed_xml(tree)
         elems = list(obj.elements)
         self.assertIn("defaultGateway", dict(elems))
         self.assertIn("netmask", dict(elems))
-        self.assertEqual(2, [i[0] for i in elems].count("pool"))
+        self.assertEqual(1, [i[0] for i in elems].count("pool"))
+        self.assertEqual("192.168.2.1-192.168.2.254", str(dict(elems)["pool"]))
 
     def test_orgvdcnetwork_dumps(self):
         tree = ET.fromstring(NetworkTests.xml)
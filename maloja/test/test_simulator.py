@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+#   -*- encoding: UTF-8 -*-
+
+# Copyright Skyscape Cloud Services
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import concurrent.futures
+import time
+import unittest
+import xml.etree.ElementTree as ET
+
+from maloja.bench.simulator import Estate
+from maloja.bench.simulator import Simulator
+from maloja.broker import BrokerSession
+from maloja.broker import credentials_handler
+from maloja.builder import Builder
+from maloja.model import Gateway
+from maloja.model import Vm
+import maloja.surveyor
+from maloja.types import Credentials
+from maloja.types import Survey
+from maloja.types import Token
+from maloja.workflow.path import find_ypath
+from maloja.workflow.path import make_project
+from maloja.workflow.test.test_utils import NeedsTempDirectory
+
+
+class EstateTests(unittest.TestCase):
+
+    def test_vms_shared_among_vdcs(self):
+        estate = Estate(vms=10, orgs=2, vdcs=2, vapp_size=2)
+        self.assertEqual(10, len(estate.kinds["vm"]))
+        self.assertEqual(
+            [3, 3, 2, 2],
+            [sum(len(i.members("vm")) for i in vdc.members("vapp")) for vdc in estate.kinds["vdc"]]
+        )
+        self.assertTrue(all(len(i.members("vm")) <= 2 for i in estate.kinds["vapp"]))
+
+    def test_documents_feed_model(self):
+        estate = Estate(vms=1)
+        vm = Vm().feed_xml(ET.fromstring(estate.document(estate.kinds["vm"][0], "http://x")))
+        self.assertEqual(1, vm.cpu)
+        self.assertEqual(1, len(vm.harddisks))
+        self.assertEqual("Net000", vm.networkconnections[0].name)
+        gw = Gateway().feed_xml(
+            ET.fromstring(estate.document(estate.kinds["gateway"][0], "http://x"))
+        )
+        self.assertEqual(1, len(gw.fw))
+        self.assertEqual(1, len(gw.dnat))
+
+    def test_query_pages(self):
+        estate = Estate(vms=5)
+        tree = ET.fromstring(estate.render_query("http://x", "adminVM", page=2, size=4))
+        self.assertEqual("7", tree.attrib["total"])
+        self.assertEqual(3, len(tree))
+
+
+class SimulatorTests(NeedsTempDirectory, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.sim = Simulator(Estate(vms=12, orgs=2, task_time=0.2)).start()
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        self.session = BrokerSession(executor=self.executor, pool_size=4)
+        response = credentials_handler(
+            Credentials(self.sim.url, "admin@System", ""), self.session
+        )[0].result()
+        self.token = Token(
+            time.time(), self.sim.url, self.sim.key, response.headers.get(self.sim.key)
+        )
+        self.headers = {self.token.key: self.token.value}
+
+    def tearDown(self):
+        self.executor.shutdown(wait=True)
+        self.sim.stop()
+        super().tearDown()
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs).result()
+
+    def test_token_required(self):
+        self.assertEqual(401, self.get(self.sim.url + "/api/org").status_code)
+        self.assertEqual(200, self.get(self.sim.url + "/api/org", headers=self.headers).status_code)
+
+    def test_conditional_request(self):
+        url = self.sim.url + "/api/org"
+        etag = self.get(url, headers=self.headers).headers["ETag"]
+        response = self.get(url, headers=dict(self.headers, **{"If-None-Match": etag}))
+        self.assertEqual(304, response.status_code)
+
+    def test_survey(self):
+        path, proj = make_project(self.drcty.name)
+        for mode in (None, "query"):
+            with self.subTest(mode=mode):
+                ops = maloja.surveyor.Surveyor.survey_handler(
+                    Survey(path, mode), self.session, self.token
+                )
+                done, not_done = concurrent.futures.wait(ops, timeout=30)
+                self.assertFalse(not_done)
+                self.assertEqual(12 + 4, len(list(find_ypath(path, Vm()))))
+
+    def test_task(self):
+        estate = self.sim.estate
+        vdc = estate.kinds["vdc"][0]
+        template = estate.kinds["template"][0]
+        body = (
+            '<InstantiateVAppTemplateParams xmlns="http://www.vmware.com/vcloud/v1.5"'
+            ' name="new"><Source href="{0}{1.path}"/></InstantiateVAppTemplateParams>'
+        ).format(self.sim.url, template)
+        response = self.session.post(
+            self.sim.url + vdc.path + "/action/instantiateVAppTemplate",
+            data=body, headers=self.headers
+        ).result()
+        self.assertEqual(201, response.status_code)
+        task = next(Builder.get_tasks(response))
+        self.assertEqual("running", task.status)
+        self.assertEqual("new", task.owner.name)
+
+        time.sleep(0.2)
+        response = self.get(task.owner.href, headers=self.headers)
+        self.assertFalse(list(Builder.get_tasks(response)))
+        self.assertEqual(1, len(estate.find(task.owner.href).members("vm")))
@@ -18,14 +18,35 @@
 from __future__ import print_function
 from __future__ import unicode_literals
 
+import asyncio
+import concurrent.futures
+import os
+import queue
+import threading
 import textwrap
+import time
 import unittest
 import xml.etree.ElementTree as ET
 
 import ruamel.yaml
 
 import maloja.model
+from maloja.model import Catalog
+from maloja.model import Network
+from maloja.model import Org
+from maloja.model import Template
+from maloja.model import VApp
+from maloja.model import Vdc
+from maloja.model import Vm
 import maloja.surveyor
+import maloja.workflow.path
+from maloja.types import Status
+from maloja.types import Survey
+from maloja.types import Token
+from maloja.workflow.path import find_ypath
+from maloja.workflow.path import make_project
+from maloja.workflow.test.test_utils import NeedsTempDirectory
+from maloja.workflow.utils import RetryPolicy
 
 class CatalogSurveyTests(unittest.TestCase):
     xml = textwrap.dedent("""<?xml version="1.0" encoding="UTF-8"?><Catalog
@@ -1415,3 +1436,331 @@ class VdcSurveyTests(unittest.TestCase):
             "application/vnd.vmware.vcloud.vdc+xml",
             obj.type)
 
+
+class FakeResponse:
+
+    def __init__(self, url, text=None, status_code=None):
+        self.url = url
+        self.status_code = status_code or (404 if text is None else 200)
+        self.text = text or ""
+        self.content = self.text.encode("utf-8")
+        self.headers = {}
+
+class FakeSession:
+    """
+    Serves the XML fixtures in this module in place of the VMware API.
+    Each page is tagged with a hash of its content, and conditional
+    requests are honoured.
+
+    """
+
+    def __init__(self, pages, executor):
+        self.pages = pages
+        self.executor = executor
+        self.headers = {}
+        self.requested = []
+
+    def get(self, url, headers=None, background_callback=None, **kwargs):
+        return self.executor.submit(self.respond, url, headers or {}, background_callback)
+
+    def respond(self, url, headers={}, callback=None):
+        self.requested.append(url)
+        text = self.pages.get(url)
+        etag = None if text is None else '"{0:x}"'.format(hash(text) & 0xffffffff)
+        if etag is not None and headers.get("If-None-Match") == etag:
+            response = FakeResponse(url, status_code=304)
+        else:
+            response = FakeResponse(url, text)
+        response.headers["ETag"] = etag
+        if callback is not None:
+            callback(self, response)
+        return response
+
+class BusySession(FakeSession):
+    """
+    Answers 503 to the first `busy` requests for each page.
+
+    """
+
+    def __init__(self, pages, executor, busy=1):
+        super().__init__(pages, executor)
+        self.busy = busy
+
+    def respond(self, url, headers={}, callback=None):
+        if self.requested.count(url) < self.busy:
+            self.requested.append(url)
+            response = FakeResponse(url, status_code=503)
+            if callback is not None:
+                callback(self, response)
+            return response
+        return super().respond(url, headers, callback)
+
+class TrackerTests(unittest.TestCase):
+
+    def test_hooks_run_off_loop(self):
+        loop = asyncio.new_event_loop()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        tracker = maloja.surveyor.Tracker(executor=executor)
+        threads = []
+        tracker.hooks.append(lambda: threads.append(threading.current_thread()))
+
+        async def survey():
+            tracker.release()
+            return await asyncio.wrap_future(tracker.future)
+
+        try:
+            self.assertEqual(0, loop.run_until_complete(asyncio.wait_for(survey(), 6)))
+        finally:
+            loop.close()
+            executor.shutdown(wait=True)
+        self.assertEqual(1, len(threads))
+        self.assertIsNot(threading.current_thread(), threads[0])
+
+    def test_hooks_run_in_place(self):
+        tracker = maloja.surveyor.Tracker()
+        threads = []
+        tracker.hooks.append(lambda: threads.append(threading.current_thread()))
+        tracker.release()
+        self.assertEqual(0, tracker.future.result(timeout=0))
+        self.assertEqual([threading.current_thread()], threads)
+
+
+class SurveyWorkflowTests(NeedsTempDirectory, unittest.TestCase):
+
+    orgList = textwrap.dedent("""<?xml version="1.0" encoding="UTF-8"?><OrgList
+    xmlns="http://www.vmware.com/vcloud/v1.5"
+    href="https://vcloud.example.com/api/org/"
+    type="application/vnd.vmware.vcloud.orgList+xml">
+    <Org
+        href="https://vcloud.example.com/api/org/7b832bc5-3d65-45a2-8d35-da28388ab80a"
+        name="Default"
+        type="application/vnd.vmware.vcloud.org+xml"/>
+    </OrgList>""")
+
+    @property
+    def pages(self):
+        return {
+            "https://vcloud.example.com:443/api/org": self.orgList,
+            "https://vcloud.example.com/api/org/7b832bc5-3d65-45a2-8d35-da28388ab80a":
+                OrgSurveyTests.xml,
+            "https://vcloud.example.com/api/vdc/afaafb99-228c-4838-ad07-5bf3aa649d42":
+                VdcSurveyTests.xml,
+            "https://vcloud.example.com/api/catalog/39867ab4-04e0-4b13-b468-08abcc1de810":
+                CatalogSurveyTests.xml,
+        }
+
+    def setUp(self):
+        super().setUp()
+        self.path, self.proj = make_project(self.drcty.name)
+        self.token = Token(time.time(), "https://vcloud.example.com", "x-auth", "1234")
+
+    def test_survey_needs_no_thread_per_level(self):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        session = FakeSession(self.pages, executor)
+        ops = maloja.surveyor.Surveyor.survey_handler(
+            Survey(self.path), session, self.token
+        )
+        done, not_done = concurrent.futures.wait(ops, timeout=10)
+        self.assertFalse(not_done)
+        self.assertGreater(next(iter(done)).result(), len(self.pages) - 1)
+        self.assertTrue(all(i in session.requested for i in self.pages))
+        for query in (Org(name="Default"), Vdc(name="Default vDC"), Catalog()):
+            with self.subTest(query=query):
+                self.assertTrue(list(find_ypath(self.path, query)))
+        executor.shutdown(wait=True)
+
+    def test_busy_api_retried(self):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        session = BusySession(self.pages, executor)
+        retry = RetryPolicy(base=0.01)
+        ops = maloja.surveyor.Surveyor.survey_handler(
+            Survey(self.path), session, self.token, retry=retry
+        )
+        done, not_done = concurrent.futures.wait(ops, timeout=10)
+        self.assertFalse(not_done)
+        self.assertTrue(all(session.requested.count(i) == 2 for i in self.pages))
+        self.assertEqual(len(set(session.requested)), retry.spent)
+        self.assertTrue(list(find_ypath(self.path, Vdc(name="Default vDC"))))
+        executor.shutdown(wait=True)
+
+    def test_retries_give_up(self):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        session = BusySession(self.pages, executor, busy=10)
+        ops = maloja.surveyor.Surveyor.survey_handler(
+            Survey(self.path), session, self.token,
+            retry=RetryPolicy(base=0.01, attempts=3)
+        )
+        done, not_done = concurrent.futures.wait(ops, timeout=10)
+        self.assertFalse(not_done)
+        self.assertEqual(["https://vcloud.example.com:443/api/org"] * 3, session.requested)
+        executor.shutdown(wait=True)
+
+    def test_unchanged_files_skipped(self):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        session = FakeSession(self.pages, executor)
+        results = queue.Queue()
+        for n in range(2):
+            ops = maloja.surveyor.Surveyor.survey_handler(
+                Survey(self.path), session, self.token,
+                results=results, status=Status(1, 1, self.path)
+            )
+            done, not_done = concurrent.futures.wait(ops, timeout=10)
+            self.assertFalse(not_done)
+
+        replies = [reply for status, reply in list(results.queue) if reply is not None]
+        self.assertEqual(2, len(replies))
+        self.assertFalse(replies[0].startswith("Survey wrote 0 files"), replies)
+        self.assertTrue(replies[1].startswith("Survey wrote 0 files"), replies)
+        executor.shutdown(wait=True)
+
+    def test_concurrent_surveys_counted_apart(self):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        session = FakeSession(self.pages, executor)
+        paths = [self.path] + [make_project(self.drcty.name)[0] for n in range(2)]
+        results = queue.Queue()
+
+        def survey(path):
+            return maloja.surveyor.Surveyor.survey_handler(
+                Survey(path), session, self.token,
+                results=results, status=Status(1, 1, path)
+            )
+
+        done, not_done = concurrent.futures.wait(survey(paths[0]), timeout=10)
+        self.assertFalse(not_done)
+        ops = survey(paths[1]) + survey(paths[2])
+        done, not_done = concurrent.futures.wait(ops, timeout=10)
+        self.assertFalse(not_done)
+        executor.shutdown(wait=True)
+
+        replies = [reply for status, reply in list(results.queue) if reply is not None]
+        self.assertEqual(3, len(replies))
+        self.assertFalse(replies[0].startswith("Survey wrote 0 files"), replies)
+        self.assertEqual([replies[0]] * 3, replies)
+
+    def test_incremental_survey(self):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        session = FakeSession(self.pages, executor)
+        for n in range(2):
+            ops = maloja.surveyor.Surveyor.survey_handler(
+                Survey(self.path, "incremental"), session, self.token
+            )
+            done, not_done = concurrent.futures.wait(ops, timeout=10)
+            self.assertFalse(not_done)
+
+        validators = maloja.workflow.path.Validators(self.path)
+        self.assertTrue(all(i in validators.entries for i in self.pages))
+        self.assertEqual(
+            ["https://vcloud.example.com/api/vdc/afaafb99-228c-4838-ad07-5bf3aa649d42"],
+            [href for name, href, path in validators.children(
+                "https://vcloud.example.com/api/org/7b832bc5-3d65-45a2-8d35-da28388ab80a"
+            ) if name == "on_vdc"]
+        )
+
+        # Unchanged documents are requested again but not rewritten
+        vdc = next(find_ypath(self.path, Vdc(name="Default vDC")))[0]
+        fP = os.path.join(*(i for i in vdc if i is not None))
+        os.remove(fP)
+        session.requested.clear()
+        ops = maloja.surveyor.Surveyor.survey_handler(
+            Survey(self.path, "incremental"), session, self.token
+        )
+        done, not_done = concurrent.futures.wait(ops, timeout=10)
+        self.assertFalse(not_done)
+        self.assertTrue(all(i in session.requested for i in self.pages))
+        self.assertFalse(os.path.isfile(fP))
+        executor.shutdown(wait=True)
+
+    def test_survey_below_project(self):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        session = FakeSession(self.pages, executor)
+        for mode in (None, "incremental"):
+            with self.subTest(mode=mode):
+                ops = maloja.surveyor.Surveyor.survey_handler(
+                    Survey(self.path._replace(org="Default"), mode), session, self.token
+                )
+                done, not_done = concurrent.futures.wait(ops, timeout=10)
+                self.assertFalse(not_done)
+                self.assertEqual(1, next(iter(done)).result())
+        self.assertEqual(["https://vcloud.example.com:443/api/catalogs/query"] * 2, session.requested)
+        executor.shutdown(wait=True)
+
+    def test_query_survey(self):
+        url = "https://vcloud.example.com:443/api/query?type={0}&format=records&pageSize=128&page={1}"
+        records = """<?xml version="1.0" encoding="UTF-8"?><QueryResultRecords
+            xmlns="http://www.vmware.com/vcloud/v1.5"
+            total="{total}" pageSize="128" page="{page}" name="{name}"
+            type="application/vnd.vmware.vcloud.query.records+xml">
+            <Link rel="alternate" href="https://vcloud.example.com/api/query"/>
+            {0}</QueryResultRecords>"""
+        host = "https://vcloud.example.com/api/"
+        org = host + "org/7b832bc5-3d65-45a2-8d35-da28388ab80a"
+        vdc = host + "vdc/afaafb99-228c-4838-ad07-5bf3aa649d42"
+        pages = {
+            url.format("organization", 1): records.format(
+                '<OrgRecord name="Default" displayName="Default Org" href="{0}"/>'.format(org),
+                total=1, page=1, name="organization"),
+            url.format("adminOrgVdc", 1): records.format(
+                '<AdminVdcRecord name="Default vDC" org="{0}" href="{1}"/>'.format(org, vdc),
+                total=1, page=1, name="adminOrgVdc"),
+            url.format("adminVApp", 1): records.format(
+                '<AdminVAppRecord name="Web" vdc="{0}" href="{1}vApp/vapp-1"/>'.format(
+                    vdc, host),
+                total=1, page=1, name="adminVApp"),
+            url.format("orgVdcNetwork", 1): records.format(
+                '<OrgVdcNetworkRecord name="USER_NET" vdc="{0}" href="{1}network/1"'
+                ' defaultGateway="192.168.2.1" netmask="255.255.255.0"'
+                ' dns1="8.8.8.8" dns2="8.8.4.4"/>'.format(vdc, host),
+                total=1, page=1, name="orgVdcNetwork"),
+            url.format("edgeGateway", 1): records.format(
+                "", total=0, page=1, name="edgeGateway"),
+            url.format("catalogItem", 1): records.format(
+                '<CatalogItemRecord name="CentOS" vdc="{0}" catalog="{1}catalog/1"'
+                ' catalogName="Public" entity="{1}vAppTemplate/vappTemplate-1"/>'.format(
+                    vdc, host),
+                total=1, page=1, name="catalogItem"),
+            url.format("vAppTemplate", 1): records.format(
+                '<VAppTemplateRecord name="CentOS" org="{0}" catalogName="Public"'
+                ' creationDate="2016-01-01T00:00:00.000Z"'
+                ' href="{1}vAppTemplate/vappTemplate-1"/>'.format(org, host),
+                total=1, page=1, name="vAppTemplate"),
+        }
+        for page in (1, 2):
+            pages[url.format("adminVM", page)] = records.format(
+                "".join(
+                    '<AdminVMRecord name="vm{0:03}" vdc="{1}" container="{2}vApp/vapp-1"'
+                    ' containerName="Web" isVAppTemplate="false" guestOs="CentOS"'
+                    ' memoryMB="1024" hardwareVersion="9"'
+                    ' href="{2}vApp/vm-{0}"/>'.format(n, vdc, host)
+                    for n in range(128 * (page - 1), min(128 * page, 130))
+                ) + (
+                    '<AdminVMRecord name="server" vdc="{0}" container="{1}vAppTemplate/1"'
+                    ' containerName="CentOS" catalogName="Public" isVAppTemplate="true"'
+                    ' href="{1}vAppTemplate/vm-1"/>'.format(vdc, host) if page == 2 else ""
+                ),
+                total=131, page=page, name="adminVM")
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        session = FakeSession(pages, executor)
+        ops = maloja.surveyor.Surveyor.survey_handler(
+            Survey(self.path, "query"), session, self.token
+        )
+        done, not_done = concurrent.futures.wait(ops, timeout=10)
+        self.assertFalse(not_done)
+        self.assertEqual(sorted(pages), sorted(session.requested))
+
+        self.assertEqual(
+            "Default Org", next(find_ypath(self.path, Org()))[1].fullName
+        )
+        self.assertEqual(1, len(list(find_ypath(self.path, Vdc(name="Default vDC")))))
+        self.assertEqual(1, len(list(find_ypath(self.path, VApp(name="Web")))))
+        self.assertEqual(1, len(list(find_ypath(self.path, Catalog(name="Public")))))
+        self.assertEqual(1, len(list(find_ypath(self.path, Template(name="CentOS")))))
+        vms = list(find_ypath(self.path, Vm()))
+        self.assertEqual(131, len(vms))
+        path, obj = next(find_ypath(self.path, Vm(name="vm129")))
+        self.assertEqual(("Default vDC", "vapps", "Web"), path[3:6])
+        self.assertEqual(1024, obj.memoryMB)
+        self.assertEqual([9], obj.hardwareVersion)
+        path, obj = next(find_ypath(self.path, Vm(name="server")))
+        self.assertEqual(("catalogs", "Public", "CentOS"), path[3:6])
+        executor.shutdown(wait=True)
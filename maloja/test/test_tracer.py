@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+#   -*- encoding: UTF-8 -*-
+
+# Copyright Skyscape Cloud Services
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import concurrent.futures
+import json
+import os.path
+import queue
+import unittest
+
+from maloja.bench.simulator import Estate
+from maloja.bench.simulator import Simulator
+import maloja.broker
+from maloja.broker import BrokerSession
+from maloja.broker import create_broker
+from maloja.model import Org
+import maloja.tracer
+from maloja.tracer import Histogram
+from maloja.tracer import Span
+from maloja.tracer import Tracer
+from maloja.tracer import endpoint
+from maloja.types import Status
+from maloja.types import Stop
+from maloja.workflow.path import Path
+from maloja.workflow.path import cache
+from maloja.workflow.path import make_project
+from maloja.workflow.test.test_utils import NeedsTempDirectory
+from maloja.workflow.utils import SessionView
+from maloja.workflow.utils import parse_response
+
+
+class EndpointTests(unittest.TestCase):
+
+    def test_ids_replaced(self):
+        self.assertEqual(
+            "vApp/vm-{id}",
+            endpoint("https://vcd.example.com/api/vApp/vm-1617dae0-1391-4b02-8981-3452b5d02314")
+        )
+        self.assertEqual(
+            "admin/vdc/{id}/edgeGateways",
+            endpoint(
+                "https://vcd.example.com:443/api/admin/vdc/"
+                "8bdd2156-f276-4718-8ea2-21560d89b8e1/edgeGateways"
+            )
+        )
+
+    def test_query_type(self):
+        self.assertEqual(
+            "query?type=adminVM",
+            endpoint("https://vcd.example.com/api/query?type=adminVM&format=records&page=2")
+        )
+
+
+class HistogramTests(unittest.TestCase):
+
+    def test_quantiles(self):
+        hist = Histogram()
+        for i in [0.0005] * 90 + [0.15] * 9 + [40]:
+            hist.add(i)
+        self.assertEqual(100, hist.count)
+        self.assertEqual(0.001, hist.quantile(0.5))
+        self.assertEqual(0.2, hist.quantile(0.95))
+        self.assertEqual(40, hist.quantile(1))
+        self.assertEqual(40, hist.max)
+
+
+class SpanTests(unittest.TestCase):
+
+    def test_marks(self):
+        clock = iter([0, 1, 3, 6]).__next__
+        span = Span("get", "https://vcd.example.com/api/org", Status(2, 5, None), clock=clock)
+        span.mark("wait")
+        span.mark("ttfb")
+        span.mark("transfer")
+        self.assertEqual({"wait": 1, "ttfb": 2, "transfer": 3}, dict(span.times))
+        data = span.as_dict()
+        self.assertEqual((2, 5, "GET", "org"), (data["id"], data["job"], data["method"], data["endpoint"]))
+        self.assertIsNone(data["connect"])
+
+    def test_no_active_span(self):
+        self.assertIsNone(maloja.tracer.current())
+        maloja.tracer.record("parse", 1)
+        with maloja.tracer.timed("cache") as span:
+            self.assertIsNone(span)
+
+    def test_active_span(self):
+        span = Span("GET", "https://vcd.example.com/api/org")
+        with maloja.tracer.active(span):
+            maloja.tracer.record("parse", 1)
+            maloja.tracer.record("parse", 2)
+            with maloja.tracer.timed("cache"):
+                pass
+        self.assertIsNone(maloja.tracer.current())
+        self.assertEqual(3, span.times["parse"])
+        self.assertIn("cache", span.times)
+
+
+class TracerTests(NeedsTempDirectory, unittest.TestCase):
+
+    def test_error_noted(self):
+        tracer = Tracer()
+        span = tracer.span("GET", "https://vcd.example.com/api/org")
+        with self.assertRaises(ValueError):
+            with tracer.trace(span):
+                span.mark("wait")
+                raise ValueError("bad")
+        self.assertEqual("ValueError: bad", span.error)
+        self.assertEqual((1, 1), (tracer.spans, tracer.errors))
+        self.assertEqual(["wait"], list(tracer.summary()))
+
+    def test_session_traced(self):
+        fP = os.path.join(self.drcty.name, "trace.jsonl")
+        path, proj = make_project(self.drcty.name)
+        tracer = Tracer(fP)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+        session = BrokerSession(executor=executor, tracer=tracer)
+
+        def callback(session, response):
+            tree = parse_response(response)
+            cache(path._replace(org="Test", file="org.yaml"), Org(name=tree.tag))
+
+        with Simulator(Estate(vms=1)) as sim:
+            view = SessionView(session, status=Status(3, 1, None))
+            view.get(sim.url + "/api/org", background_callback=callback).result()
+            view.get(sim.url + "/api/org").result()
+        executor.shutdown(wait=True)
+        tracer.close()
+
+        with open(fP, "r") as data:
+            first, second = [json.loads(i) for i in data]
+        self.assertEqual((3, 1, 401, "org"), tuple(first[i] for i in ("id", "job", "code", "endpoint")))
+        for phase in maloja.tracer.phases:
+            with self.subTest(phase=phase):
+                self.assertIsNotNone(first[phase])
+        self.assertIsNone(second["connect"])
+        self.assertIsNone(second["callback"])
+        self.assertEqual(2, tracer.summary()["wait"].count)
+
+    @unittest.skipIf(maloja.broker.aiohttp is None, "Needs aiohttp")
+    def test_reported_on_stop_async(self):
+        fP = os.path.join(self.drcty.name, "trace.jsonl")
+        tracer = Tracer(fP)
+        loop = asyncio.new_event_loop()
+        broker = create_broker(queue.Queue(), queue.Queue(), max_workers=2, loop=loop, tracer=tracer)
+        with Simulator(Estate(vms=1)) as sim:
+            broker.session.get(sim.url + "/api/org").result(timeout=6)
+        with self.assertLogs("maloja.tracer.report", level="INFO") as cm:
+            broker.operations.put((0, Stop()))
+            done, not_done = concurrent.futures.wait(set(broker.tasks.values()), timeout=6)
+        broker.session.executor.shutdown(wait=True)
+        loop.close()
+        self.assertFalse(not_done)
+        self.assertIn("Traced 1 requests", cm.output[0])
+        self.assertIsNone(tracer.stream)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+#   -*- encoding: UTF-8 -*-
+
+# Copyright Skyscape Cloud Services
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+from collections import OrderedDict
+from collections import defaultdict
+from contextlib import contextmanager
+import json
+import logging
+import re
+import threading
+import time
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+__doc__ = """
+Timing of each request the Broker makes to the API.
+
+A :py:class:`Span` follows one request through these phases:
+
+wait
+    From the time the request is made until it goes out. This covers
+    the queue of the executor and any pause by the Governor.
+connect
+    Opening a new connection. This is zero when a pooled connection
+    is reused.
+ttfb
+    From sending the request to receiving the headers of the response.
+transfer
+    Reading the body of the response.
+parse
+    Parsing the XML of the response.
+cache
+    Writing objects to the cache.
+callback
+    All the time spent in the callback which handles the response,
+    including `parse` and `cache`.
+
+The span which is active on a thread takes the times recorded by
+:py:func:`record` and :py:func:`timed`. Code which has no active span
+records nothing.
+
+"""
+
+phases = ("wait", "connect", "ttfb", "transfer", "parse", "cache", "callback")
+
+local = threading.local()
+
+uuid_pattern = re.compile(
+    "[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE
+)
+
+
+def endpoint(url):
+    """
+    Return the type of API endpoint for `url`, eg: 'vApp/vm-{id}' for
+    the URL of a Vm. Queries are distinguished by their type.
+
+    """
+    parts = urlparse(url)
+    rv = uuid_pattern.sub("{id}", parts.path.partition("/api/")[2] or parts.path)
+    typ = parse_qs(parts.query).get("type")
+    if typ:
+        rv = "{0}?type={1}".format(rv, typ[0])
+    return rv
+
+
+def current():
+    """
+    Return the span active on this thread, or None.
+
+    """
+    return getattr(local, "span", None)
+
+
+def mark(phase):
+    """
+    Close `phase` of the span active on this thread at the current time.
+
+    """
+    span = getattr(local, "span", None)
+    if span is not None:
+        span.mark(phase)
+
+
+def record(phase, seconds):
+    """
+    Add `seconds` to `phase` of the span active on this thread.
+
+    """
+    span = getattr(local, "span", None)
+    if span is not None:
+        span.add(phase, seconds)
+
+
+@contextmanager
+def timed(phase, clock=time.perf_counter):
+    """
+    Time the body of a `with` statement as part of `phase`.
+
+    """
+    span = getattr(local, "span", None)
+    if span is None:
+        yield None
+        return
+
+    start = clock()
+    try:
+        yield span
+    finally:
+        span.add(phase, clock() - start)
+
+
+@contextmanager
+def active(span):
+    """
+    Make `span` active on this thread for the body of a `with`
+    statement.
+
+    """
+    prev = getattr(local, "span", None)
+    local.span = span
+    try:
+        yield span
+    finally:
+        local.span = prev
+
+
+class Span:
+    """
+    The record of one request. The span is tagged with the `id` and
+    `job` of the :py:class:`maloja.types.Status` of the job it serves.
+
+    """
+
+    def __init__(self, method, url, status=None, clock=time.perf_counter):
+        self.method = method.upper()
+        self.url = url
+        self.endpoint = endpoint(url)
+        self.id = getattr(status, "id", None)
+        self.job = getattr(status, "job", None)
+        self.clock = clock
+        self.created = time.time()
+        self.last = clock()
+        self.times = OrderedDict()
+        self.code = None
+        self.size = None
+        self.error = None
+
+    def add(self, phase, seconds):
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+
+    def mark(self, phase):
+        """
+        Close `phase` at the current time. It is taken to have begun when
+        the previous phase was marked, or when the span was created.
+
+        """
+        now = self.clock()
+        self.add(phase, now - self.last)
+        self.last = now
+
+    def as_dict(self):
+        rv = OrderedDict([
+            ("t", self.created),
+            ("id", self.id),
+            ("job", self.job),
+            ("method", self.method),
+            ("endpoint", self.endpoint),
+            ("url", self.url),
+            ("code", self.code),
+            ("size", self.size),
+        ])
+        rv.update((i, self.times.get(i)) for i in phases)
+        if self.error is not None:
+            rv["error"] = self.error
+        return rv
+
+
+class Histogram:
+    """
+    Counts values in buckets bounded above by `bounds`, which are in
+    seconds. The last bucket holds values above every bound.
+
+    """
+
+    bounds = (
+        0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0
+    )
+
+    def __init__(self, bounds=None):
+        self.bounds = tuple(bounds or self.bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q):
+        """
+        Return the upper bound of the bucket which holds the quantile `q`,
+        or the largest value if that is in the last bucket.
+
+        """
+        rank = q * self.count
+        n = 0
+        for bound, count in zip(self.bounds, self.counts):
+            n += count
+            if n and n >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Tracer:
+    """
+    A Tracer makes a :py:class:`Span` for each request, and keeps a
+    :py:class:`Histogram` of every phase for each type of endpoint.
+
+    Give a `path` to write each span to that file as a line of JSON.
+
+    """
+
+    def __init__(self, path=None, clock=time.perf_counter):
+        self.path = path
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.stream = None
+        self.histograms = defaultdict(Histogram)
+        self.spans = 0
+        self.errors = 0
+
+    def span(self, method, url, status=None):
+        return Span(method, url, status, clock=self.clock)
+
+    @contextmanager
+    def trace(self, span, activate=True):
+        """
+        Finish `span` when the body of a `with` statement ends, noting
+        any exception raised. If `activate` is True the span is active on
+        this thread meanwhile.
+
+        """
+        try:
+            if activate:
+                with active(span):
+                    yield span
+            else:
+                yield span
+        except Exception as e:
+            span.error = "{0}: {1}".format(type(e).__name__, e)
+            raise
+        finally:
+            self.finish(span)
+
+    def finish(self, span):
+        with self.lock:
+            self.spans += 1
+            if span.error is not None:
+                self.errors += 1
+            for phase, seconds in span.times.items():
+                self.histograms[(span.endpoint, phase)].add(seconds)
+                self.histograms[(None, phase)].add(seconds)
+            if self.path is not None:
+                if self.stream is None:
+                    self.stream = open(self.path, "a", buffering=1)
+                self.stream.write(json.dumps(span.as_dict()) + "\n")
+
+    def summary(self):
+        """
+        Return the histograms of every phase over all endpoints,
+        keyed by phase.
+
+        """
+        with self.lock:
+            return OrderedDict(
+                (phase, self.histograms[(None, phase)])
+                for phase in phases if (None, phase) in self.histograms
+            )
+
+    def report(self):
+        """
+        Log a table of the times of each phase, first over all endpoints
+        and then for each type of endpoint.
+
+        """
+        log = logging.getLogger("maloja.tracer.report")
+        with self.lock:
+            log.info("Traced {0} requests ({1} failed).".format(self.spans, self.errors))
+            keys = sorted(self.histograms, key=lambda x: (x[0] or "", phases.index(x[1])))
+            for key in keys:
+                hist = self.histograms[key]
+                log.info((
+                    "{0:<32} {1:<8} n={2.count:<6} mean={3:7.1f}ms"
+                    " p50={4:7.1f}ms p90={5:7.1f}ms p99={6:7.1f}ms max={7:7.1f}ms"
+                ).format(
+                    key[0] or "*", key[1], hist, hist.mean * 1000,
+                    hist.quantile(0.5) * 1000, hist.quantile(0.9) * 1000,
+                    hist.quantile(0.99) * 1000, hist.max * 1000
+                ))
+
+    def close(self):
+        with self.lock:
+            if self.stream is not None:
+                self.stream.close()
+                self.stream = None
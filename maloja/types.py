@@ -17,10 +17,20 @@
 
 from collections import namedtuple
 
+Cancel = namedtuple("Cancel", ["job"])
 Credentials = namedtuple("Credentials", ["url", "user", "password"])
 Design = namedtuple("Design", ["objects"])
 Inspection = namedtuple("Inspection", ["name", "objects"])
 
+Job = namedtuple("Job", ["id", "type", "state", "progress", "started", "finished"])
+"""
+An entry in the job table of the Broker. The `state` of a job is one of
+'pending', 'running', 'cancelling', 'cancelled', 'done' or 'failed'.
+
+"""
+Job.active = ("running", "cancelling")
+Job.waiting = ("pending",) + Job.active
+
 Plugin = namedtuple(
     "Plugin",
     ["name", "description", "selector", "workflow"]
@@ -33,6 +43,7 @@ expected by the `maloja.plugin` interface.
 
 Status = namedtuple("Status", ["id", "job", "path"])
 Stop = namedtuple("Stop", [])
-Survey = namedtuple("Survey", ["path"])
+Survey = namedtuple("Survey", ["path", "mode"])
+Survey.__new__.__defaults__ = ("tree",)
 Token = namedtuple("Token", ["t", "url", "key", "value"])
 Workflow = namedtuple("Workflow", ["plugin", "paths"])
@@ -15,17 +15,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from collections import Counter
 from collections import defaultdict
 from collections import namedtuple
+from contextlib import contextmanager
 import glob
+import ipaddress
 import itertools
 import logging
 import operator
 import os.path
+import queue
+import sqlite3
 import tempfile
 import threading
 
 from maloja import __version__
+from maloja.model import AddressRange
 from maloja.model import Catalog
 from maloja.model import Gateway
 from maloja.model import Network
@@ -35,10 +41,38 @@ from maloja.model import Project
 from maloja.model import VApp
 from maloja.model import Vdc
 from maloja.model import Vm
+from maloja.model import codecs
+from maloja.model import fast_loads
+from maloja.model import load_object
 from maloja.model import yaml_dumps
 from maloja.model import yaml_loads
+import maloja.metrics
+import maloja.tracer
 
-locks = defaultdict(threading.Lock)
+
+class Locks:
+    """
+    A fixed set of locks shared among any number of keys. Each key maps
+    to one of `stripes` locks by its hash, so the same key always gets
+    the same lock, while memory stays the same however many keys are
+    used.
+
+    Keys which share a lock serialise needlessly, so hold only one of
+    these locks at a time.
+
+    """
+
+    def __init__(self, stripes=64):
+        self.stripes = tuple(threading.Lock() for i in range(stripes))
+
+    def __getitem__(self, key):
+        return self.stripes[hash(key) % len(self.stripes)]
+
+    def __len__(self):
+        return len(self.stripes)
+
+
+locks = Locks()
 
 Path = namedtuple(
     "Path",
@@ -51,32 +85,698 @@ identify a resource stored as YAML data in the Maloja survey tree.
 """
 
 
-def cache(path, obj=None):
-    log = logging.getLogger("maloja.path.cache")
-    parent = os.path.join(*(i for i in path[:-1] if i is not None))
+class Index:
+    """
+    An Index holds the objects of one project of a cache tree in
+    memory, so that :py:func:`find_ypath` can answer queries without
+    parsing every file of the project.
+
+    It maps each type to the files of that type. For each file it keeps
+    the set of the object's elements, the YAML text which will create a
+    copy of the object when a query matches it, and the size and
+    modification time of the file when that text was read or written.
+
+    An Index is built for each project the first time it is searched,
+    by :py:func:`index`, and is kept up to date by :py:func:`cache`. A
+    file found changed on disk is read again when a query matches it,
+    and one which has gone is dropped.
+
+    """
+
+    types = {
+        "org.yaml": Org,
+        "catalog.yaml": Catalog,
+        "edge.yaml": Gateway,
+        "vdc.yaml": Vdc,
+        "net.yaml": Network,
+        "vapp.yaml": VApp,
+        "template.yaml": Template,
+        "vm.yaml": Vm,
+    }
+
+    depths = {
+        Project: 2, Org: 3, Catalog: 5, Gateway: 4, Vdc: 4,
+        Network: 6, VApp: 6, Template: 6, Vm: 7
+    }
+
+    @staticmethod
+    def criteria(obj):
+        return frozenset(
+            (k, str(v) if isinstance(v, (ipaddress.IPv4Address, AddressRange)) else v)
+            for k, v in obj.elements
+        )
+
+    @staticmethod
+    def stamp(fP):
+        """
+        Return the size and modification time of the file `fP`, or None
+        if it does not exist.
+
+        """
+        try:
+            st = os.stat(fP)
+        except FileNotFoundError:
+            return None
+        return (st.st_size, st.st_mtime_ns)
+
+    def __init__(self, root, project):
+        self.root = root
+        self.project = project
+        self.lock = threading.Lock()
+        self.entries = defaultdict(dict)
+
+    def build(self):
+        for name, typ in self.types.items():
+            wildcards = ["*"] * (self.depths[typ] - 2)
+            for fP in glob.glob(os.path.join(self.root, self.project, *wildcards, name)):
+                # A file being written now will be updated by cache()
+                # once the build is done.
+                self.load(fP, typ)
+        return self
+
+    def load(self, fP, typ):
+        """
+        Read the file `fP` into the Index. Cache files are read with the
+        fast codec whichever wrote them; the Index needs no comments.
+
+        """
+        log = logging.getLogger("maloja.path.index.load")
+        stamp = self.stamp(fP)
+        try:
+            with open(fP, "r") as data:
+                text = data.read()
+            self.update(fP, load_object(typ, fast_loads(text)), text, stamp)
+        except FileNotFoundError:
+            self.drop(fP, typ)
+        except Exception as e:
+            log.warning("Unable to index {0}: {1}".format(fP, e))
+            self.drop(fP, typ)
+
+    def tail(self, fP):
+        return tuple(os.path.relpath(fP, self.root).split(os.sep))
+
+    def update(self, fP, obj, text, stamp=None):
+        """
+        Record `obj` and its YAML `text` for the file `fP`. A `stamp` of
+        None means the file is still to be written.
+
+        """
+        typ = type(obj)
+        tail = self.tail(fP)
+        if len(tail) != self.depths.get(typ):
+            return
+        with self.lock:
+            self.entries[typ][tail] = (self.criteria(obj), text, stamp)
+
+    def drop(self, fP, typ):
+        with self.lock:
+            self.entries[typ].pop(self.tail(fP), None)
+
+    def check(self, typ, tail, entry):
+        """
+        Compare the entry for a file with the file on disk. Return the
+        entry, refreshed if the file has changed, or None if the file has
+        gone.
+
+        """
+        fP = os.path.join(self.root, *tail)
+        stamp = self.stamp(fP)
+        if stamp == entry[2]:
+            return entry
+        elif entry[2] is None:
+            # Saved by the Writer since the Index was updated
+            with self.lock:
+                if self.entries[typ].get(tail) is entry:
+                    entry = self.entries[typ][tail] = entry[:2] + (stamp,)
+            return entry
+
+        self.load(fP, typ)
+        with self.lock:
+            return self.entries[typ].get(tail)
+
+    def text(self, fP, typ):
+        """
+        Return the YAML text last recorded for the file `fP`, or None.
+
+        """
+        tail = self.tail(fP)
+        with self.lock:
+            entry = self.entries[typ].get(tail)
+        if entry is not None:
+            entry = self.check(typ, tail, entry)
+        return entry[1] if entry is not None else None
+
+    def search(self, typ, fields, criteria):
+        """
+        Generate the file path components and YAML text of each object
+        of type `typ` whose elements include `criteria`. Each of `fields`
+        which is not None must match the corresponding path component.
+
+        """
+        with self.lock:
+            entries = list(self.entries[typ].items())
+        for tail, entry in entries:
+            if any(f is not None and f != t for f, t in zip(fields, tail)):
+                continue
+            if not criteria.issubset(entry[0]):
+                continue
+            entry = self.check(typ, tail, entry)
+            if entry is not None and criteria.issubset(entry[0]):
+                yield tail, entry[1]
+
+
+indexes = {}
+indexes_lock = threading.Lock()
+
+
+def index(root, project, build=True):
+    """
+    Return the Index of `project` in the cache tree at `root`, building
+    it the first time it is needed. If `build` is False, return None
+    instead.
+
+    """
+    key = (os.path.abspath(root), project)
+    with indexes_lock:
+        rv = indexes.get(key)
+        if rv is None and build:
+            rv = indexes[key] = Index(*key).build()
+        return rv
+
+
+def save(fP, text):
+    """
+    Write `text` to the file `fP`. The text goes first to a temporary
+    file alongside, which then replaces `fP`, so that a reader never
+    sees a file half written.
+
+    """
+    parent = os.path.dirname(fP)
     os.makedirs(parent, exist_ok=True)
-    fP = os.path.join(parent, path.file)
-    if obj is not None:
+    tmp = fP + ".tmp"
+    with locks[fP]:
         try:
-            locks[fP].acquire()
-            with open(fP, "w") as output:
-                data = yaml_dumps(obj)
-                output.write(data)
+            with open(tmp, "w") as output:
+                output.write(text)
                 output.flush()
-        finally:
-            locks[fP].release()
+            os.replace(tmp, fP)
+        except OSError:
+            if os.path.isfile(tmp):
+                os.remove(tmp)
+            raise
     return fP
 
 
-def make_project(root, prefix="proj_", suffix=""):
+cache_writes = maloja.metrics.registry.counter(
+    "maloja_cache_writes_total", "Objects saved to the cache, by type.", labels=("type",)
+)
+cache_files = maloja.metrics.registry.counter(
+    "maloja_cache_files_total", "Files of the cache written, skipped, coalesced or failed.",
+    labels=("outcome",)
+)
+
+
+class WriteStats:
+    """
+    Counts the files written by the cache, and those skipped because
+    they were unchanged. Give a `metric` to count them there too.
+
+    """
+
+    def __init__(self, metric=None):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.metric = metric
+
+    def add(self, key, n=1):
+        with self.lock:
+            self.counts[key] += n
+        if self.metric is not None:
+            self.metric.inc(n, outcome=key)
+
+    def report(self):
+        with self.lock:
+            return Counter(self.counts)
+
+    def clear(self):
+        with self.lock:
+            self.counts.clear()
+
+
+write_stats = WriteStats(metric=cache_files)
+
+local = threading.local()
+
+
+@contextmanager
+def counting(stats):
+    """
+    Count the cache writes made on this thread in `stats` as well, for
+    the body of a `with` statement. A survey counts its own writes this
+    way while others run alongside it.
+
+    """
+    prev = getattr(local, "stats", None)
+    local.stats = stats
+    try:
+        yield stats
+    finally:
+        local.stats = prev
+
+
+def tally(stats, key, extra=None):
+    """
+    Count one file as `key` in `stats`, and in `extra` or else the
+    stats being counted on this thread.
+
+    """
+    stats.add(key)
+    extra = extra or getattr(local, "stats", None)
+    if extra is not None and extra is not stats:
+        extra.add(key)
+
+
+class Writer:
+    """
+    A Writer saves files from a thread of its own, so that survey
+    callbacks do not wait on the disk.
+
+    Files are queued by name. If a file is written again before the
+    Writer gets to it, only the latest text is saved. The queue holds
+    at most `maxsize` files; when it is full, :py:meth:`submit` blocks.
+
+    :py:meth:`flush` returns when every file submitted so far is saved.
+
+    """
+
+    def __init__(self, maxsize=1024, stats=write_stats):
+        self.queue = queue.Queue(maxsize)
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.stats = stats
+
+    def submit(self, fP, text):
+        with self.lock:
+            new = fP not in self.pending
+            self.pending[fP] = (text, getattr(local, "stats", None))
+            if not new:
+                tally(self.stats, "coalesced")
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name="maloja.path.writer", daemon=True
+                )
+                self.thread.start()
+        if new:
+            self.queue.put(fP)
+        return fP
+
+    def run(self):
+        log = logging.getLogger("maloja.path.writer")
+        while True:
+            fP = self.queue.get()
+            extra = None
+            try:
+                with self.lock:
+                    text, extra = self.pending.pop(fP)
+                save(fP, text)
+                tally(self.stats, "written", extra)
+            except Exception as e:
+                log.error("Unable to write {0}: {1}".format(fP, e))
+                tally(self.stats, "failed", extra)
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        self.queue.join()
+        return self.stats.report()
+
+
+writer = Writer()
+
+maloja.metrics.registry.gauge(
+    "maloja_cache_writer_queue", "Files waiting for the Writer.",
+    func=lambda: writer.queue.qsize()
+)
+
+
+class YAMLStore:
+    """
+    The YAMLStore keeps each object in its own YAML file, at the
+    location in the cache tree given by its Path.
+
+    `codec` names one of :py:data:`maloja.model.codecs`.
+
+    A deferred write is handed to the module :py:class:`Writer`.
+
+    A file is not written again if the Index shows it already holds
+    the same text.
+
+    """
+
+    def __init__(self, root, codec=None, stats=write_stats):
+        self.root = root
+        self.loads, self.dumps = codecs[codec]
+        self.stats = stats
+
+    def write(self, path, obj, defer=False):
+        fP = os.path.join(*(i for i in path if i is not None))
+        data = self.dumps(obj)
+        typ = Index.types.get(path.file)
+        idx = index(path.root, path.project, build=defer) if typ is not None else None
+        if idx is not None and idx.text(fP, typ) == data:
+            tally(self.stats, "skipped")
+            return fP
+
+        if defer:
+            # The Index answers queries until the Writer saves the file
+            if idx is not None:
+                idx.update(fP, obj, data)
+            return writer.submit(fP, data)
+
+        save(fP, data)
+        tally(self.stats, "written")
+        if idx is not None:
+            idx.update(fP, obj, data, Index.stamp(fP))
+        return fP
+
+    def search(self, path, typ, criteria):
+        depth = Index.depths[typ]
+        idx = index(path.root, path.project)
+        for tail, text in idx.search(typ, path[1:depth], criteria):
+            pack = 7 - depth
+            hit = [path.root] + list(tail[:-1]) + [None] * pack + list(tail[-1:])
+            yield (Path(*hit), load_object(typ, self.loads(text)))
+
+
+class SQLiteStore:
+    """
+    The SQLiteStore keeps the objects of a project in an SQLite
+    database, `survey.db`, in the project directory. Each type has a
+    table of YAML documents, unique on their Path components. Each
+    table has a companion which holds the elements of every object,
+    indexed so that queries on name, href or any other element are
+    lookups rather than scans.
+
+    The project file itself remains as YAML so that
+    :py:func:`find_project` works as before.
+
+    Writes are never deferred; they must be seen by the next query.
+    An object whose YAML text is unchanged is not written again.
+
+    """
+
+    fields = ("org", "service", "category", "container", "node")
+
+    @staticmethod
+    def table(typ):
+        return typ.__name__.lower()
+
+    def __init__(self, root, project, name="survey.db", codec=None, stats=write_stats):
+        self.root = root
+        self.project = project
+        self.loads, self.dumps = codecs[codec]
+        self.stats = stats
+        self.lock = threading.Lock()
+        os.makedirs(os.path.join(root, project), exist_ok=True)
+        self.db = sqlite3.connect(
+            os.path.join(root, project, name), check_same_thread=False
+        )
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            for typ in Index.depths:
+                if typ is Project:
+                    continue
+                table = self.table(typ)
+                self.db.executescript("""
+                    CREATE TABLE IF NOT EXISTS {0} (
+                        id INTEGER PRIMARY KEY,
+                        {1},
+                        file TEXT NOT NULL,
+                        data TEXT NOT NULL,
+                        UNIQUE ({2})
+                    );
+                    CREATE TABLE IF NOT EXISTS {0}_elements (
+                        id INTEGER NOT NULL REFERENCES {0}(id),
+                        key TEXT NOT NULL,
+                        value TEXT
+                    );
+                    CREATE INDEX IF NOT EXISTS {0}_elements_key
+                        ON {0}_elements (key, value, id);
+                    CREATE INDEX IF NOT EXISTS {0}_elements_id
+                        ON {0}_elements (id);
+                """.format(
+                    table,
+                    ", ".join("{0} TEXT NOT NULL DEFAULT ''".format(i) for i in self.fields),
+                    ", ".join(self.fields)
+                ))
+            self.db.commit()
+
+    def write(self, path, obj, defer=False):
+        table = self.table(type(obj))
+        data = self.dumps(obj)
+        key = [i or "" for i in path[2:7]]
+        with self.lock:
+            row = self.db.execute(
+                "SELECT id, data FROM {0} WHERE {1}".format(
+                    table, " AND ".join("{0} = ?".format(i) for i in self.fields)
+                ), key
+            ).fetchone()
+            if row is not None and row[1] == data:
+                tally(self.stats, "skipped")
+                return os.path.join(*(i for i in path if i is not None))
+            elif row is None:
+                id_ = self.db.execute(
+                    "INSERT INTO {0} ({1}, file, data) VALUES ({2})".format(
+                        table, ", ".join(self.fields), ", ".join("?" * 7)
+                    ), key + [path.file, data]
+                ).lastrowid
+            else:
+                id_ = row[0]
+                self.db.execute(
+                    "UPDATE {0} SET file = ?, data = ? WHERE id = ?".format(table),
+                    (path.file, data, id_)
+                )
+                self.db.execute("DELETE FROM {0}_elements WHERE id = ?".format(table), (id_,))
+            self.db.executemany(
+                "INSERT INTO {0}_elements (id, key, value) VALUES (?, ?, ?)".format(table),
+                [(id_, k, v) for k, v in Index.criteria(obj)]
+            )
+            self.db.commit()
+        tally(self.stats, "written")
+        return os.path.join(*(i for i in path if i is not None))
+
+    def search(self, path, typ, criteria):
+        table = self.table(typ)
+        clauses = [
+            ("{0} = ?".format(field), value)
+            for field, value in zip(self.fields, path[2:Index.depths[typ]])
+            if value is not None
+        ]
+        clauses.extend(
+            (
+                "id IN (SELECT id FROM {0}_elements WHERE key = ? AND value = ?)".format(table),
+                item
+            ) for item in criteria
+        )
+        sql = "SELECT {1}, file, data FROM {0}".format(table, ", ".join(self.fields))
+        params = []
+        if clauses:
+            sql += " WHERE " + " AND ".join(i for i, _ in clauses)
+            for _, value in clauses:
+                params.extend(value if isinstance(value, tuple) else (value,))
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+        for row in rows:
+            hit = Path(path.root, self.project, *(i or None for i in row[:5]), row[5])
+            yield (hit, load_object(typ, self.loads(row[6])))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+stores = {}
+stores_lock = threading.Lock()
+
+
+def store(path):
+    """
+    Return the store which holds the objects of the project at `path`.
+    This is set by the `store` and `codec` attributes of the project.
+
+    """
+    root = os.path.abspath(path.root)
+    key = (root, path.project)
+    with stores_lock:
+        rv = stores.get(key)
+        if rv is not None:
+            return rv
+
+        proj = None
+        if path.project is not None:
+            try:
+                with open(os.path.join(root, path.project, "project.yaml"), "r") as data:
+                    proj = load_object(Project, yaml_loads(data.read()))
+            except FileNotFoundError:
+                pass
+
+        codec = getattr(proj, "codec", None)
+        if getattr(proj, "store", None) == "sqlite":
+            rv = SQLiteStore(root, path.project, codec=codec)
+        else:
+            rv = YAMLStore(root, codec=codec)
+
+        if proj is not None:
+            stores[key] = rv
+        return rv
+
+
+def cache(path, obj=None, defer=False):
+    """
+    Save `obj` to the cache at `path`, and return the file path. If
+    `defer` is True, the file may be written later; call
+    `writer.flush()` to be sure it is on disk.
+
+    """
+    log = logging.getLogger("maloja.path.cache")
+    if obj is not None:
+        cache_writes.inc(type=type(obj).__name__)
+        with maloja.tracer.timed("cache"):
+            if path.file == "project.yaml":
+                return YAMLStore(path.root).write(path, obj)
+            else:
+                return store(path).write(path, obj, defer=defer)
+
+    parent = os.path.join(*(i for i in path[:-1] if i is not None))
+    os.makedirs(parent, exist_ok=True)
+    return os.path.join(parent, path.file)
+
+
+class Validators:
+    """
+    Validators record what the API said about each document in a survey:
+    its `ETag` and `Last-Modified` headers, and the requests which the
+    Surveyor made on its behalf.
+
+    They are saved alongside the cache, so that a later survey can make
+    conditional requests. When a document has not changed, the requests
+    it led to can be made again from the stored hrefs without parsing it.
+
+    """
+
+    def __init__(self, path):
+        self.path = Path(
+            path.root, path.project, None, None, None, None, None, "validators.yaml"
+        )
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.entries = {}
+        fP = os.path.join(*(i for i in self.path if i is not None))
+        try:
+            with open(fP, "r") as data:
+                self.entries = dict(yaml_loads(data.read()) or {})
+        except FileNotFoundError:
+            pass
+
+    @property
+    def parent(self):
+        return getattr(self.local, "parent", None)
+
+    @parent.setter
+    def parent(self, url):
+        self.local.parent = url
+
+    def conditions(self, url):
+        """
+        Return the headers which make a request for `url` conditional.
+
+        """
+        entry = self.entries.get(url, {})
+        rv = {}
+        if entry.get("etag"):
+            rv["If-None-Match"] = entry["etag"]
+        if entry.get("modified"):
+            rv["If-Modified-Since"] = entry["modified"]
+        return rv
+
+    def unchanged(self, url, response):
+        if response.status_code == 304:
+            return url in self.entries
+        etag = response.headers.get("ETag")
+        return etag is not None and etag == self.entries.get(url, {}).get("etag")
+
+    def update(self, url, response):
+        with self.lock:
+            self.entries[url] = {
+                "etag": response.headers.get("ETag"),
+                "modified": response.headers.get("Last-Modified"),
+                "children": [],
+            }
+
+    def add_child(self, url, name, path):
+        """
+        Record that the document currently being processed led to a
+        request for `url`, to be handled by the callback `name` at `path`.
+
+        """
+        parent = self.parent
+        if parent is None:
+            return
+        with self.lock:
+            entry = self.entries.get(parent)
+            if entry is not None:
+                entry["children"].append([name, url, list(path[1:])])
+
+    def children(self, url):
+        """
+        Return the (name, url, path) of each request made on behalf of
+        the document at `url` when it was last fetched in full.
+
+        """
+        root = self.path.root
+        return [
+            (name, href, Path(root, *fields))
+            for name, href, fields in self.entries.get(url, {}).get("children", [])
+        ]
+
+    def save(self):
+        with self.lock:
+            data = yaml_dumps(self.entries)
+        fP = cache(self.path)
+        with open(fP, "w") as output:
+            output.write(data)
+            output.flush()
+        return fP
+
+
+def make_project(root, prefix="proj_", suffix="", store=None, codec=None):
     os.makedirs(root, exist_ok=True)
     drcty = tempfile.mkdtemp(suffix=suffix, prefix=prefix, dir=root)
     path = Path(root, os.path.basename(drcty), None, None, None, None, None, "project.yaml")
-    proj = Project(version=__version__)
+    proj = Project(version=__version__, store=store, codec=codec)
     cache(path, proj)
     return path, proj
 
 
+def export(path, root):
+    """
+    Copy the project at `path` to the YAML layout under a new `root`.
+
+    :return: The path to the exported project.
+    """
+    proj = next(find_ypath(path._replace(file="project.yaml"), Project()))[1]
+    proj.store = None
+    rv = Path(root, path.project, None, None, None, None, None, "project.yaml")
+    cache(rv, proj)
+    for typ in Index.depths:
+        if typ is Project:
+            continue
+        for hit, obj in find_ypath(rv._replace(root=path.root), typ()):
+            cache(hit._replace(root=root), obj)
+    return rv
+
+
 def find_project(root, query=None, **kwargs):
     query = query or Project(version=__version__)
     path = Path(root, None, None, None, None, None, None, "project.yaml")
@@ -87,6 +787,29 @@ def find_project(root, query=None, **kwargs):
     return next(iter(hits))[1:]
 
 
+def find_projects(path, criteria):
+    """
+    Find the projects under `path.root` whose attributes include
+    `criteria`. Each project file is read from disk.
+
+    """
+    log = logging.getLogger("maloja.path.find_projects")
+    pattern = os.path.join(path.root, path.project or "*", "project.yaml")
+    for fP in glob.glob(pattern):
+        try:
+            with open(fP, "r") as data:
+                obj = load_object(Project, yaml_loads(data.read()))
+        except FileNotFoundError:
+            continue
+        except Exception as e:
+            log.warning("Unable to read {0}: {1}".format(fP, e))
+            continue
+
+        if criteria.issubset(Index.criteria(obj)):
+            project = os.path.basename(os.path.dirname(fP))
+            yield (Path(path.root, project, None, None, None, None, None, "project.yaml"), obj)
+
+
 def find_ypath(path: Path, query, **kwargs):
     """
     Find objects within the Maloja cache tree whose attributes match certain
@@ -100,36 +823,23 @@ def find_ypath(path: Path, query, **kwargs):
 
     :return: An iterator over matching (path, object) tuples.
     """
-    log = logging.getLogger("maloja.path.find_ypath")
-    wildcards = [i if i is not None else '*' for i in path[:-1]]
-    locations = {
-        Project: wildcards[:2] + ["project.yaml"],
-        Org: wildcards[:3] + ["org.yaml"],
-        Catalog: wildcards[:5] + ["catalog.yaml"],
-        Gateway: wildcards[:4] + ["edge.yaml"],
-        Vdc: wildcards[:4] + ["vdc.yaml"],
-        Network: wildcards[:6] + ["net.yaml"],
-        VApp: wildcards[:6] + ["vapp.yaml"],
-        Template: wildcards[:6] + ["template.yaml"],
-        Vm: wildcards[:7] + ["vm.yaml"],
-    }
     typ = type(query)
-    criteria = set(kwargs.items()) or set(query.elements)
-    pattern = os.path.join(*locations[typ])
-    for fP in glob.glob(pattern):
-        obj = None
+    criteria = set(kwargs.items()) or set(Index.criteria(query))
+    if typ is Project:
+        yield from find_projects(path, criteria)
+        return
+
+    if path.project is not None:
+        projects = [path.project]
+    else:
         try:
-            locks[fP].acquire()
-            with open(fP, 'r') as data:
-                obj = typ(**yaml_loads(data.read()))
-        finally:
-            locks[fP].release()
-
-        if obj is not None and criteria.issubset(set(obj.elements)):
-            tail = fP[len(path.root):].split(os.sep)
-            pack = 8 - len(locations[typ])
-            hit = [path.root] + tail[1:-1] + [None] * pack + tail[-1:]
-            yield (Path(*hit), obj)
+            projects = sorted(i.name for i in os.scandir(path.root) if i.is_dir())
+        except FileNotFoundError:
+            projects = []
+
+    for project in projects:
+        hit = path._replace(project=project)
+        yield from store(hit).search(hit, typ, criteria)
 
 
 def split_to_path(data, root=None):
@@ -33,14 +33,26 @@ from maloja.model import Project
 from maloja.model import VApp
 from maloja.model import Vdc
 from maloja.model import Vm
+from maloja.model import codecs
 from maloja.model import yaml_loads
 
+from maloja.workflow.path import Locks
 from maloja.workflow.path import Path
+from maloja.workflow.path import SQLiteStore
+from maloja.workflow.path import WriteStats
+from maloja.workflow.path import Writer
+from maloja.workflow.path import YAMLStore
 from maloja.workflow.path import cache
+from maloja.workflow.path import export
 from maloja.workflow.path import find_project
 from maloja.workflow.path import find_ypath
+from maloja.workflow.path import index
+from maloja.workflow.path import locks
 from maloja.workflow.path import make_project
 from maloja.workflow.path import split_to_path
+from maloja.workflow.path import store
+from maloja.workflow.path import write_stats
+from maloja.workflow.path import writer
 from maloja.workflow.test.test_utils import NeedsTempDirectory
 
 
@@ -150,6 +162,213 @@ class PathTests(NeedsTempDirectory, unittest.TestCase):
         self.assertTrue(all(isinstance(i[1], Vm) for i in results), results)
         self.assertIn(self.fixture[-1][1], [i[0] for i in results], results)
 
+    def test_ypath_index_follows_cache(self):
+        proj = self.fixture[0][1]
+        for obj, path in self.fixture[:-1]:
+            cache(path, obj)
+
+        idx = index(self.drcty.name, "testproj")
+        self.assertEqual(3, len(idx.entries[Vm]))
+        self.assertEqual(1, len(list(find_ypath(proj, Vm(name="server")))))
+
+        obj, path = self.fixture[-1]
+        cache(path, obj)
+        self.assertIs(idx, index(self.drcty.name, "testproj"))
+        self.assertEqual(4, len(idx.entries[Vm]))
+        results = list(find_ypath(proj, Vm(name="server")))
+        self.assertEqual(2, len(results))
+
+        # Each query returns fresh objects
+        results[0][1].name = "client"
+        self.assertEqual(2, len(list(find_ypath(proj, Vm(name="server")))))
+
+    def test_ypath_index_per_project(self):
+        for obj, path in self.fixture:
+            cache(path, obj)
+            cache(path._replace(project="other"), obj)
+
+        path, proj = find_project(self.drcty.name, Project())
+        self.assertEqual("other", path.project)
+        self.assertIsNone(index(self.drcty.name, "other", build=False))
+        self.assertEqual(4, len(list(find_ypath(self.fixture[0][1], Vm()))))
+        self.assertIsNone(index(self.drcty.name, "other", build=False))
+        self.assertEqual(8, len(list(find_ypath(path._replace(project=None), Vm()))))
+        self.assertEqual(4, len(index(self.drcty.name, "other").entries[Vm]))
+
+    def test_ypath_index_follows_disk(self):
+        proj = self.fixture[0][1]
+        for obj, path in self.fixture:
+            cache(path, obj)
+        self.assertEqual(2, len(list(find_ypath(proj, Vm(name="server")))))
+
+        obj, path = self.fixture[-1]
+        fP = cache(path)
+        os.remove(fP)
+        results = list(find_ypath(proj, Vm(name="server")))
+        self.assertEqual(1, len(results))
+        self.assertNotIn(path, [i[0] for i in results])
+        self.assertEqual(3, len(index(self.drcty.name, "testproj").entries[Vm]))
+
+        obj, path = self.fixture[4]
+        fP = cache(path)
+        with open(fP, "w") as output:
+            output.write("name: client\n")
+        self.assertFalse(list(find_ypath(proj, Vm(name="server"))))
+        self.assertEqual(1, len(list(find_ypath(proj, Vm(name="client")))))
+
+    def test_ypath_stale_attributes(self):
+        proj = self.fixture[0][1]
+        for obj, path in self.fixture:
+            cache(path, obj)
+
+        obj, path = self.fixture[-1]
+        with open(cache(path), "a") as output:
+            output.write("- retired: true\n")
+        with self.assertLogs("maloja.model.load_object", level="WARNING"):
+            results = list(find_ypath(proj, Vm(name="server")))
+        self.assertEqual(2, len(results))
+        self.assertEqual(4, len(list(find_ypath(proj, Vm()))))
+
+    def test_deferred_cache(self):
+        proj = self.fixture[0][1]
+        obj, path = self.fixture[-1]
+        fP = cache(path, obj, defer=True)
+        self.assertEqual(1, len(list(find_ypath(proj, Vm(name="server")))))
+        writer.flush()
+        self.assertTrue(os.path.isfile(fP))
+        self.assertEqual([os.path.basename(fP)], os.listdir(os.path.dirname(fP)))
+
+
+    def test_unchanged_not_rewritten(self):
+        stats = WriteStats()
+        obj, path = self.fixture[-1]
+        fP = cache(path, obj)
+        index(self.drcty.name, "testproj")
+        YAMLStore(self.drcty.name, stats=stats).write(path, obj)
+        self.assertEqual({"skipped": 1}, stats.report())
+
+        obj.name = "client"
+        YAMLStore(self.drcty.name, stats=stats).write(path, obj)
+        self.assertEqual({"skipped": 1, "written": 1}, stats.report())
+
+        os.remove(fP)
+        YAMLStore(self.drcty.name, stats=stats).write(path, obj)
+        self.assertEqual(2, stats.report()["written"])
+
+
+class LocksTests(unittest.TestCase):
+
+    def test_locks_bounded(self):
+        locks = Locks(stripes=4)
+        keys = ["/tmp/{0}/vm.yaml".format(n) for n in range(100)]
+        held = {id(locks[i]) for i in keys}
+        self.assertEqual(4, len(locks))
+        self.assertLessEqual(len(held), 4)
+        self.assertTrue(all(locks[i] is locks[i] for i in keys))
+
+
+class WriterTests(NeedsTempDirectory, unittest.TestCase):
+
+    def test_writes_coalesced(self):
+        fP = os.path.join(self.drcty.name, "a", "b", "vm.yaml")
+        writer = Writer(maxsize=4, stats=WriteStats())
+        with locks[fP]:
+            for n in range(3):
+                writer.submit(fP, str(n))
+        counts = writer.flush()
+        self.assertEqual(3, counts["written"] + counts["coalesced"])
+        self.assertFalse(counts["failed"])
+        with open(fP, "r") as data:
+            self.assertEqual("2", data.read())
+
+    def test_write_failure(self):
+        fP = os.path.join(self.drcty.name, "vm.yaml")
+        os.mkdir(fP)
+        writer = Writer(stats=WriteStats())
+        writer.submit(fP, "")
+        self.assertEqual({"failed": 1}, writer.flush())
+
+
+class SQLiteStoreTests(NeedsTempDirectory, unittest.TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.proj = make_project(self.drcty.name, store="sqlite")[0]
+        self.fixture = [
+            (obj, path._replace(project=self.proj.project))
+            for obj, path in PathTests.fixture.fget(self)[1:]
+        ]
+        for obj, path in self.fixture:
+            cache(path, obj)
+
+    def test_store_selected_by_project(self):
+        self.assertIsInstance(store(self.proj), SQLiteStore)
+        self.assertEqual(["project.yaml", "survey.db"], sorted(
+            i for i in os.listdir(os.path.join(self.drcty.name, self.proj.project))
+            if not i.startswith("survey.db-")
+        ))
+        path, proj = find_project(self.drcty.name)
+        self.assertEqual(self.proj, path)
+        self.assertEqual("sqlite", proj.store)
+
+    def test_ypath_by_type(self):
+        results = list(find_ypath(self.proj, Vm()))
+        self.assertEqual(4, len(results))
+        self.assertTrue(all(isinstance(i[1], Vm) for i in results), results)
+        self.assertIn(self.fixture[-1][1], [i[0] for i in results], results)
+
+    def test_ypath_with_attributes(self):
+        results = list(find_ypath(self.proj, Vm(name="server")))
+        self.assertEqual(2, len(results))
+        self.assertIn(self.fixture[-1][1], [i[0] for i in results], results)
+
+        results = list(find_ypath(self.proj._replace(project=None), Network(name="USER_NET")))
+        self.assertEqual(1, len(results))
+
+        results = list(find_ypath(self.proj, Vm(), name="master"))
+        self.assertEqual(1, len(results))
+
+    def test_object_replaced(self):
+        obj, path = self.fixture[-1]
+        obj.name = "client"
+        cache(path, obj)
+        self.assertEqual(1, len(list(find_ypath(self.proj, Vm(name="server")))))
+        self.assertEqual(1, len(list(find_ypath(self.proj, Vm(name="client")))))
+
+    def test_unchanged_not_rewritten(self):
+        obj, path = self.fixture[-1]
+        db = store(self.proj)
+        stats = db.stats = WriteStats()
+        try:
+            cache(path, obj)
+        finally:
+            db.stats = write_stats
+        self.assertEqual({"skipped": 1}, stats.report())
+
+    def test_export(self):
+        target = os.path.join(self.drcty.name, "export")
+        rv = export(self.proj, target)
+        self.assertEqual(self.proj._replace(root=target), rv)
+        self.assertIsInstance(store(rv), YAMLStore)
+        for obj, path in self.fixture:
+            with self.subTest(path=path):
+                fP = os.path.join(*(i for i in path._replace(root=target) if i is not None))
+                self.assertTrue(os.path.isfile(fP))
+        self.assertEqual(4, len(list(find_ypath(rv, Vm()))))
+
+class FastCodecTests(NeedsTempDirectory, unittest.TestCase):
+
+    def test_fast_codec_project(self):
+        proj = make_project(self.drcty.name, codec="fast")[0]
+        self.assertIs(codecs["fast"][1], store(proj).dumps)
+        for obj, path in PathTests.fixture.fget(self)[1:]:
+            cache(path._replace(project=proj.project), obj)
+
+        results = list(find_ypath(proj, Vm(name="server")))
+        self.assertEqual(2, len(results))
+        path, obj = find_project(self.drcty.name)
+        self.assertEqual("fast", obj.codec)
+
 class ProjectTests(NeedsTempDirectory, unittest.TestCase):
 
     def test_nodirectory_find_project(self):
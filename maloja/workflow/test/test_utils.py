@@ -28,10 +28,17 @@ import tempfile
 import unittest
 
 import pkg_resources
+import requests
 import ruamel.yaml
 
 import maloja.plugin.vapplicator
 
+from maloja.workflow.utils import ParseStats
+from maloja.workflow.utils import RetryPolicy
+from maloja.workflow.utils import SessionView
+from maloja.workflow.utils import api_url
+from maloja.workflow.utils import iter_records
+from maloja.workflow.utils import parse_response
 from maloja.workflow.utils import plugin_interface
 from maloja.workflow.utils import record
 
@@ -54,6 +61,21 @@ class NeedsTempDirectory:
         self.assertFalse(os.path.isdir(self.drcty.name))
         self.drcty = None
 
+class ApiUrlTests(unittest.TestCase):
+
+    def test_default_port(self):
+        self.assertEqual(
+            "https://vcloud.example.com:443/api/org",
+            api_url("https://vcloud.example.com", "api/org")
+        )
+
+    def test_explicit_port(self):
+        self.assertEqual(
+            "http://127.0.0.1:8080/api/org",
+            api_url("http://127.0.0.1:8080", "api/org")
+        )
+
+
 class RecordTests(NeedsTempDirectory, unittest.TestCase):
 
     def test_content_goes_to_named_file(self):
@@ -73,3 +95,136 @@ class RecordTests(NeedsTempDirectory, unittest.TestCase):
             output.write(ruamel.yaml.dump("Test string"))
 
         self.assertEqual("Test string\n...", fObj.getvalue().strip())
+
+
+class ParseResponseTests(unittest.TestCase):
+
+    class Response:
+
+        def __init__(self, content, headers={}):
+            self.content = content
+            self.headers = headers
+
+        @property
+        def text(self):
+            raise AssertionError("Response decoded as text")
+
+    def test_parse_once(self):
+        stats = ParseStats()
+        response = ParseResponseTests.Response(
+            "<?xml version='1.0' encoding='UTF-8'?><VApp name='caf\u00e9'/>".encode("utf-8"),
+            {"Content-Type": "application/vnd.vmware.vcloud.vApp+xml;version=5.5"}
+        )
+        tree = parse_response(response, stats=stats)
+        self.assertEqual("caf\u00e9", tree.attrib["name"])
+        self.assertIs(tree, parse_response(response, stats=stats))
+        rv = stats.report()
+        self.assertEqual(["vApp"], list(rv))
+        self.assertEqual(1, rv["vApp"].count)
+        self.assertEqual(len(response.content), rv["vApp"].size)
+
+    def test_type_from_tag(self):
+        stats = ParseStats()
+        response = ParseResponseTests.Response(
+            b"<QueryResultRecords xmlns='http://www.vmware.com/vcloud/v1.5'/>"
+        )
+        parse_response(response, stats=stats)
+        self.assertEqual(["QueryResultRecords"], list(stats.report()))
+
+    def test_iter_records(self):
+        stats = ParseStats()
+        ns = "{http://www.vmware.com/vcloud/v1.5}"
+        response = ParseResponseTests.Response(
+            "<QueryResultRecords xmlns='http://www.vmware.com/vcloud/v1.5'>{0}</QueryResultRecords>".format(
+                "".join("<VMRecord name='vm{0:03}'/>".format(i) for i in range(200))
+            ).encode("utf-8"),
+            {"Content-Type": "application/vnd.vmware.vcloud.query.records+xml"}
+        )
+        seen = []
+        for elem in iter_records(response, ns + "VMRecord", stats=stats):
+            if seen:
+                self.assertFalse(seen[-1].attrib)
+            seen.append(elem)
+            self.assertEqual("vm{0:03}".format(len(seen) - 1), elem.attrib["name"])
+        self.assertEqual(200, len(seen))
+        self.assertEqual(1, stats.report()["records"].count)
+
+
+class RetryPolicyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        self.policy = RetryPolicy(
+            base=1, factor=2, cap=10, attempts=5, deadline=60, budget=6,
+            clock=lambda: self.now, random=lambda: 0
+        )
+
+    def test_exponential_backoff(self):
+        self.assertEqual([1, 2, 4, 8, 10, 10], [self.policy.backoff(n) for n in range(6)])
+        policy = RetryPolicy(random=lambda: 1)
+        self.assertEqual(0.5, policy.backoff(0))
+
+    def test_attempts_limited(self):
+        attempt = None
+        delays = []
+        while True:
+            attempt = self.policy.next(attempt)
+            if attempt is None:
+                break
+            delays.append(attempt.delay)
+        self.assertEqual([1, 2, 4, 8], delays)
+
+    def test_deadline(self):
+        attempt = self.policy.next()
+        self.now = 59.0
+        self.assertIsNone(self.policy.next(attempt))
+
+    def test_budget_shared(self):
+        attempts = [self.policy.next() for i in range(8)]
+        self.assertEqual(6, len(list(filter(None, attempts))))
+        self.assertIsNone(attempts[-1])
+
+    def test_retryable(self):
+        busy = type("Response", (), {"status_code": 503})()
+        error = type("Response", (), {"status_code": 500})()
+        self.assertTrue(self.policy.retryable(busy))
+        self.assertTrue(self.policy.retryable(error))
+        self.assertTrue(self.policy.retryable(busy, method="POST"))
+        self.assertFalse(self.policy.retryable(error, method="POST"))
+        self.assertTrue(self.policy.retryable(exc=requests.ReadTimeout()))
+        self.assertFalse(self.policy.retryable(exc=requests.ReadTimeout(), method="POST"))
+        self.assertFalse(self.policy.retryable(exc=ValueError()))
+
+
+class SessionViewTests(unittest.TestCase):
+
+    class Session:
+
+        executor = None
+
+        def __init__(self):
+            self.requests = []
+
+        def get(self, url, headers=None, background_callback=None, **kwargs):
+            self.requests.append((url, dict(headers)))
+            if background_callback is not None:
+                return background_callback(self, url)
+
+    def test_views_keep_own_headers(self):
+        session = self.Session()
+        survey = SessionView(session, {"Accept": "application/*+xml", "x-auth": "1"})
+        build = SessionView(session, {"Accept": "application/*+xml", "x-auth": "2"})
+        survey.get("a")
+        build.get("b", headers={"Content-Type": "application/xml"})
+        self.assertEqual([
+            ("a", {"Accept": "application/*+xml", "x-auth": "1"}),
+            ("b", {"Accept": "application/*+xml", "x-auth": "2", "Content-Type": "application/xml"}),
+        ], session.requests)
+        self.assertIsNone(survey.executor)
+
+    def test_callback_gets_view(self):
+        session = self.Session()
+        view = SessionView(session, {"x-auth": "1"})
+        rv = view.get("a", background_callback=lambda s, r: s.get(r + "/child"))
+        self.assertIsNone(rv)
+        self.assertEqual([("a", {"x-auth": "1"}), ("a/child", {"x-auth": "1"})], session.requests)
@@ -18,13 +18,36 @@
 from collections import defaultdict
 from collections import namedtuple
 import contextlib
+import functools
+import inspect
+import io
 import itertools
 import tempfile
+import threading
+import time
 import operator
 import os.path
+import random
+from urllib.parse import urlparse
 import warnings
+import xml.etree.ElementTree as ET
 
 import pkg_resources
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import maloja.tracer
+
+
+def api_url(url, endpoint, port=443):
+    """
+    Return the url of an API endpoint. The `port` is added to `url`
+    unless it names one of its own.
+
+    """
+    if urlparse(url).port is None:
+        url = "{0}:{1}".format(url, port)
+    return "{0}/{1}".format(url, endpoint)
 
 
 def find_xpath(xpath, tree, namespaces={}, **kwargs):
@@ -47,6 +70,240 @@ def find_xpath(xpath, tree, namespaces={}, **kwargs):
         return (i for i in elements if query.issubset(set(i.attrib.items())))
 
 
+class ParseStats:
+    """
+    Keeps a count of the XML documents parsed by :py:func:`parse_response`,
+    with their total size and parse time, for each type of document.
+
+    """
+
+    Record = namedtuple("Record", ["count", "size", "seconds"])
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = defaultdict(lambda: ParseStats.Record(0, 0, 0.0))
+
+    def add(self, key, size, seconds):
+        with self.lock:
+            rec = self.records[key]
+            self.records[key] = rec._replace(
+                count=rec.count + 1, size=rec.size + size, seconds=rec.seconds + seconds
+            )
+
+    def report(self):
+        with self.lock:
+            return dict(self.records)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+
+parse_stats = ParseStats()
+
+
+class SessionView:
+    """
+    A view of a shared session which has headers of its own.
+
+    Requests made through the view carry its headers along with any
+    given for the request itself. Callbacks receive the view as their
+    session, so the requests they make carry the same headers. Any
+    other attribute is that of the session.
+
+    Each workflow makes a view for itself, so workflows which run at
+    once share the connections of the session but not their headers.
+
+    A view may also carry the `status` of a job, which tags each request
+    made through it for the session's tracer.
+
+    """
+
+    def __init__(self, session, headers=None, status=None):
+        self.session = session
+        self.headers = CaseInsensitiveDict(headers or {})
+        self.status = status
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def request(self, method, url, headers=None, background_callback=None, **kwargs):
+        merged = CaseInsensitiveDict(self.headers)
+        merged.update(headers or {})
+        if inspect.iscoroutinefunction(background_callback):
+            kwargs["background_callback"] = functools.partial(self.await_, background_callback)
+        elif background_callback is not None:
+            kwargs["background_callback"] = functools.partial(self.call, background_callback)
+        if self.status is not None:
+            kwargs.setdefault("status", self.status)
+        return getattr(self.session, method)(url, headers=merged, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("get", url, **kwargs)
+
+    def post(self, url, data=None, **kwargs):
+        return self.request("post", url, data=data, **kwargs)
+
+    def put(self, url, data=None, **kwargs):
+        return self.request("put", url, data=data, **kwargs)
+
+    def call(self, func, session, response):
+        return func(self, response)
+
+    async def await_(self, func, session, response):
+        return await func(self, response)
+
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed request is tried again.
+
+    The delay before each retry grows from `base` seconds by `factor`
+    up to `cap`, with a random jitter of up to half its length. A request
+    is given up after `attempts` tries, or when a retry would fall more
+    than `deadline` seconds after its first try. A policy is made for
+    each run, and allows no more than `budget` retries in all.
+
+    Only connection errors, timeouts and responses which show the API is
+    busy are retried. Requests which are not idempotent are retried only
+    when the API cannot have acted on them.
+
+    """
+
+    Attempt = namedtuple("Attempt", ["n", "started", "delay"])
+
+    statuses = (429, 500, 502, 503, 504)
+    refusals = (429, 503)
+    idempotent = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+    def __init__(
+        self, base=1.0, factor=2.0, cap=30.0, attempts=5, deadline=300.0, budget=200,
+        clock=time.monotonic, random=random.random
+    ):
+        self.base = base
+        self.factor = factor
+        self.cap = cap
+        self.attempts = attempts
+        self.deadline = deadline
+        self.budget = budget
+        self.clock = clock
+        self.random = random
+        self.lock = threading.Lock()
+        self.spent = 0
+
+    def backoff(self, n):
+        """
+        Return the delay in seconds before retry number `n`, counting from 0.
+
+        """
+        return min(self.cap, self.base * self.factor ** n) * (1 - self.random() / 2)
+
+    def retryable(self, response=None, exc=None, method="GET"):
+        if exc is not None:
+            if method.upper() in self.idempotent:
+                return isinstance(exc, (requests.ConnectionError, requests.Timeout))
+            else:
+                return isinstance(exc, requests.ConnectTimeout)
+        statuses = self.statuses if method.upper() in self.idempotent else self.refusals
+        return getattr(response, "status_code", None) in statuses
+
+    def next(self, attempt=None):
+        """
+        Return the Attempt which follows `attempt`, or None if the request
+        should be given up. Pass None after the first try.
+
+        """
+        now = self.clock()
+        attempt = attempt or self.Attempt(0, now, 0)
+        n = attempt.n + 1
+        delay = self.backoff(attempt.n)
+        if n >= self.attempts or now + delay - attempt.started > self.deadline:
+            return None
+
+        with self.lock:
+            if self.spent >= self.budget:
+                return None
+            self.spent += 1
+        return attempt._replace(n=n, delay=delay)
+
+
+def response_type(response, tree=None):
+    """
+    Return a short name for the type of document in a response, eg:
+    'vApp' for a Content-Type of `application/vnd.vmware.vcloud.vApp+xml`.
+
+    """
+    contentType = getattr(response, "headers", {}).get("Content-Type", "")
+    name = contentType.split(";")[0].split(".")[-1].split("+")[0]
+    if not name and tree is not None:
+        name = tree.tag.rpartition("}")[2]
+    return name
+
+
+def parse_response(response, stats=parse_stats):
+    """
+    Parse the XML body of an API response. The bytes of the body are
+    parsed once only; the tree is kept on the response for any later
+    callers.
+
+    :param response: an HTTP response object.
+    :param stats: a ParseStats object to update.
+
+    :return: The root element of an `xml.etree.ElementTree`.
+    """
+    try:
+        return response.tree
+    except AttributeError:
+        pass
+
+    start = time.perf_counter()
+    tree = ET.fromstring(response.content)
+    elapsed = time.perf_counter() - start
+    maloja.tracer.record("parse", elapsed)
+    if stats is not None:
+        stats.add(response_type(response, tree), len(response.content), elapsed)
+    response.tree = tree
+    return tree
+
+
+def iter_records(response, tags, stats=parse_stats):
+    """
+    Parse the XML body of an API response incrementally, generating each
+    element whose tag is one of `tags`. An element is cleared and dropped
+    from the tree once the consumer moves on from it, so memory use does
+    not grow with the number of records in the document.
+
+    :param response: an HTTP response object.
+    :param tags: a tag or sequence of tags to generate.
+    :param stats: a ParseStats object to update.
+
+    :return: An iterator over `xml.etree.ElementTree` elements.
+    """
+    tags = {tags} if isinstance(tags, str) else set(tags)
+    tree = getattr(response, "tree", None)
+    if tree is not None:
+        yield from (i for i in tree.iter() if i.tag in tags)
+        return
+
+    root = None
+    elapsed = 0.0
+    start = time.perf_counter()
+    for event, elem in ET.iterparse(io.BytesIO(response.content), events=("start", "end")):
+        if root is None:
+            root = elem
+        elif event == "end" and elem.tag in tags:
+            elapsed += time.perf_counter() - start
+            yield elem
+            start = time.perf_counter()
+            elem.clear()
+            del root[:]
+
+    elapsed += time.perf_counter() - start
+    maloja.tracer.record("parse", elapsed)
+    if stats is not None:
+        stats.add(response_type(response, root), len(response.content), elapsed)
+
+
 def group_by_type(items):
     """
     Group a sequence of items by the type of item.
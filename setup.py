@@ -65,6 +65,7 @@ setup(
     ],
     packages=[
         "maloja",
+        "maloja.bench",
         "maloja.test",
         "maloja.plugin",
         "maloja.workflow",
@@ -94,6 +95,9 @@ setup(
     },
     install_requires=deps,
     extras_require={
+        "asyncio": [
+            "aiohttp>=1.0",
+        ],
         "dev": [
             "pep8>=1.6.2",
         ],